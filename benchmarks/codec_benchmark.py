@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+# Compares the chunk codec (sensirion_i2c_sen5x.codec) with plain binary and
+# gzip on realistic data recorded from the simulated device, e.g.:
+#
+#     python benchmarks/codec_benchmark.py --samples 86400
+
+from sensirion_i2c_driver import I2cConnection
+from sensirion_i2c_sen5x import Sen5xI2cDevice
+from sensirion_i2c_sen5x import codec
+from sensirion_i2c_sen5x.clock import Sen5xVirtualClock
+from sensirion_i2c_sen5x.simulation import Sen5xSimulatedTransceiver
+from struct import Struct
+import argparse
+import gzip
+import time
+
+# Plain binary record: timestamp (int64) and the eight raw ticks.
+_RECORD = Struct('>q4H4h')
+
+
+def record(samples, seed):
+    clock = Sen5xVirtualClock()
+    transceiver = Sen5xSimulatedTransceiver(seed=seed, clock=clock.monotonic,
+                                            sleep=clock.sleep)
+    device = Sen5xI2cDevice(I2cConnection(transceiver), clock=clock)
+    device.start_measurement()
+    timestamps = []
+    rows = []
+    for _ in range(samples):
+        clock.sleep(1.0)
+        values = device.read_measured_values()
+        timestamps.append(int(clock.time() * 1e9))
+        rows.append(values.values)
+    return timestamps, [list(column) for column in zip(*rows)]
+
+
+def encode_plain(timestamps, columns):
+    return b''.join(_RECORD.pack(t, *row)
+                    for t, row in zip(timestamps, zip(*columns)))
+
+
+def decode_plain(data):
+    rows = list(_RECORD.iter_unpack(data))
+    return [row[0] for row in rows], [list(c) for c in zip(*rows)][1:]
+
+
+def encode_gzip(timestamps, columns):
+    return gzip.compress(encode_plain(timestamps, columns))
+
+
+def decode_gzip(data):
+    return decode_plain(gzip.decompress(data))
+
+
+def measure(function, argument, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the chunk codec with plain binary and gzip.')
+    parser.add_argument('-n', '--samples', type=int, default=20000,
+                        help='number of samples at 1 Hz (default: 20000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='repetitions per measurement (default: 3)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the simulated device (default: 0)')
+    args = parser.parse_args()
+
+    timestamps, columns = record(args.samples, args.seed)
+    raw_size = len(timestamps) * _RECORD.size
+    megabytes = raw_size / 1e6
+
+    codecs = [
+        ('plain', encode_plain, decode_plain),
+        ('gzip', encode_gzip, decode_gzip),
+        ('chunk', codec.encode_chunk, codec.decode_chunk),
+    ]
+    if codec.numpy is not None:
+        numpy = codec.numpy
+
+        def encode_python(*args):
+            codec.numpy = None
+            try:
+                return codec.encode_chunk(*args)
+            finally:
+                codec.numpy = numpy
+
+        def decode_python(*args):
+            codec.numpy = None
+            try:
+                return codec.decode_chunk(*args)
+            finally:
+                codec.numpy = numpy
+
+        codecs[2] = ('chunk (numpy)',) + codecs[2][1:]
+        codecs.append(('chunk (python)', encode_python, decode_python))
+
+    print("{} samples, {} bytes plain binary".format(len(timestamps),
+                                                     raw_size))
+    print("{:<16}{:>10}{:>8}{:>14}{:>14}".format(
+        'codec', 'bytes', 'ratio', 'encode MB/s', 'decode MB/s'))
+    for name, encode, decode in codecs:
+        data, encode_time = measure(encode, (timestamps, columns),
+                                    args.repeat)
+        decoded, decode_time = measure(decode, (data,), args.repeat)
+        if decoded != (timestamps, columns):
+            raise RuntimeError("{} does not round-trip.".format(name))
+        print("{:<16}{:>10}{:>8.2f}{:>14.1f}{:>14.1f}".format(
+            name, len(data), raw_size / float(len(data)),
+            megabytes / encode_time, megabytes / decode_time))
+
+
+if __name__ == '__main__':
+    main()
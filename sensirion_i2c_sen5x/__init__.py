@@ -2,15 +2,47 @@
 # (c) Copyright 2022 Sensirion AG, Switzerland
 
 from .version import version as __version__   # noqa: F401
-from .device import Sen5xI2cDevice  # noqa: F401
-from .measured_values import Sen5xMeasuredValues  # noqa: F401
-from .response_types import (  # noqa: F401
-    Sen5xMassConcentration,
-    Sen5xHumidity,
-    Sen5xTemperature,
-    Sen5xAirQualityIndex,
-    Sen5xDeviceStatus,
-    Sen5xVersion,
-)
+import sys
 
 __copyright__ = '(c) Copyright 2022 Sensirion AG, Switzerland'
+
+# Public names and the submodules they are defined in. The submodules are
+# imported only when a name is accessed for the first time (PEP 562), so
+# importing the package itself is cheap.
+_LAZY_IMPORTS = {
+    'Sen5xI2cDevice': 'device',
+    'Sen5xMeasuredValues': 'measured_values',
+    'Sen5xMassConcentration': 'response_types',
+    'Sen5xHumidity': 'response_types',
+    'Sen5xTemperature': 'response_types',
+    'Sen5xAirQualityIndex': 'response_types',
+    'Sen5xDeviceStatus': 'response_types',
+    'Sen5xVersion': 'response_types',
+}
+
+__all__ = sorted(_LAZY_IMPORTS)
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        module_name = _LAZY_IMPORTS.get(name)
+        if module_name is None:
+            raise AttributeError("module '{}' has no attribute '{}'".format(
+                __name__, name))
+        from importlib import import_module
+        value = getattr(import_module('.' + module_name, __name__), name)
+        globals()[name] = value  # subsequent accesses bypass __getattr__
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_LAZY_IMPORTS))
+else:  # No module level __getattr__ available -> import eagerly
+    from .device import Sen5xI2cDevice  # noqa: F401
+    from .measured_values import Sen5xMeasuredValues  # noqa: F401
+    from .response_types import (  # noqa: F401
+        Sen5xMassConcentration,
+        Sen5xHumidity,
+        Sen5xTemperature,
+        Sen5xAirQualityIndex,
+        Sen5xDeviceStatus,
+        Sen5xVersion,
+    )
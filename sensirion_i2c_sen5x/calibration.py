@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .measured_values import Sen5xMeasuredValues
+from .serialization import FIELD_NAMES
+import json
+import os
+import threading
+try:
+    import numpy
+except ImportError:  # optional, only used to speed up fitting
+    numpy = None
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Raw ticks of unavailable values, per signal (see
+#: :py:data:`~sensirion_i2c_sen5x.serialization.FIELD_NAMES` for the order).
+SENTINELS = (0xFFFF, 0xFFFF, 0xFFFF, 0xFFFF, 0x7FFF, 0x7FFF, 0x7FFF, 0x7FFF)
+
+# Valid range of the raw ticks per signal (the sentinels excluded).
+_RANGES = ((0, 0xFFFE),) * 4 + ((-0x8000, 0x7FFE),) * 4
+
+# Index of the temperature signal.
+_TEMPERATURE = 5
+
+
+def fit_linear(x, y, sentinel=None):
+    """
+    Fit ``y = gain * x + offset`` by ordinary least squares. Pairs where any
+    of both values equals ``sentinel`` are ignored. If numpy is installed,
+    the fit is vectorized.
+
+    :param sequence x:
+        Values to be corrected (e.g. raw ticks of a device).
+    :param sequence y:
+        Reference values (e.g. raw ticks of the reference device), aligned
+        with ``x``.
+    :param int sentinel:
+        Value marking unavailable samples, or ``None``.
+    :return:
+        Tuple ``(gain, offset, samples)`` with the number of used samples.
+    :rtype:
+        tuple(float, float, int)
+    :raise ValueError:
+        If the lengths differ or there are not enough distinct values to fit.
+    """
+    if len(x) != len(y):
+        raise ValueError("Sequences of different length: {} and {}.".format(
+            len(x), len(y)))
+    if numpy is not None:
+        xs = numpy.asarray(x, dtype=numpy.float64)
+        ys = numpy.asarray(y, dtype=numpy.float64)
+        if sentinel is not None:
+            mask = (xs != sentinel) & (ys != sentinel)
+            xs, ys = xs[mask], ys[mask]
+        n = len(xs)
+        if n < 2:
+            raise ValueError("Not enough samples to fit: {}.".format(n))
+        mean_x, mean_y = xs.mean(), ys.mean()
+        dx = xs - mean_x
+        sxx = float(numpy.dot(dx, dx))
+        sxy = float(numpy.dot(dx, ys - mean_y))
+    else:
+        if sentinel is not None:
+            pairs = [(a, b) for a, b in zip(x, y)
+                     if a != sentinel and b != sentinel]
+        else:
+            pairs = list(zip(x, y))
+        n = len(pairs)
+        if n < 2:
+            raise ValueError("Not enough samples to fit: {}.".format(n))
+        mean_x = sum(a for a, _ in pairs) / float(n)
+        mean_y = sum(b for _, b in pairs) / float(n)
+        sxx = sum((a - mean_x) ** 2 for a, _ in pairs)
+        sxy = sum((a - mean_x) * (b - mean_y) for a, b in pairs)
+    if sxx == 0:
+        raise ValueError("Cannot fit constant values.")
+    gain = sxy / sxx
+    return gain, float(mean_y - gain * mean_x), n
+
+
+class Sen5xCalibration:
+    """
+    Linear correction (gain and offset) per signal, applied to the raw ticks
+    of measured values:
+
+    ::
+
+        corrected_ticks = round(gain * ticks + offset)
+
+    Unavailable values are passed through unchanged, corrected values are
+    clamped to the valid range of the signal.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        # Fit against a reference device, with columnar, time-aligned raw
+        # ticks (one sequence per signal) of both devices:
+        calibration = Sen5xCalibration.fit(columns, reference_columns)
+
+        # Apply it to every read of the device:
+        device.calibration = calibration
+        values = device.read_measured_values()
+    """
+
+    def __init__(self, coefficients=None):
+        """
+        Constructor.
+
+        :param dict coefficients:
+            Coefficients as dict with the signal index (see
+            :py:data:`~sensirion_i2c_sen5x.serialization.FIELD_NAMES` for the
+            order) as key and a tuple ``(gain, offset)`` as value. The offset
+            is given in raw ticks. Signals without coefficients are not
+            corrected.
+        """
+        super(Sen5xCalibration, self).__init__()
+
+        #: The coefficients (see constructor), must not be modified.
+        self.coefficients = dict(
+            (int(i), (float(gain), float(offset)))
+            for i, (gain, offset) in (coefficients or {}).items())
+        self._corrections = tuple(
+            (i, gain, offset, SENTINELS[i]) + _RANGES[i]
+            for i, (gain, offset) in sorted(self.coefficients.items())
+            if (gain, offset) != (1.0, 0.0))
+
+    @classmethod
+    def fit(cls, columns, reference, signals=None):
+        """
+        Fit the coefficients of all signals against a reference.
+
+        :param list columns:
+            Raw ticks of the device to calibrate, one sequence per signal
+            (8 sequences).
+        :param list reference:
+            Raw ticks of the reference, aligned with ``columns``. A sequence
+            may be ``None`` if there is no reference for that signal.
+        :param signals:
+            Indices of the signals to fit, defaults to all signals with a
+            reference.
+        :return:
+            The fitted calibration. Signals which could not be fitted (e.g.
+            too few available samples) are logged and not corrected.
+        :rtype:
+            ~sensirion_i2c_sen5x.calibration.Sen5xCalibration
+        """
+        if signals is None:
+            signals = [i for i, column in enumerate(reference)
+                       if column is not None]
+        coefficients = {}
+        for i in signals:
+            try:
+                gain, offset, _ = fit_linear(columns[i], reference[i],
+                                             SENTINELS[i])
+            except ValueError as e:
+                log.warning("Cannot calibrate {}: {}".format(FIELD_NAMES[i],
+                                                             e))
+                continue
+            coefficients[i] = (gain, offset)
+        return cls(coefficients)
+
+    def apply(self, values):
+        """
+        Correct a single sample.
+
+        :param values:
+            The raw ticks (tuple of 8 integers) or a
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            object.
+        :return:
+            The corrected sample, of the same type as ``values``.
+        """
+        if not self._corrections:
+            return values
+        ticks = list(getattr(values, 'values', values))
+        for i, gain, offset, sentinel, low, high in self._corrections:
+            t = ticks[i]
+            if t != sentinel:
+                ticks[i] = min(max(int(round(gain * t + offset)), low), high)
+        if isinstance(values, Sen5xMeasuredValues):
+            return Sen5xMeasuredValues(tuple(ticks))
+        return tuple(ticks)
+
+    def apply_columns(self, columns):
+        """
+        Correct columnar history (batch mode).
+
+        :param list columns:
+            One sequence of raw ticks per signal (8 sequences).
+        :return:
+            The corrected columns, as list of 8 lists.
+        :rtype:
+            list
+        """
+        result = [list(column) for column in columns]
+        for i, gain, offset, sentinel, low, high in self._corrections:
+            result[i] = [
+                t if t == sentinel else
+                min(max(int(round(gain * t + offset)), low), high)
+                for t in result[i]]
+        return result
+
+    def push_temperature(self, device, time_constant_s=0):
+        """
+        Move the temperature correction into the device by updating its
+        temperature offset parameters (composed with the currently configured
+        ones, since the calibration was fitted on their output), instead of
+        correcting the temperature on the host.
+
+        If this calibration is attached to the device (see
+        :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.calibration`),
+        it gets replaced by the returned calibration.
+
+        .. note:: The temperature offset parameters are volatile, i.e. they
+                  need to be pushed again after a device reset.
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device.
+        :param int time_constant_s:
+            Time constant in seconds to apply the new parameters.
+        :return:
+            This calibration without the temperature correction.
+        :rtype:
+            ~sensirion_i2c_sen5x.calibration.Sen5xCalibration
+        :raise ValueError:
+            If the resulting parameters are out of range.
+        """
+        coefficients = dict(self.coefficients)
+        if _TEMPERATURE not in coefficients:
+            return self
+        gain, offset = coefficients.pop(_TEMPERATURE)
+        # Device: T = (1 + s0) * T_raw + o0  =>  gain * T + offset
+        #   = (gain * (1 + s0)) * T_raw + (gain * o0 + offset)
+        o0, s0, _ = device.get_temperature_offset_parameters(raw=True)
+        new_offset = int(round(gain * o0 + offset))
+        new_slope = int(round((gain * (1.0 + s0 / 10000.0) - 1.0) * 10000))
+        if not (-0x8000 <= new_offset <= 0x7FFF and
+                -0x8000 <= new_slope <= 0x7FFF):
+            raise ValueError("Temperature correction out of range: offset={}, "
+                             "slope={}.".format(new_offset, new_slope))
+        device.set_temperature_offset_parameters(
+            new_offset, new_slope, time_constant_s, raw=True)
+        result = Sen5xCalibration(coefficients)
+        if getattr(device, 'calibration', None) is self:
+            device.calibration = result
+        return result
+
+    def to_dict(self):
+        """
+        Convert to a JSON serializable dict, with the signal names as keys.
+
+        :return:
+            The calibration as dict.
+        :rtype:
+            dict
+        """
+        return dict((FIELD_NAMES[i], {'gain': gain, 'offset': offset})
+                    for i, (gain, offset) in self.coefficients.items())
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create from a dict created by :py:meth:`to_dict`.
+
+        :param dict data:
+            The calibration as dict.
+        :return:
+            The calibration.
+        :rtype:
+            ~sensirion_i2c_sen5x.calibration.Sen5xCalibration
+        """
+        return cls(dict((FIELD_NAMES.index(name), (c['gain'], c['offset']))
+                        for name, c in data.items()))
+
+
+class Sen5xCalibrationStore:
+    """
+    Stores calibrations keyed by serial number, optionally in a JSON file.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        store = Sen5xCalibrationStore('/var/lib/sen5x/calibration.json')
+        store.put(device.get_serial_number(), calibration)
+
+        # Later, e.g. after a restart:
+        store.attach(device)
+        values = device.read_measured_values()  # corrected
+    """
+
+    def __init__(self, path=None):
+        """
+        Constructor.
+
+        :param str path:
+            Path to the JSON file, or ``None`` to keep the calibrations in
+            memory only. A missing or unreadable file is treated as empty.
+        """
+        super(Sen5xCalibrationStore, self).__init__()
+        self._path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._data = json.load(f)
+            except (IOError, ValueError) as e:
+                log.warning("Ignoring calibration file '{}': {}".format(
+                    path, e))
+
+    def get(self, serial_number):
+        """
+        Get the calibration of a device.
+
+        :param str serial_number:
+            The serial number of the device.
+        :return:
+            The calibration, or ``None`` if not stored.
+        :rtype:
+            ~sensirion_i2c_sen5x.calibration.Sen5xCalibration
+        """
+        with self._lock:
+            data = self._data.get(serial_number)
+        return Sen5xCalibration.from_dict(data) if data is not None else None
+
+    def put(self, serial_number, calibration):
+        """
+        Store the calibration of a device (and save the file).
+
+        :param str serial_number:
+            The serial number of the device.
+        :param ~sensirion_i2c_sen5x.calibration.Sen5xCalibration calibration:
+            The calibration.
+        """
+        with self._lock:
+            self._data[serial_number] = calibration.to_dict()
+            self._save()
+
+    def attach(self, device):
+        """
+        Read the serial number of a device and attach its stored calibration
+        to it (see
+        :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.calibration`).
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device.
+        :return:
+            The attached calibration, or ``None`` if none is stored.
+        :rtype:
+            ~sensirion_i2c_sen5x.calibration.Sen5xCalibration
+        """
+        calibration = self.get(device.get_serial_number())
+        device.calibration = calibration
+        return calibration
+
+    def _save(self):
+        if self._path is None:
+            return
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self._path)
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .commands import \
+    Sen5xI2cCmdDeviceReset, \
+    Sen5xI2cCmdGetNoxAlgorithmTuningParameters, \
+    Sen5xI2cCmdGetRhtAccelerationMode, \
+    Sen5xI2cCmdGetTemperatureOffsetParameters, \
+    Sen5xI2cCmdGetVocAlgorithmState, \
+    Sen5xI2cCmdGetVocAlgorithmTuningParameters, \
+    Sen5xI2cCmdGetWarmStartParameter, \
+    Sen5xI2cCmdSetNoxAlgorithmTuningParameters, \
+    Sen5xI2cCmdSetRhtAccelerationMode, \
+    Sen5xI2cCmdSetTemperatureOffsetParameters, \
+    Sen5xI2cCmdSetVocAlgorithmState, \
+    Sen5xI2cCmdSetVocAlgorithmTuningParameters, \
+    Sen5xI2cCmdSetWarmStartParameter, \
+    Sen5xI2cCmdStartMeasurement, \
+    Sen5xI2cCmdStartMeasurementWithoutPm, \
+    Sen5xI2cCmdStopMeasurement
+import json
+import os
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Names of all features of the feature matrix:
+#:
+#: - ``pm``: Particulate matter measurement.
+#: - ``rht``: Humidity and temperature measurement, including the
+#:   temperature compensation and RH/T acceleration commands.
+#: - ``voc``: VOC index, including the VOC algorithm commands.
+#: - ``nox``: NOx index, including the NOx algorithm commands.
+#: - ``measurement_without_pm``: Low-power measure mode without PM.
+#: - ``mode_switching``: Switching between the measure modes with and
+#:   without PM while measuring (firmware 2.0 and later).
+FEATURES = (
+    'pm',
+    'rht',
+    'voc',
+    'nox',
+    'measurement_without_pm',
+    'mode_switching',
+)
+
+# Features per product, not considering the firmware version.
+_PRODUCT_FEATURES = {
+    'SEN50': ('pm',),
+    'SEN54': ('pm', 'rht', 'voc', 'measurement_without_pm'),
+    'SEN55': ('pm', 'rht', 'voc', 'nox', 'measurement_without_pm'),
+}
+
+# Minimum firmware version (major, minor) per feature.
+_MIN_FIRMWARE = {
+    'mode_switching': (2, 0),
+}
+
+# Features required by commands.
+_COMMAND_FEATURES = (
+    (Sen5xI2cCmdStartMeasurementWithoutPm, 'measurement_without_pm'),
+    (Sen5xI2cCmdGetTemperatureOffsetParameters, 'rht'),
+    (Sen5xI2cCmdSetTemperatureOffsetParameters, 'rht'),
+    (Sen5xI2cCmdGetWarmStartParameter, 'rht'),
+    (Sen5xI2cCmdSetWarmStartParameter, 'rht'),
+    (Sen5xI2cCmdGetRhtAccelerationMode, 'rht'),
+    (Sen5xI2cCmdSetRhtAccelerationMode, 'rht'),
+    (Sen5xI2cCmdGetVocAlgorithmTuningParameters, 'voc'),
+    (Sen5xI2cCmdSetVocAlgorithmTuningParameters, 'voc'),
+    (Sen5xI2cCmdGetVocAlgorithmState, 'voc'),
+    (Sen5xI2cCmdSetVocAlgorithmState, 'voc'),
+    (Sen5xI2cCmdGetNoxAlgorithmTuningParameters, 'nox'),
+    (Sen5xI2cCmdSetNoxAlgorithmTuningParameters, 'nox'),
+)
+
+# Measure modes tracked to detect mode switches.
+_MEASURE_MODES = {
+    Sen5xI2cCmdStartMeasurement: 'pm',
+    Sen5xI2cCmdStartMeasurementWithoutPm: 'without_pm',
+}
+
+
+class Sen5xUnsupportedError(Exception):
+    """
+    Raised if a command is not supported by the product or firmware of the
+    device, before anything is sent to the device.
+    """
+
+    def __init__(self, product_name, firmware, feature, command):
+        super(Sen5xUnsupportedError, self).__init__(
+            "{} is not supported by {} with firmware {}.{} (requires feature "
+            "'{}').".format(type(command).__name__, product_name,
+                            firmware[0], firmware[1], feature))
+        self.product_name = product_name
+        self.firmware = firmware
+        self.feature = feature
+        self.command = command
+
+
+class Sen5xCapabilities:
+    """
+    Feature matrix of a specific device, derived from its product name and
+    firmware version.
+
+    Attach it to a device with
+    :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.capabilities` to let
+    unsupported commands fail locally with a
+    :py:class:`Sen5xUnsupportedError` instead of being sent to the device.
+    Usually this is done by :py:class:`Sen5xCapabilityResolver`.
+    """
+
+    def __init__(self, product_name, firmware):
+        """
+        Constructor.
+
+        :param str product_name:
+            The product name, e.g. "SEN55".
+        :param tuple firmware:
+            The firmware version as tuple ``(major, minor)``.
+        """
+        super(Sen5xCapabilities, self).__init__()
+        self.product_name = product_name
+        self.firmware = tuple(firmware)
+        self._mode = None
+        self._known = product_name in _PRODUCT_FEATURES
+        if not self._known:
+            log.warning("Unknown product '{}', assuming all features are "
+                        "supported.".format(product_name))
+        features = _PRODUCT_FEATURES.get(product_name, FEATURES)
+        if 'measurement_without_pm' in features:
+            features += ('mode_switching',)
+
+        #: Supported features (frozenset of names, see :py:data:`FEATURES`).
+        self.features = frozenset(
+            f for f in features
+            if self.firmware >= _MIN_FIRMWARE.get(f, (0, 0)))
+
+    def supports(self, feature):
+        """
+        Check whether a feature is supported.
+
+        :param str feature:
+            The feature name, see :py:data:`FEATURES`.
+        :return:
+            ``True`` if supported.
+        :rtype:
+            bool
+        """
+        return feature in self.features
+
+    def check(self, command):
+        """
+        Check whether a command can be executed. Called by the device before
+        each command.
+
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to check.
+        :raise ~sensirion_i2c_sen5x.capabilities.Sen5xUnsupportedError:
+            If the command is not supported.
+        """
+        for command_type, feature in _COMMAND_FEATURES:
+            if isinstance(command, command_type) and \
+                    feature not in self.features:
+                raise Sen5xUnsupportedError(self.product_name, self.firmware,
+                                            feature, command)
+        mode = _MEASURE_MODES.get(type(command))
+        if mode is not None and self._mode not in (None, mode) and \
+                'mode_switching' not in self.features:
+            raise Sen5xUnsupportedError(self.product_name, self.firmware,
+                                        'mode_switching', command)
+
+    def executed(self, command):
+        """
+        Track the measure mode after a command was executed successfully.
+        Called by the device after each command.
+
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The executed command.
+        """
+        if isinstance(command, (Sen5xI2cCmdStopMeasurement,
+                                Sen5xI2cCmdDeviceReset)):
+            self._mode = None
+        else:
+            self._mode = _MEASURE_MODES.get(type(command), self._mode)
+
+    def to_dict(self):
+        """
+        Convert to a JSON serializable dict.
+
+        :return: The product name, firmware version and supported features.
+        :rtype: dict
+        """
+        return {
+            'product_name': self.product_name,
+            'firmware': list(self.firmware),
+            'features': sorted(self.features),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create from a dict returned by :py:meth:`to_dict`. The features are
+        derived again from the product name and firmware version.
+
+        :param dict data: The dict.
+        :return: The capabilities.
+        :rtype: ~sensirion_i2c_sen5x.capabilities.Sen5xCapabilities
+        """
+        return cls(data['product_name'], data['firmware'])
+
+    def __str__(self):
+        return '{} (firmware {}.{}): {}'.format(
+            self.product_name, self.firmware[0], self.firmware[1],
+            ', '.join(f for f in FEATURES if f in self.features))
+
+
+class Sen5xCapabilityResolver:
+    """
+    Determines the capabilities of devices and caches them by serial number,
+    optionally in a JSON file to keep them across restarts.
+
+    For a device which is not cached yet, the product name and version are
+    read once. Afterwards, only the serial number is read to look up the
+    cache.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        resolver = Sen5xCapabilityResolver('/var/cache/sen5x.json')
+        capabilities = resolver.resolve(device)
+        if capabilities.supports('nox'):
+            print(device.get_nox_tuning_parameters())
+        device.start_measurement_without_pm()  # fails fast on SEN50
+    """
+
+    def __init__(self, path=None):
+        """
+        Constructor.
+
+        :param str path:
+            Path to the JSON cache file, or ``None`` to cache in memory only.
+            A missing or unreadable file is treated as an empty cache.
+        """
+        super(Sen5xCapabilityResolver, self).__init__()
+        self._path = path
+        self._lock = threading.Lock()
+        self._cache = {}
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._cache = json.load(f)
+            except (IOError, ValueError) as e:
+                log.warning("Ignoring capability cache '{}': {}".format(
+                    path, e))
+
+    def resolve(self, device, attach=True):
+        """
+        Get the capabilities of a device.
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device.
+        :param bool attach:
+            Whether to attach the capabilities to the device (see
+            :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.capabilities`).
+        :return:
+            The capabilities.
+        :rtype:
+            ~sensirion_i2c_sen5x.capabilities.Sen5xCapabilities
+        """
+        serial_number = device.get_serial_number()
+        with self._lock:
+            data = self._cache.get(serial_number)
+        if data is None:
+            version = device.get_version()
+            capabilities = Sen5xCapabilities(
+                device.get_product_name(),
+                (version.firmware.major, version.firmware.minor))
+            with self._lock:
+                self._cache[serial_number] = capabilities.to_dict()
+                self._save()
+        else:
+            capabilities = Sen5xCapabilities.from_dict(data)
+        if attach:
+            device.capabilities = capabilities
+        return capabilities
+
+    def _save(self):
+        if self._path is None:
+            return
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self._cache, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self._path)
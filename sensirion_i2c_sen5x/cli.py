@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+# Only lightweight modules are imported here to keep the startup time of the
+# command line tool short. Everything else is imported by the subcommands.
+from collections import OrderedDict
+import argparse
+import os
+import sys
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Default I²C bus device file.
+DEFAULT_BUS = '/dev/i2c-1'
+
+#: Default I²C slave address.
+DEFAULT_ADDRESS = 0x69
+
+
+def parse_device(text):
+    """
+    Parse a device specification of the form ``BUS[@ADDRESS]``, e.g.
+    ``/dev/i2c-1@0x69``.
+
+    :param str text:
+        The device specification.
+    :return:
+        Tuple of the bus and the slave address.
+    :rtype:
+        tuple
+    """
+    bus, _, address = text.partition('@')
+    return bus, int(address, 0) if address else DEFAULT_ADDRESS
+
+
+def open_devices(stack, specs, transceiver_factory=None):
+    """
+    Open the I²C buses of multiple devices (each bus only once) and create
+    the device objects.
+
+    :param contextlib.ExitStack stack:
+        Exit stack which closes the opened transceivers.
+    :param list(str) specs:
+        Device specifications, see :py:func:`parse_device`.
+    :param callable transceiver_factory:
+        Function taking a bus and returning an opened I²C transceiver for it.
+        Defaults to
+        :py:class:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver`.
+        If the transceiver has a ``close()`` method, it is registered at the
+        exit stack.
+    :return:
+        The devices as ordered dict with the device specification (in the
+        normalized form ``BUS@0xADDRESS``) as key.
+    :rtype:
+        collections.OrderedDict
+    """
+    from sensirion_i2c_driver import I2cConnection
+    from .device import Sen5xI2cDevice
+    if transceiver_factory is None:
+        from sensirion_i2c_driver import LinuxI2cTransceiver
+        transceiver_factory = LinuxI2cTransceiver
+    transceivers = {}
+    devices = OrderedDict()
+    for text in specs:
+        bus, address = parse_device(text)
+        if bus not in transceivers:
+            transceiver = transceiver_factory(bus)
+            if hasattr(transceiver, 'close'):
+                stack.callback(transceiver.close)
+            transceivers[bus] = transceiver
+        devices['{}@0x{:02X}'.format(bus, address)] = Sen5xI2cDevice(
+            I2cConnection(transceivers[bus]), address)
+    return devices
+
+
+def _cmd_info(args, devices, out):
+    for name, device in devices.items():
+        out.write('{}:\n'.format(name))
+        out.write('  Product Name:  {}\n'.format(device.get_product_name()))
+        out.write('  Serial Number: {}\n'.format(device.get_serial_number()))
+        out.write('  Version:       {}\n'.format(device.get_version()))
+    return 0
+
+
+def _cmd_status(args, devices, out):
+    from .status_monitor import STATUS_FLAGS, STICKY_FLAGS
+    result = 0
+    for name, device in devices.items():
+        status = device.read_device_status(clear=args.clear)
+        out.write('{}: 0x{:08X}\n'.format(name, status.value))
+        for flag in STATUS_FLAGS:
+            active = getattr(status, flag)
+            out.write('  {:<24}{}\n'.format(flag, 'SET' if active else '-'))
+        if any(getattr(status, flag) for flag in STICKY_FLAGS):
+            result = 2
+    return result
+
+
+def _parse_config_value(name, text):
+    if name == 'voc_state':
+        return bytes(bytearray.fromhex(text))
+    values = tuple(int(v, 0) for v in text.split(','))
+    return values if len(values) > 1 else values[0]
+
+
+def _cmd_config(args, devices, out):
+    from .configuration import PARAMETER_NAMES, Sen5xConfiguration, \
+        Sen5xConfigurator
+    if args.action == 'get':
+        unknown = [n for n in args.parameters if n not in PARAMETER_NAMES]
+        if unknown:
+            raise ValueError("Unknown parameter(s): {}".format(
+                ', '.join(unknown)))
+        for name, device in devices.items():
+            config = Sen5xConfiguration.read(device, args.parameters or None)
+            out.write('{}:\n'.format(name))
+            for parameter in PARAMETER_NAMES:
+                if parameter in config.values:
+                    value = config.values[parameter]
+                    if isinstance(value, tuple):
+                        value = ','.join(str(v) for v in value)
+                    out.write('  {}={}\n'.format(parameter, value))
+        return 0
+    values = {}
+    for assignment in args.parameters:
+        parameter, sep, text = assignment.partition('=')
+        if not sep or parameter not in PARAMETER_NAMES:
+            raise ValueError("Invalid assignment '{}', expected NAME=VALUE "
+                             "with NAME in: {}".format(
+                                 assignment, ', '.join(PARAMETER_NAMES)))
+        values[parameter] = _parse_config_value(parameter, text)
+    config = Sen5xConfiguration(raw=True, **values)
+    result = 0
+    for name, device in devices.items():
+        report = Sen5xConfigurator(device).apply(
+            config, stop_measurement=args.stop_measurement,
+            restart_measurement=args.restart_measurement)
+        out.write('{}: {}\n'.format(name, report))
+        if not report.success:
+            result = 2
+    return result
+
+
+class _RotatingFile:
+    """
+    Output file which is rotated after a maximum size or age. Rotated files
+    get a sequence number inserted before the extension, e.g.
+    ``data.0001.csv``, continuing after the highest existing one. Without
+    rotation, an existing file is appended to (without repeating the
+    header).
+    """
+
+    def __init__(self, path, binary, max_bytes=None, max_seconds=None,
+                 header=None, stdout=None, clock=time.monotonic):
+        super(_RotatingFile, self).__init__()
+        self._path = path
+        self._binary = binary
+        self._max_bytes = max_bytes
+        self._max_seconds = max_seconds
+        self._header = header
+        self._stdout = stdout
+        self._clock = clock
+        self._rotate = (path != '-') and \
+            ((max_bytes is not None) or (max_seconds is not None))
+        self._index = None
+        self._file = None
+
+    def _next_index(self):
+        base, ext = os.path.splitext(os.path.basename(self._path))
+        prefix = base + '.'
+        index = -1
+        for name in os.listdir(os.path.dirname(self._path) or '.'):
+            number = name[len(prefix):len(name) - len(ext)]
+            if name.startswith(prefix) and name.endswith(ext) and \
+                    len(number) >= 4 and number.isdigit():
+                index = max(index, int(number))
+        return index + 1
+
+    def _open(self):
+        mode = 'b' if self._binary else ''
+        if self._path == '-':
+            self._file = self._stdout
+            self._close_file = False
+        elif self._rotate:
+            if self._index is None:
+                self._index = self._next_index()
+            base, ext = os.path.splitext(self._path)
+            while self._file is None:
+                path = '{}.{:04d}{}'.format(base, self._index, ext)
+                self._index += 1
+                try:
+                    self._file = open(path, 'x' + mode)
+                except FileExistsError:
+                    pass
+            self._close_file = True
+        else:
+            self._file = open(self._path, 'a' + mode)
+            self._close_file = True
+        self._opened_at = self._clock()
+        self._size = 0
+        if self._header and (not self._close_file or self._file.tell() == 0):
+            self._write(self._header)
+
+    def _write(self, data):
+        self._file.write(data)
+        self._size += len(data)
+
+    def write(self, data):
+        if self._file is not None and self._rotate and (
+                (self._max_bytes is not None and
+                 self._size + len(data) > self._max_bytes) or
+                (self._max_seconds is not None and
+                 self._clock() - self._opened_at >= self._max_seconds)):
+            self.close()
+        if self._file is None:
+            self._open()
+        self._write(data)
+
+    def close(self):
+        if self._file is not None:
+            if self._close_file:
+                self._file.close()
+            else:
+                self._file.flush()
+            self._file = None
+
+
+def _cmd_stream(args, devices, out):
+    from .replay import Sen5xFrameArchiveWriter, encode_frame
+    from .serialization import FIELD_NAMES, format_csv_row, \
+        format_line_protocol
+    rotation = dict(max_bytes=args.rotate_bytes,
+                    max_seconds=args.rotate_seconds)
+    files = []
+    writers = OrderedDict()
+    if args.format == 'binary':
+        if args.output == '-' or \
+                (len(devices) > 1 and '{device}' not in args.output):
+            raise ValueError("Binary output requires a file name, containing "
+                             "'{device}' for multiple devices.")
+        for name in devices:
+            f = _RotatingFile(args.output.format(
+                device=name.replace('/', '_').strip('_')), True, **rotation)
+            files.append(f)
+            writers[name] = (f, Sen5xFrameArchiveWriter(f))
+    else:
+        header = 'timestamp,device,' + ','.join(FIELD_NAMES) + '\n' \
+            if args.format == 'csv' else None
+        f = _RotatingFile(args.output, False, header=header, stdout=out,
+                          **rotation)
+        files.append(f)
+    try:
+        if not args.no_start:
+            for device in devices.values():
+                device.start_measurement()
+        sample = 0
+        deadline = time.monotonic()
+        while args.count == 0 or sample < args.count:
+            deadline += args.interval
+            time.sleep(max(deadline - time.monotonic(), 0.0))
+            timestamp_ns = int(time.time() * 1e9)
+            for name, device in devices.items():
+                try:
+                    values = device.read_measured_values()
+                except Exception as e:
+                    log.warning("Failed to read {}: {}".format(name, e))
+                    continue
+                if args.format == 'binary':
+                    writers[name][1].write(timestamp_ns, encode_frame(values))
+                elif args.format == 'csv':
+                    files[0].write('{:.3f},{},'.format(
+                        timestamp_ns / 1e9, name) + format_csv_row(values))
+                else:
+                    line = format_line_protocol(values, tags={'device': name},
+                                                timestamp_ns=timestamp_ns)
+                    if line is not None:
+                        files[0].write(line)
+            sample += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for f in files:
+            f.close()
+        if not args.no_start:
+            for device in devices.values():
+                device.stop_measurement()
+    return 0
+
+
+# Read-only commands measured by the "bench" subcommand.
+_BENCH_METHODS = (
+    'read_data_ready',
+    'read_measured_values',
+    'read_device_status',
+    'get_product_name',
+    'get_serial_number',
+    'get_version',
+    'get_temperature_offset_parameters',
+    'get_warm_start_parameter',
+    'get_rht_acceleration_mode',
+    'get_voc_tuning_parameters',
+    'get_nox_tuning_parameters',
+    'get_fan_auto_cleaning_interval',
+)
+
+
+def _cmd_bench(args, devices, out):
+    out.write('{:<24}{:<36}{:>8}{:>10}{:>10}{:>10}{:>10}\n'.format(
+        'device', 'command', 'errors', 'mean', 'p50', 'p95', 'max'))
+    for name, device in devices.items():
+        for method in _BENCH_METHODS:
+            latencies = []
+            errors = 0
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                try:
+                    getattr(device, method)()
+                except Exception as e:
+                    log.debug("{} failed: {}".format(method, e))
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+            if latencies:
+                latencies.sort()
+                stats = [sum(latencies) / len(latencies),
+                         latencies[len(latencies) // 2],
+                         latencies[min(int(len(latencies) * 0.95),
+                                       len(latencies) - 1)],
+                         latencies[-1]]
+                columns = ''.join('{:>8.3f}ms'.format(s * 1e3)
+                                  for s in stats)
+            else:
+                columns = '{:>40}'.format('n/a')
+            out.write('{:<24}{:<36}{:>8}{}\n'.format(name, method, errors,
+                                                     columns))
+    return 0
+
+
+def _create_parser():
+    parser = argparse.ArgumentParser(
+        prog='sen5x', description='Command line tool for SEN5x devices.')
+    parser.add_argument(
+        '-d', '--device', action='append', metavar='BUS[@ADDRESS]',
+        help='I2C bus device and optional slave address, e.g. '
+             '/dev/i2c-1@0x69 (can be given multiple times, default: '
+             '{})'.format(DEFAULT_BUS))
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='enable debug output')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+
+    info = subparsers.add_parser(
+        'info', help='print product name, serial number and version')
+    info.set_defaults(function=_cmd_info)
+
+    status = subparsers.add_parser('status',
+                                   help='print the decoded device status')
+    status.add_argument('--clear', action='store_true',
+                        help='clear the device status after reading')
+    status.set_defaults(function=_cmd_status)
+
+    config = subparsers.add_parser(
+        'config', help='read or write configuration parameters (raw values)')
+    config.add_argument('action', choices=('get', 'set'))
+    config.add_argument('parameters', nargs='*', metavar='NAME[=VALUE]',
+                        help='parameters to read (default: all), or '
+                             'assignments to write, e.g. '
+                             'voc_tuning_parameters=100,12,12,180,50,230')
+    config.add_argument('--stop-measurement', action='store_true',
+                        help='stop the measurement if needed to write '
+                             'idle-only parameters')
+    config.add_argument('--restart-measurement', action='store_true',
+                        help='restart the measurement after writing if it '
+                             'was stopped')
+    config.set_defaults(function=_cmd_config)
+
+    stream = subparsers.add_parser(
+        'stream', help='log measured values of all devices')
+    stream.add_argument('-f', '--format', default='csv',
+                        choices=('csv', 'line', 'binary'),
+                        help='output format: CSV, InfluxDB line protocol or '
+                             'binary frame archive (default: %(default)s)')
+    stream.add_argument('-o', '--output', default='-',
+                        help="output file, '-' for stdout "
+                             "(default: %(default)s)")
+    stream.add_argument('-n', '--count', type=int, default=0,
+                        help='number of samples, 0 for endless '
+                             '(default: %(default)s)')
+    stream.add_argument('-i', '--interval', type=float, default=1.0,
+                        help='sample interval in seconds '
+                             '(default: %(default)s)')
+    stream.add_argument('--rotate-bytes', type=int,
+                        help='rotate the output file after this size')
+    stream.add_argument('--rotate-seconds', type=float,
+                        help='rotate the output file after this time')
+    stream.add_argument('--no-start', action='store_true',
+                        help='do not start/stop the measurement')
+    stream.set_defaults(function=_cmd_stream)
+
+    bench = subparsers.add_parser(
+        'bench', help='measure the round-trip latency of each read command')
+    bench.add_argument('-n', '--iterations', type=int, default=20,
+                       help='iterations per command (default: %(default)s)')
+    bench.set_defaults(function=_cmd_bench)
+    return parser
+
+
+def main(argv=None, transceiver_factory=None, out=None):
+    """
+    Entry point of the ``sen5x`` command line tool.
+
+    :param list argv:
+        Command line arguments (defaults to ``sys.argv[1:]``).
+    :param callable transceiver_factory:
+        See :py:func:`open_devices`.
+    :param out:
+        Text stream for the output (defaults to ``sys.stdout``).
+    :return:
+        The exit code.
+    :rtype:
+        int
+    """
+    from contextlib import ExitStack
+    args = _create_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose
+                        else logging.WARNING)
+    out = out or sys.stdout
+    try:
+        with ExitStack() as stack:
+            devices = open_devices(stack, args.device or [DEFAULT_BUS],
+                                   transceiver_factory)
+            return args.function(args, devices, out)
+    except Exception as e:
+        if args.verbose:
+            raise
+        sys.stderr.write('Error: {}\n'.format(e))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
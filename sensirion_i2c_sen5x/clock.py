@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+import threading
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class Sen5xSystemClock:
+    """
+    Clock based on the real system time, i.e. :py:func:`time.monotonic`,
+    :py:func:`time.time` and :py:func:`time.sleep`.
+
+    Every clock object provides these three methods, so its bound methods
+    can be passed to all ``clock``/``sleep`` parameters of this package, and
+    the clock object itself to
+    :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.clock`.
+    """
+
+    def monotonic(self):
+        """
+        Get a monotonic time (e.g. to measure intervals).
+
+        :return:
+            Time in seconds.
+        :rtype:
+            float
+        """
+        return time.monotonic()
+
+    def time(self):
+        """
+        Get the current wall-clock time.
+
+        :return:
+            Time in seconds since the epoch.
+        :rtype:
+            float
+        """
+        return time.time()
+
+    def sleep(self, seconds):
+        """
+        Sleep for the given time.
+
+        :param float seconds:
+            Time to sleep in seconds.
+        """
+        time.sleep(seconds)
+
+
+#: The default clock, used if no other clock is specified.
+SYSTEM_CLOCK = Sen5xSystemClock()
+
+
+class Sen5xVirtualClock(Sen5xSystemClock):
+    """
+    Deterministic clock for simulations and tests: :py:meth:`sleep` does not
+    wait but advances the virtual time immediately, so e.g. a week of
+    simulated operation runs within seconds.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        clock = Sen5xVirtualClock()
+        transceiver = Sen5xSimulatedTransceiver(clock=clock.monotonic,
+                                                sleep=clock.sleep)
+        device = Sen5xI2cDevice(I2cConnection(transceiver), clock=clock)
+        device.start_measurement()
+        for _ in range(7 * 24 * 60):
+            clock.sleep(60.0)
+            values = device.read_measured_values()
+    """
+
+    def __init__(self, start=0.0, epoch=1640995200.0):
+        """
+        Constructor.
+
+        :param float start:
+            Initial (monotonic) time in seconds.
+        :param float epoch:
+            Wall-clock time (seconds since the epoch) corresponding to the
+            initial time. Defaults to 2022-01-01 00:00:00 UTC.
+        """
+        super(Sen5xVirtualClock, self).__init__()
+        self._lock = threading.Lock()
+        self._now = float(start)
+        self._offset = epoch - start
+
+    def monotonic(self):
+        with self._lock:
+            return self._now
+
+    def time(self):
+        with self._lock:
+            return self._now + self._offset
+
+    def sleep(self, seconds):
+        """
+        Advance the virtual time without waiting.
+
+        :param float seconds:
+            Time to advance in seconds.
+        """
+        if seconds < 0:
+            raise ValueError("Sleep length must be non-negative.")
+        with self._lock:
+            self._now += seconds
+
+
+def get_clock(device):
+    """
+    Get the clock of a device, e.g. to be used by helpers working with that
+    device.
+
+    :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+        The device.
+    :return:
+        The clock of the device, or :py:data:`SYSTEM_CLOCK` if the device has
+        no clock assigned.
+    """
+    clock = getattr(device, 'clock', None)
+    return SYSTEM_CLOCK if clock is None else clock
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from itertools import accumulate
+from struct import pack, unpack_from
+import zlib
+try:
+    import numpy
+except ImportError:  # optional, only used to speed up encoding/decoding
+    numpy = None
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Number of signals (columns) per chunk.
+SIGNAL_COUNT = 8
+
+#: Magic bytes at the beginning of every chunk.
+MAGIC = b'S5XC'
+
+#: Version of the chunk format.
+VERSION = 1
+
+_HEADER_FORMAT = '>4sBI'
+_HEADER_SIZE = 9
+_CRC_FORMAT = '>I'
+_CRC_SIZE = 4
+
+# Maximum length of a varint of a 64 bit value.
+_MAX_VARINT_SIZE = 10
+
+
+def _wrap(value):
+    # Wrap to the int64 range like the numpy arithmetic does.
+    return ((value + 0x8000000000000000) & 0xFFFFFFFFFFFFFFFF) - \
+        0x8000000000000000
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _deltas(values):
+    previous = 0
+    result = []
+    for value in values:
+        result.append(value - previous)
+        previous = value
+    return result
+
+
+def _encode_python(timestamps, columns):
+    # Delta-of-delta of the timestamps: first timestamp, first delta, then
+    # the changes of the deltas (mostly zero for periodic samples).
+    deltas = [_wrap(delta) for delta in _deltas(timestamps)]
+    streams = [[_wrap(delta) for delta in deltas[:1] + _deltas(deltas[1:])]]
+    streams.extend(_deltas(column) for column in columns)
+    out = bytearray()
+    append = out.append
+    for stream in streams:
+        for value in stream:
+            value = _zigzag(value)
+            while value >= 0x80:
+                append((value & 0x7F) | 0x80)
+                value >>= 7
+            append(value)
+    return bytes(out)
+
+
+def _decode_python(payload, count):
+    values = []
+    append = values.append
+    value = 0
+    shift = 0
+    for byte in bytearray(payload):
+        if byte < 0x80:
+            append(_unzigzag(value | (byte << shift)))
+            value = 0
+            shift = 0
+        else:
+            value |= (byte & 0x7F) << shift
+            shift += 7
+    if shift or len(values) != (SIGNAL_COUNT + 1) * count:
+        raise ValueError("Corrupt chunk: wrong number of values.")
+    streams = [values[i * count:(i + 1) * count]
+               for i in range(SIGNAL_COUNT + 1)]
+    deltas = streams[0][:1] + [_wrap(delta)
+                               for delta in accumulate(streams[0][1:])]
+    return ([_wrap(timestamp) for timestamp in accumulate(deltas)],
+            [list(accumulate(stream)) for stream in streams[1:]])
+
+
+def _encode_numpy(timestamps, columns):
+    values = numpy.empty((SIGNAL_COUNT + 1, len(timestamps)),
+                         dtype=numpy.int64)
+    values[0] = timestamps
+    values[1:] = columns
+    values[:, 1:] = numpy.diff(values, axis=1)
+    values[0, 2:] = numpy.diff(values[0, 1:])
+    # Zig-zag encoding (wrapping shifts give the correct bit pattern).
+    values = ((values << 1) ^ (values >> 63)).view(numpy.uint64).ravel()
+    lengths = numpy.ones(len(values), dtype=numpy.int64)
+    for k in range(1, _MAX_VARINT_SIZE):
+        lengths += values >= numpy.uint64(1 << (7 * k))
+    ends = numpy.cumsum(lengths)
+    starts = ends - lengths
+    out = numpy.empty(int(ends[-1]) if len(ends) else 0, dtype=numpy.uint8)
+    for k in range(int(lengths.max()) if len(lengths) else 0):
+        mask = lengths > k
+        groups = (values[mask] >> numpy.uint64(7 * k)) & numpy.uint64(0x7F)
+        groups |= (lengths[mask] > k + 1).astype(numpy.uint64) << \
+            numpy.uint64(7)
+        out[starts[mask] + k] = groups
+    return out.tobytes()
+
+
+def _decode_numpy(payload, count):
+    data = numpy.frombuffer(payload, dtype=numpy.uint8)
+    ends = numpy.flatnonzero(data < 0x80)
+    if len(ends) != (SIGNAL_COUNT + 1) * count or \
+            (len(data) and ends[-1] != len(data) - 1):
+        raise ValueError("Corrupt chunk: wrong number of values.")
+    starts = numpy.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    if len(lengths) and lengths.max() > _MAX_VARINT_SIZE:
+        raise ValueError("Corrupt chunk: varint too long.")
+    values = numpy.zeros(len(ends), dtype=numpy.uint64)
+    for k in range(int(lengths.max()) if len(lengths) else 0):
+        mask = lengths > k
+        values[mask] |= (data[starts[mask] + k] & 0x7F).astype(
+            numpy.uint64) << numpy.uint64(7 * k)
+    values = (values >> numpy.uint64(1)).view(numpy.int64) ^ \
+        -(values & numpy.uint64(1)).view(numpy.int64)
+    values = values.reshape(SIGNAL_COUNT + 1, count)
+    numpy.cumsum(values[0, 1:], out=values[0, 1:])
+    numpy.cumsum(values, axis=1, out=values)
+    return values[0].tolist(), values[1:].tolist()
+
+
+def encode_chunk(timestamps, columns):
+    """
+    Encode a chunk of measured values into a compact binary format.
+
+    Since consecutive samples are highly autocorrelated, the timestamps are
+    stored as delta-of-delta (mostly zero for a constant sampling interval)
+    and each signal as deltas of the raw ticks, all as zig-zag varints (small
+    positive or negative numbers take one byte). If numpy is installed, the
+    whole chunk is encoded vectorized.
+
+    The chunk consists of a header (:py:data:`MAGIC`, :py:data:`VERSION` and
+    the number of samples as big-endian uint32), the varints of the
+    timestamps followed by the varints of each signal, and a CRC-32 of all
+    preceding bytes (big-endian).
+
+    Example how to use this function:
+
+    .. code-block:: python
+
+        for result in replay_archives(paths):
+            timestamps = list(result.timestamps)
+            columns = list(zip(*(result.values(i)
+                                 for i in range(len(result)))))
+            data = encode_chunk(timestamps, columns)
+
+    :param sequence timestamps:
+        Timestamps as integers (e.g. in nanoseconds), within the int64 range.
+    :param list columns:
+        Raw ticks, one sequence per signal (8 sequences), aligned with
+        ``timestamps``.
+    :return:
+        The encoded chunk.
+    :rtype:
+        bytes
+    :raise ValueError:
+        If the number of columns or their lengths do not match.
+    """
+    count = len(timestamps)
+    if len(columns) != SIGNAL_COUNT or \
+            any(len(column) != count for column in columns):
+        raise ValueError("Expected {} columns of {} values.".format(
+            SIGNAL_COUNT, count))
+    if numpy is not None:
+        payload = _encode_numpy(timestamps, columns)
+    else:
+        payload = _encode_python(timestamps, columns)
+    data = pack(_HEADER_FORMAT, MAGIC, VERSION, count) + payload
+    return data + pack(_CRC_FORMAT, zlib.crc32(data) & 0xFFFFFFFF)
+
+
+def decode_chunk(data):
+    """
+    Decode a chunk created by :py:func:`encode_chunk`. If numpy is
+    installed, the whole chunk is decoded vectorized.
+
+    :param bytes data:
+        The encoded chunk.
+    :return:
+        Tuple ``(timestamps, columns)`` with the timestamps as list and the
+        raw ticks as list of 8 lists.
+    :rtype:
+        tuple
+    :raise ValueError:
+        If the chunk is invalid or corrupt.
+    """
+    if len(data) < _HEADER_SIZE + _CRC_SIZE:
+        raise ValueError("Chunk too short: {} bytes.".format(len(data)))
+    magic, version, count = unpack_from(_HEADER_FORMAT, data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported chunk format: {!r}, version {}.".format(
+            magic, version))
+    crc = unpack_from(_CRC_FORMAT, data, len(data) - _CRC_SIZE)[0]
+    if zlib.crc32(data[:-_CRC_SIZE]) & 0xFFFFFFFF != crc:
+        raise ValueError("Corrupt chunk: wrong checksum.")
+    payload = data[_HEADER_SIZE:-_CRC_SIZE]
+    if numpy is not None:
+        return _decode_numpy(payload, count)
+    return _decode_python(payload, count)
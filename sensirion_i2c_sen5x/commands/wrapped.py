@@ -12,6 +12,7 @@ from .generated import \
     Sen5xI2cCmdSetTemperatureOffsetParameters as SetTemperatureOffsetParametersGenerated, \
     Sen5xI2cCmdSetWarmStartParameter as SetWarmStartParameterGenerated
 from ..measured_values import Sen5xMeasuredValues
+from .. import profiling
 from ..response_types import Sen5xDeviceStatus, Sen5xFirmwareVersion, \
     Sen5xHardwareVersion, Sen5xProtocolVersion, Sen5xVersion
 
@@ -76,8 +77,15 @@ class Sen5xI2cCmdReadMeasuredValues(ReadMeasuredValuesGenerated):
         :raise ~sensirion_i2c_driver.errors.I2cChecksumError:
             If a received CRC was wrong.
         """
-        values = ReadMeasuredValuesGenerated.interpret_response(self, data)
-        return Sen5xMeasuredValues(values)
+        if not profiling._hooks:
+            values = ReadMeasuredValuesGenerated.interpret_response(self, data)
+            return Sen5xMeasuredValues(values)
+        hooks = profiling.sample()
+        values = profiling.run_decode(
+            hooks, 0x03C4, 'crc',
+            ReadMeasuredValuesGenerated.interpret_response, self, data)
+        return profiling.run_decode(
+            hooks, 0x03C4, 'measured_values', Sen5xMeasuredValues, values)
 
 
 class Sen5xI2cCmdGetTemperatureOffsetParameters(GetTemperatureOffsetParametersGenerated):
@@ -305,7 +313,7 @@ class Sen5xI2cCmdReadDeviceStatus(ReadDeviceStatusGenerated):
             If a received CRC was wrong.
         """
         value = ReadDeviceStatusGenerated.interpret_response(self, data)
-        return Sen5xDeviceStatus(value)
+        return Sen5xDeviceStatus.from_value(value)
 
 
 class Sen5xI2cCmdReadAndClearDeviceStatus(ReadAndClearDeviceStatusGenerated):
@@ -331,4 +339,4 @@ class Sen5xI2cCmdReadAndClearDeviceStatus(ReadAndClearDeviceStatusGenerated):
             If a received CRC was wrong.
         """
         value = ReadAndClearDeviceStatusGenerated.interpret_response(self, data)
-        return Sen5xDeviceStatus(value)
+        return Sen5xDeviceStatus.from_value(value)
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .clock import get_clock
+from .commands import \
+    Sen5xI2cCmdGetFanAutoCleaningInterval, \
+    Sen5xI2cCmdGetNoxAlgorithmTuningParameters, \
+    Sen5xI2cCmdGetRhtAccelerationMode, \
+    Sen5xI2cCmdGetTemperatureOffsetParameters, \
+    Sen5xI2cCmdGetVocAlgorithmTuningParameters, \
+    Sen5xI2cCmdGetWarmStartParameter, \
+    Sen5xI2cCmdSetFanAutoCleaningInterval, \
+    Sen5xI2cCmdSetNoxAlgorithmTuningParameters, \
+    Sen5xI2cCmdSetRhtAccelerationMode, \
+    Sen5xI2cCmdSetTemperatureOffsetParameters, \
+    Sen5xI2cCmdSetVocAlgorithmState, \
+    Sen5xI2cCmdSetVocAlgorithmTuningParameters, \
+    Sen5xI2cCmdSetWarmStartParameter, \
+    Sen5xI2cCmdStartMeasurement, \
+    Sen5xI2cCmdStopMeasurement
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class _Parameter:
+    """
+    Describes how a configuration parameter is read from and written to the
+    device.
+    """
+
+    def __init__(self, name, getter, setter, idle_only):
+        super(_Parameter, self).__init__()
+        self.name = name
+        self.getter = getter  # None means write-only
+        self.setter = setter
+        self.idle_only = idle_only
+
+
+# All parameters in the order they are applied. Values are always in raw
+# (integer) representation to allow exact comparison with the read-back.
+_PARAMETERS = (
+    _Parameter(
+        'temperature_offset_parameters',
+        lambda: Sen5xI2cCmdGetTemperatureOffsetParameters(raw=True),
+        lambda v: Sen5xI2cCmdSetTemperatureOffsetParameters(*v, raw=True),
+        idle_only=False),
+    _Parameter(
+        'warm_start',
+        lambda: Sen5xI2cCmdGetWarmStartParameter(raw=True),
+        lambda v: Sen5xI2cCmdSetWarmStartParameter(v, raw=True),
+        idle_only=False),
+    _Parameter(
+        'rht_acceleration_mode',
+        Sen5xI2cCmdGetRhtAccelerationMode,
+        Sen5xI2cCmdSetRhtAccelerationMode,
+        idle_only=False),
+    _Parameter(
+        'fan_auto_cleaning_interval',
+        Sen5xI2cCmdGetFanAutoCleaningInterval,
+        Sen5xI2cCmdSetFanAutoCleaningInterval,
+        idle_only=False),
+    _Parameter(
+        'voc_tuning_parameters',
+        Sen5xI2cCmdGetVocAlgorithmTuningParameters,
+        lambda v: Sen5xI2cCmdSetVocAlgorithmTuningParameters(*v),
+        idle_only=True),
+    _Parameter(
+        'nox_tuning_parameters',
+        Sen5xI2cCmdGetNoxAlgorithmTuningParameters,
+        lambda v: Sen5xI2cCmdSetNoxAlgorithmTuningParameters(*v),
+        idle_only=True),
+    _Parameter(
+        # The VOC state is applied only once when starting the next
+        # measurement, so the read-back does not tell whether the state is
+        # still pending. Thus it is always written and never verified.
+        'voc_state',
+        None,
+        Sen5xI2cCmdSetVocAlgorithmState,
+        idle_only=True),
+)
+
+#: Names of all configuration parameters, in the order they are applied.
+PARAMETER_NAMES = tuple(p.name for p in _PARAMETERS)
+
+
+class Sen5xConfiguration:
+    """
+    Desired configuration of a SEN5x device.
+
+    Each parameter is optional, parameters set to ``None`` are left untouched
+    when applying the configuration. All values are stored in their raw
+    integer representation as transferred over I²C (see :py:attr:`values`),
+    so they can be compared exactly with the values read back from the
+    device.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        config = Sen5xConfiguration(
+            temperature_offset_parameters=(-1.5, 0.0, 60),
+            warm_start=1.0,
+            rht_acceleration_mode=1,
+            voc_tuning_parameters=(100, 12, 12, 180, 50, 230),
+        )
+        report = Sen5xConfigurator(device).apply(config)
+        print(report)
+    """
+
+    def __init__(self, temperature_offset_parameters=None, warm_start=None,
+                 rht_acceleration_mode=None, fan_auto_cleaning_interval=None,
+                 voc_tuning_parameters=None, nox_tuning_parameters=None,
+                 voc_state=None, raw=False):
+        """
+        Constructor.
+
+        :param tuple temperature_offset_parameters:
+            Tuple of offset, slope and time constant, see
+            :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.set_temperature_offset_parameters()`.
+        :param float/int warm_start:
+            Warm start parameter, see
+            :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.set_warm_start_parameter()`.
+        :param int rht_acceleration_mode:
+            RH/T acceleration mode, see
+            :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.set_rht_acceleration_mode()`.
+        :param int fan_auto_cleaning_interval:
+            Fan auto cleaning interval [s], see
+            :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.set_fan_auto_cleaning_interval()`.
+        :param tuple voc_tuning_parameters:
+            Tuple of all six VOC tuning parameters, see
+            :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.set_voc_tuning_parameters()`.
+        :param tuple nox_tuning_parameters:
+            Tuple of all six NOx tuning parameters, see
+            :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.set_nox_tuning_parameters()`.
+        :param bytes voc_state:
+            VOC algorithm state to restore, see
+            :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.set_voc_state()`.
+        :param bool raw:
+            If ``False`` (the default), temperature offset parameters and
+            warm start parameter are expected as physical/normalized values
+            like for the corresponding setters of
+            :py:class:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice`. Otherwise,
+            raw integer values are expected.
+        """
+        super(Sen5xConfiguration, self).__init__()
+        if (temperature_offset_parameters is not None) and not raw:
+            offset, slope, time_constant = temperature_offset_parameters
+            temperature_offset_parameters = (
+                int(round(offset * 200.0)), int(round(slope * 10000.0)),
+                int(round(time_constant)))
+        if (warm_start is not None) and not raw:
+            warm_start = int(round(warm_start * 65535.0))
+
+        #: All configured parameters in raw representation, as dict with the
+        #: parameter name as key (see :py:data:`PARAMETER_NAMES`). Parameters
+        #: which are not configured are not contained.
+        self.values = {}
+        for name, value in (
+                ('temperature_offset_parameters',
+                 temperature_offset_parameters),
+                ('warm_start', warm_start),
+                ('rht_acceleration_mode', rht_acceleration_mode),
+                ('fan_auto_cleaning_interval', fan_auto_cleaning_interval),
+                ('voc_tuning_parameters', voc_tuning_parameters),
+                ('nox_tuning_parameters', nox_tuning_parameters),
+                ('voc_state', voc_state)):
+            if value is not None:
+                self.values[name] = _normalize(value)
+
+    @classmethod
+    def read(cls, device, names=None):
+        """
+        Read the current configuration from a device.
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device to read from.
+        :param list(str) names:
+            Names of the parameters to read. ``None`` reads all readable
+            parameters (i.e. all except the VOC state).
+        :return:
+            The current configuration of the device.
+        :rtype:
+            ~sensirion_i2c_sen5x.configuration.Sen5xConfiguration
+        """
+        config = cls()
+        for parameter in _PARAMETERS:
+            if (parameter.getter is not None) and \
+                    (names is None or parameter.name in names):
+                config.values[parameter.name] = _normalize(
+                    device.execute(parameter.getter()))
+        return config
+
+    def __str__(self):
+        return ', '.join('{}={}'.format(name, self.values[name])
+                         for name in PARAMETER_NAMES if name in self.values)
+
+
+def _normalize(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    elif isinstance(value, (tuple, list)):
+        return tuple(int(v) for v in value)
+    else:
+        return int(value)
+
+
+class Sen5xConfigurationReport:
+    """
+    Result of applying a configuration with
+    :py:meth:`Sen5xConfigurator.apply`.
+    """
+
+    def __init__(self):
+        super(Sen5xConfigurationReport, self).__init__()
+
+        #: Names of parameters which were written to the device.
+        self.changed = []
+
+        #: Names of parameters which were skipped because the device already
+        #: had the desired value.
+        self.unchanged = []
+
+        #: Parameters which did not have the desired value after writing, as
+        #: dict with the parameter name as key and a tuple of the desired and
+        #: the read-back value (both raw) as value. The read-back value is
+        #: ``None`` for write-only parameters which were not written because
+        #: the device was not known to be in idle mode.
+        self.failed = {}
+
+        #: Whether the measurement was stopped to write idle-only parameters.
+        self.stopped_measurement = False
+
+        #: Whether the measurement was restarted after writing.
+        self.restarted_measurement = False
+
+        #: Total time in seconds needed to apply the configuration.
+        self.duration = 0.0
+
+    @property
+    def success(self):
+        """
+        Whether all parameters have their desired values.
+
+        :type: bool
+        """
+        return len(self.failed) == 0
+
+    def __str__(self):
+        return 'changed: [{}], unchanged: [{}], failed: [{}] ({:.3f} s)'.format(
+            ', '.join(self.changed), ', '.join(self.unchanged),
+            ', '.join(sorted(self.failed)), self.duration)
+
+
+class Sen5xConfigurator:
+    """
+    Applies a :py:class:`Sen5xConfiguration` to a device in a single planned
+    sequence.
+
+    The sequence consists of these steps:
+
+    1. Read back all configured (readable) parameters.
+    2. Skip all parameters which already have the desired value.
+    3. If any idle-only parameter (VOC/NOx tuning parameters, VOC state) needs
+       to be written, optionally stop the measurement first.
+    4. Write all changed parameters.
+    5. Read back the written parameters to verify them.
+    6. Optionally restart the measurement if it was stopped in step 3.
+
+    Instead of sleeping for the post processing time after each command, the
+    configurator only waits for the remaining post processing time right
+    before sending the next command, so any host-side processing in between
+    overlaps with the post processing on the device.
+    """
+
+    def __init__(self, device, clock=None, sleep=None):
+        """
+        Constructor.
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device to configure.
+        :param callable clock:
+            Function returning a monotonic time in seconds. Defaults to the
+            device's clock (see
+            :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.clock`).
+        :param callable sleep:
+            Function to sleep for a given number of seconds. Defaults to the
+            sleep of the device's clock.
+        """
+        super(Sen5xConfigurator, self).__init__()
+        self._device = device
+        self._clock = clock or get_clock(device).monotonic
+        self._sleep = sleep or get_clock(device).sleep
+        self._ready_at = 0.0
+
+    def apply(self, config, stop_measurement=False, verify=True,
+              restart_measurement=False):
+        """
+        Apply the given configuration to the device.
+
+        :param ~sensirion_i2c_sen5x.configuration.Sen5xConfiguration config:
+            The desired configuration.
+        :param bool stop_measurement:
+            If ``True`` and idle-only parameters need to be written, the
+            measurement is stopped before writing them (this has no effect if
+            the device is already in idle mode). If ``False``, the device
+            must already be in idle mode, otherwise the idle-only parameters
+            with a read-back will be reported as failed after verification.
+            As the device mode is known only after stopping the measurement,
+            the VOC state (which cannot be read back) is written only if
+            ``stop_measurement`` is ``True``, and is reported as failed
+            otherwise.
+        :param bool verify:
+            Whether to read back and verify all written parameters.
+        :param bool restart_measurement:
+            If ``True`` and the measurement was stopped, restart it with
+            :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.start_measurement()`
+            after writing. Otherwise the device is left in idle mode, see
+            :py:attr:`Sen5xConfigurationReport.stopped_measurement` to
+            restart it in the desired measure mode.
+        :return:
+            Report about which parameters were changed, skipped or failed.
+        :rtype:
+            ~sensirion_i2c_sen5x.configuration.Sen5xConfigurationReport
+        """
+        report = Sen5xConfigurationReport()
+        start = self._clock()
+        parameters = [p for p in _PARAMETERS if p.name in config.values]
+
+        # Read back current values and plan the writes
+        writes = []
+        for parameter in parameters:
+            desired = config.values[parameter.name]
+            if (parameter.getter is not None) and \
+                    (self._execute(parameter.getter()) == desired):
+                report.unchanged.append(parameter.name)
+            else:
+                writes.append(parameter)
+
+        if stop_measurement and any(p.idle_only for p in writes):
+            self._execute(Sen5xI2cCmdStopMeasurement())
+            report.stopped_measurement = True
+
+        for parameter in list(writes):
+            desired = config.values[parameter.name]
+            if parameter.idle_only and (parameter.getter is None) and \
+                    not report.stopped_measurement:
+                # Would silently be ignored in measure mode
+                log.warning("Not writing '{}' since the device is not known "
+                            "to be in idle mode.".format(parameter.name))
+                writes.remove(parameter)
+                report.failed[parameter.name] = (desired, None)
+                continue
+            self._execute(parameter.setter(desired))
+            report.changed.append(parameter.name)
+
+        if verify:
+            for parameter in writes:
+                if parameter.getter is None:
+                    continue
+                desired = config.values[parameter.name]
+                actual = self._execute(parameter.getter())
+                if actual != desired:
+                    report.failed[parameter.name] = (desired, actual)
+
+        if restart_measurement and report.stopped_measurement:
+            self._execute(Sen5xI2cCmdStartMeasurement())
+            report.restarted_measurement = True
+
+        self._wait_ready()  # leave the device ready for the next command
+        report.duration = self._clock() - start
+        log.debug("Applied configuration: {}".format(report))
+        return report
+
+    def _wait_ready(self):
+        remaining = self._ready_at - self._clock()
+        if remaining > 0.0:
+            self._sleep(remaining)
+
+    def _execute(self, command):
+        self._wait_ready()
+        result = self._device.execute(command, wait_post_process=False)
+        self._ready_at = self._clock() + command.post_processing_time
+        return _normalize(result) if result is not None else None
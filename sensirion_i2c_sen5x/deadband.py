@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .filters import SENTINELS
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Compression method: a value is reported if it differs by more than the
+#: tolerance from the last reported value, which is held in between. Suited
+#: best for noisy signals without trends.
+DEADBAND = 'deadband'
+
+#: Compression method: swinging door trending, i.e. only the end points of
+#: straight segments are reported, which are linearly interpolated in
+#: between. Suited best for smooth signals with trends.
+SWINGING_DOOR = 'swinging_door'
+
+#: All compression methods.
+METHODS = (DEADBAND, SWINGING_DOOR)
+
+#: Default tolerances in raw ticks per signal (see
+#: :py:data:`~sensirion_i2c_sen5x.serialization.FIELD_NAMES` for the order),
+#: i.e. 0.1 µg/m³, 0.01 %RH, 1/200 °C and 0.1 index points.
+DEFAULT_TOLERANCES = (1, 1, 1, 1, 1, 1, 1, 1)
+
+# Margin to keep interpolated values away from the rounding boundaries.
+_EPSILON = 1e-9
+
+
+class _Deadband:
+    def __init__(self, tolerance, sentinel):
+        self._tolerance = tolerance
+        self._sentinel = sentinel
+        self._held = None
+        self._last = None
+
+    def put(self, timestamp, value):
+        held = self._held
+        self._last = (timestamp, value)
+        if held is not None:
+            if value == self._sentinel or held[1] == self._sentinel:
+                if value == held[1]:
+                    return []
+            elif abs(value - held[1]) <= self._tolerance:
+                return []
+        self._held = self._last
+        return [self._last]
+
+    def flush(self):
+        if self._last is None or self._last is self._held:
+            return []
+        self._held = self._last
+        return [self._last]
+
+
+class _SwingingDoor:
+    def __init__(self, tolerance, sentinel):
+        # Interpolated values within this margin round to values within the
+        # tolerance.
+        self._margin = tolerance + 0.5 - _EPSILON
+        self._sentinel = sentinel
+        self._anchor = None
+        self._candidate = None
+        self._low = float('-inf')
+        self._high = float('inf')
+
+    def put(self, timestamp, value):
+        anchor = self._anchor
+        candidate = self._candidate
+        sentinel = self._sentinel
+        if anchor is None or anchor[1] == sentinel:
+            if anchor is not None and value == sentinel:
+                return []
+            self._anchor = (timestamp, value)
+            return [self._anchor]
+        if value == sentinel:
+            # End the segment at the last available value.
+            points = [] if candidate is None else [candidate]
+            self._anchor = (timestamp, value)
+            self._candidate = None
+            return points + [self._anchor]
+        if candidate is None:
+            self._start_segment(timestamp, value)
+            return []
+        # The current sample can end the segment if the line from the anchor
+        # to it passes all samples in between (including the candidate)
+        # within the tolerance.
+        ta, va = anchor
+        tc, vc = candidate
+        low = max(self._low, (vc - self._margin - va) / (tc - ta))
+        high = min(self._high, (vc + self._margin - va) / (tc - ta))
+        slope = (value - va) / (timestamp - ta)
+        if low <= slope <= high:
+            self._low, self._high = low, high
+            self._candidate = (timestamp, value)
+            return []
+        self._anchor = candidate
+        self._start_segment(timestamp, value)
+        return [candidate]
+
+    def _start_segment(self, timestamp, value):
+        self._candidate = (timestamp, value)
+        self._low = float('-inf')
+        self._high = float('inf')
+
+    def flush(self):
+        candidate = self._candidate
+        if candidate is None:
+            return []
+        self._anchor = candidate
+        self._candidate = None
+        return [candidate]
+
+
+class Sen5xDeadbandEncoder:
+    """
+    Change-only reporting: compresses a stream of measured values by
+    reporting only the points needed to reconstruct every signal within a
+    tolerance (see :py:func:`reconstruct`), since the values often barely
+    change from sample to sample.
+
+    Each signal is compressed independently, and the reported points are
+    tuples ``(signal, timestamp, ticks)`` with the signal index (see
+    :py:data:`~sensirion_i2c_sen5x.serialization.FIELD_NAMES` for the order)
+    and the raw ticks. Changes between available and unavailable values are
+    always reported.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        encoder = Sen5xDeadbandEncoder()
+        while True:
+            values = device.read_measured_values()
+            for signal, timestamp, ticks in encoder.put(time.time(), values):
+                publish(signal, timestamp, ticks)
+            ...
+        for point in encoder.flush():
+            publish(*point)
+        print("Compression ratio: {:.1f}".format(encoder.compression_ratio))
+    """
+
+    def __init__(self, tolerances=DEFAULT_TOLERANCES, method=SWINGING_DOOR):
+        """
+        Constructor.
+
+        :param tuple tolerances:
+            Maximum deviation of the reconstructed values in raw ticks, per
+            signal (8 integers). 0 means lossless.
+        :param str method:
+            Compression method, one of :py:data:`METHODS`.
+        """
+        super(Sen5xDeadbandEncoder, self).__init__()
+        if method not in METHODS:
+            raise ValueError("Unknown compression method: '{}'.".format(
+                method))
+        if len(tolerances) != len(SENTINELS) or \
+                any(t < 0 for t in tolerances):
+            raise ValueError("Invalid tolerances: {}.".format(tolerances))
+        cls = _SwingingDoor if method == SWINGING_DOOR else _Deadband
+        self._method = method
+        self._signals = [cls(tolerance, sentinel)
+                         for tolerance, sentinel in zip(tolerances, SENTINELS)]
+        self._timestamp = None
+
+        #: Number of values (samples times signals) put into the encoder.
+        self.values_in = 0
+
+        #: Number of reported points.
+        self.points_out = 0
+
+    @property
+    def method(self):
+        """
+        The compression method.
+
+        :type: str
+        """
+        return self._method
+
+    @property
+    def compression_ratio(self):
+        """
+        The compression ratio, i.e. the number of values put into the encoder
+        divided by the number of reported points, or ``None`` if nothing was
+        reported yet.
+
+        :type: float
+        """
+        if self.points_out == 0:
+            return None
+        return self.values_in / float(self.points_out)
+
+    def put(self, timestamp, values):
+        """
+        Add a sample.
+
+        :param float timestamp:
+            Time of the sample, must be increasing.
+        :param values:
+            The raw ticks (tuple of 8 integers) or a
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            object.
+        :return:
+            The points to report (possibly empty), ordered by time per signal.
+            Points of previous samples may be reported.
+        :rtype:
+            list(tuple)
+        """
+        if self._timestamp is not None and timestamp <= self._timestamp:
+            log.warning("Dropping out-of-order sample at {}.".format(
+                timestamp))
+            return []
+        self._timestamp = timestamp
+        ticks = getattr(values, 'values', values)
+        self.values_in += len(self._signals)
+        points = [(i, t, v)
+                  for i, signal in enumerate(self._signals)
+                  for t, v in signal.put(timestamp, ticks[i])]
+        self.points_out += len(points)
+        return points
+
+    def flush(self):
+        """
+        Report the last sample of each signal if not reported yet, e.g. at
+        the end of a stream or before a transmission. The encoder can be used
+        further afterwards.
+
+        :return:
+            The points to report.
+        :rtype:
+            list(tuple)
+        """
+        points = [(i, t, v)
+                  for i, signal in enumerate(self._signals)
+                  for t, v in signal.flush()]
+        self.points_out += len(points)
+        return points
+
+
+def reconstruct(points, timestamps, method=SWINGING_DOOR):
+    """
+    Reconstruct the values from points reported by a
+    :py:class:`Sen5xDeadbandEncoder`.
+
+    :param list points:
+        The reported points, tuples ``(signal, timestamp, ticks)``.
+    :param list timestamps:
+        Increasing times to reconstruct the values at.
+    :param str method:
+        The compression method used by the encoder.
+    :return:
+        The raw ticks (tuple of 8 integers) per timestamp. Values before the
+        first point of a signal are unavailable, values after the last point
+        are held.
+    :rtype:
+        list(tuple)
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown compression method: '{}'.".format(method))
+    series = [[] for _ in SENTINELS]
+    for signal, timestamp, ticks in points:
+        series[signal].append((timestamp, ticks))
+    columns = []
+    for signal_points, sentinel in zip(series, SENTINELS):
+        signal_points.sort(key=lambda point: point[0])
+        column = []
+        index = 0
+        for timestamp in timestamps:
+            while index < len(signal_points) and \
+                    signal_points[index][0] <= timestamp:
+                index += 1
+            if index == 0:
+                column.append(sentinel)
+                continue
+            ta, va = signal_points[index - 1]
+            if method == DEADBAND or index == len(signal_points) or \
+                    ta == timestamp or va == sentinel:
+                column.append(va)
+                continue
+            tb, vb = signal_points[index]
+            if vb == sentinel:
+                column.append(va)
+            else:
+                column.append(int(round(
+                    va + (vb - va) * (timestamp - ta) / float(tb - ta))))
+        columns.append(column)
+    return list(zip(*columns))
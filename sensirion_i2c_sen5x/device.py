@@ -29,6 +29,7 @@ from .commands import \
     Sen5xI2cCmdStartMeasurement, \
     Sen5xI2cCmdStartMeasurementWithoutPm, \
     Sen5xI2cCmdStopMeasurement
+from . import profiling
 
 import logging
 log = logging.getLogger(__name__)
@@ -48,7 +49,9 @@ class Sen5xI2cDevice(I2cDevice):
     stateless.
     """
 
-    def __init__(self, connection, slave_address=0x69):
+    def __init__(self, connection, slave_address=0x69, instrumentation=None,
+                 retry_policy=None, capabilities=None, clock=None,
+                 calibration=None):
         """
         Constructs a new SEN5x I²C device.
 
@@ -56,8 +59,171 @@ class Sen5xI2cDevice(I2cDevice):
             The I²C connection to use for communication.
         :param byte slave_address:
             The I²C slave address, defaults to 0x69.
+        :param ~sensirion_i2c_sen5x.instrumentation.Sen5xInstrumentation instrumentation:
+            Optional instrumentation to record latencies and errors of all
+            executed commands. See :py:attr:`instrumentation`.
+        :param ~sensirion_i2c_sen5x.retry.Sen5xRetryPolicy retry_policy:
+            Optional policy to retry commands after transient communication
+            errors. See :py:attr:`retry_policy`.
+        :param ~sensirion_i2c_sen5x.capabilities.Sen5xCapabilities capabilities:
+            Optional capabilities of the device, to reject unsupported
+            commands without communicating with the device. See
+            :py:attr:`capabilities`.
+        :param ~sensirion_i2c_sen5x.clock.Sen5xSystemClock clock:
+            Optional clock used to wait for the post processing time of
+            commands. See :py:attr:`clock`.
+        :param ~sensirion_i2c_sen5x.calibration.Sen5xCalibration calibration:
+            Optional correction applied to all measured values. See
+            :py:attr:`calibration`.
         """
         super(Sen5xI2cDevice, self).__init__(connection, slave_address)
+        self._instrumentation = instrumentation
+        self._retry_policy = retry_policy
+        self._capabilities = capabilities
+        self._clock = clock
+        self._calibration = calibration
+
+    @property
+    def instrumentation(self):
+        """
+        The instrumentation which records latencies and errors of all
+        executed commands, or ``None`` (the default) if disabled. The same
+        instrumentation object can be shared between several devices.
+
+        :type: ~sensirion_i2c_sen5x.instrumentation.Sen5xInstrumentation
+        """
+        return self._instrumentation
+
+    @instrumentation.setter
+    def instrumentation(self, value):
+        self._instrumentation = value
+
+    @property
+    def retry_policy(self):
+        """
+        The policy to retry commands after transient communication errors,
+        or ``None`` (the default) if every error is raised immediately. The
+        same policy object can be shared between several devices, e.g. to
+        aggregate their recovery statistics.
+
+        :type: ~sensirion_i2c_sen5x.retry.Sen5xRetryPolicy
+        """
+        return self._retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, value):
+        self._retry_policy = value
+
+    @property
+    def capabilities(self):
+        """
+        The capabilities (product and firmware dependent features) of the
+        device, or ``None`` (the default) if unknown. If set, commands which
+        are not supported by the device raise a
+        :py:class:`~sensirion_i2c_sen5x.capabilities.Sen5xUnsupportedError`
+        without communicating with the device. Typically set by
+        :py:meth:`~sensirion_i2c_sen5x.capabilities.Sen5xCapabilityResolver.resolve`.
+
+        :type: ~sensirion_i2c_sen5x.capabilities.Sen5xCapabilities
+        """
+        return self._capabilities
+
+    @capabilities.setter
+    def capabilities(self, value):
+        self._capabilities = value
+
+    @property
+    def clock(self):
+        """
+        The clock used to wait for the post processing time of commands, or
+        ``None`` (the default) to let the I²C connection sleep in real time.
+        Helpers working with this device (e.g. the retry policy, the
+        configurator and the duty cycle scheduler) use this clock as well,
+        unless they got their own. Set a
+        :py:class:`~sensirion_i2c_sen5x.clock.Sen5xVirtualClock` to run
+        long-running scenarios in virtual time, e.g. together with a
+        :py:class:`~sensirion_i2c_sen5x.simulation.Sen5xSimulatedTransceiver`.
+
+        .. note:: With :py:attr:`instrumentation` enabled, the post
+                  processing time is awaited by the instrumentation, using
+                  its own ``sleep`` function.
+
+        :type: ~sensirion_i2c_sen5x.clock.Sen5xSystemClock
+        """
+        return self._clock
+
+    @clock.setter
+    def clock(self, value):
+        self._clock = value
+
+    @property
+    def calibration(self):
+        """
+        The correction applied to the values returned by
+        :py:meth:`read_measured_values`, or ``None`` (the default) to return
+        the values as received from the device. Typically set by
+        :py:meth:`~sensirion_i2c_sen5x.calibration.Sen5xCalibrationStore.attach`.
+
+        :type: ~sensirion_i2c_sen5x.calibration.Sen5xCalibration
+        """
+        return self._calibration
+
+    @calibration.setter
+    def calibration(self, value):
+        self._calibration = value
+
+    def execute(self, command, wait_post_process=True):
+        """
+        Execute an I²C command on this device.
+
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to be executed.
+        :param bool wait_post_process:
+            If ``True`` (the default) and the command needs some time for post
+            processing, this method waits until post processing is done.
+            Otherwise it returns immediately and the caller is responsible to
+            wait for ``command.post_processing_time`` before sending the next
+            command to the device.
+        :return:
+            The interpreted response of the executed command.
+        :rtype:
+            Depends on the executed command.
+        """
+        if profiling._hooks:
+            return profiling.run_execute(self._execute, command,
+                                         wait_post_process)
+        return self._execute(command, wait_post_process)
+
+    def _execute(self, command, wait_post_process):
+        capabilities = self._capabilities
+        if capabilities is not None:
+            capabilities.check(command)
+        if self._retry_policy is not None:
+            result = self._retry_policy.execute(
+                self, self._execute_once, command, wait_post_process)
+        else:
+            result = self._execute_once(command, wait_post_process)
+        if capabilities is not None:
+            capabilities.executed(command)
+        return result
+
+    def _execute_once(self, command, wait_post_process):
+        if self._instrumentation is not None:
+            return self._instrumentation.execute(
+                self.connection, self.slave_address, command,
+                wait_post_process, clock=self._clock)
+        if self._clock is None:
+            return self.connection.execute(
+                self.slave_address, command,
+                wait_post_process=wait_post_process)
+        try:
+            return self.connection.execute(self.slave_address, command,
+                                           wait_post_process=False)
+        finally:
+            # Also wait if the response could not be interpreted, since the
+            # device might still be busy.
+            if wait_post_process and command.post_processing_time > 0.0:
+                self._clock.sleep(command.post_processing_time)
 
     def get_product_name(self):
         """
@@ -228,11 +394,15 @@ class Sen5xI2cDevice(I2cDevice):
             no signal values will be available at all.
 
         :return:
-            The latest measurement results.
+            The latest measurement results, corrected by :py:attr:`calibration`
+            (if set).
         :rtype:
             :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
         """
-        return self.execute(Sen5xI2cCmdReadMeasuredValues())
+        values = self.execute(Sen5xI2cCmdReadMeasuredValues())
+        if self._calibration is not None:
+            values = self._calibration.apply(values)
+        return values
 
     def get_temperature_offset_parameters(self, raw=False):
         """
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .clock import get_clock
+from .measured_values import Sen5xMeasuredValues
+from collections import deque
+import math
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# Raw ticks of unavailable mass concentration values.
+_PM_NOT_AVAILABLE = (0xFFFF, 0xFFFF, 0xFFFF, 0xFFFF)
+
+# Raw ticks of an unavailable VOC/NOx index.
+_INDEX_NOT_AVAILABLE = 0x7FFF
+
+
+class Sen5xDutyCycleScheduler:
+    """
+    Duty-cycles the particulate matter (PM) measurement to save power.
+
+    The device is kept in the low-power measure mode (RH/T/VOC/NOx only) and
+    the PM measurement (fan and laser) is turned on only for a window of
+    ``pm_window`` seconds every ``pm_period`` seconds, or when the VOC or NOx
+    index rises by more than a threshold within ``trend_window`` seconds,
+    which indicates an event (e.g. cooking or smoke). Since the fan needs
+    some time to spin up, PM values are accepted only ``pm_warmup`` seconds
+    after turning on the PM measurement. Until then (and while PM is off),
+    the mass concentrations of the returned values are marked as not
+    available.
+
+    With firmware 2.0 and later, switching between the two measure modes
+    does not affect the running RH/T/VOC/NOx measurements. For older
+    firmware versions, set ``switch_via_idle`` to stop the measurement
+    before each switch (which restarts the VOC/NOx algorithms).
+
+    .. attention:: SEN50 does not support the low-power measure mode.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        scheduler = Sen5xDutyCycleScheduler(device, pm_period=600.0,
+                                            pm_window=30.0, voc_threshold=50)
+        scheduler.start()
+        while True:
+            time.sleep(1.0)
+            values = scheduler.update()
+            print(values)
+            print("Duty cycle: {:.1%}, coverage: {:.1%}".format(
+                scheduler.duty_cycle, scheduler.coverage))
+    """
+
+    def __init__(self, device, pm_period=300.0, pm_window=30.0,
+                 pm_warmup=30.0, voc_threshold=None, nox_threshold=None,
+                 trend_window=60.0, event_window=None, switch_via_idle=False,
+                 clock=None):
+        """
+        Constructor.
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device to control.
+        :param float pm_period:
+            Period of the scheduled PM windows in seconds, or ``None`` to
+            turn on PM only on events.
+        :param float pm_window:
+            Duration of a scheduled PM window in seconds, not including the
+            warm-up time.
+        :param float pm_warmup:
+            Time in seconds after turning on the PM measurement until PM
+            values are accepted.
+        :param float voc_threshold:
+            Rise of the VOC index (index points) within ``trend_window`` which
+            triggers a PM window, or ``None`` to disable.
+        :param float nox_threshold:
+            Rise of the NOx index (index points) within ``trend_window`` which
+            triggers a PM window, or ``None`` to disable.
+        :param float trend_window:
+            Time window in seconds to detect VOC/NOx rises.
+        :param float event_window:
+            Duration of a PM window triggered by an event, not including the
+            warm-up time. Defaults to ``pm_window``.
+        :param bool switch_via_idle:
+            Whether to stop the measurement before switching the measure mode
+            (required for firmware versions older than 2.0).
+        :param callable clock:
+            Function returning a monotonic time in seconds. Defaults to the
+            device's clock (see
+            :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.clock`).
+        """
+        super(Sen5xDutyCycleScheduler, self).__init__()
+        self._device = device
+        self._pm_period = pm_period
+        self._pm_window = pm_window
+        self._pm_warmup = pm_warmup
+        self._thresholds = (
+            (6, voc_threshold * 10) if voc_threshold is not None else None,
+            (7, nox_threshold * 10) if nox_threshold is not None else None,
+        )
+        self._trend_window = trend_window
+        self._event_window = pm_window if event_window is None \
+            else event_window
+        self._switch_via_idle = switch_via_idle
+        self._clock = clock or get_clock(device).monotonic
+        self._history = deque()
+        self._started_at = None
+        self._next_window = None
+        self._pm_on_since = None
+        self._pm_until = None
+        self._pm_time = 0.0
+
+        #: Number of samples returned by :py:meth:`update`.
+        self.samples = 0
+
+        #: Number of returned samples with accepted PM values.
+        self.pm_samples = 0
+
+        #: Number of PM windows triggered by VOC/NOx events.
+        self.events = 0
+
+    @property
+    def pm_enabled(self):
+        """
+        Whether the PM measurement is currently turned on.
+
+        :type: bool
+        """
+        return self._pm_on_since is not None
+
+    @property
+    def pm_accepted(self):
+        """
+        Whether PM values are currently accepted (PM turned on and warmed up).
+
+        :type: bool
+        """
+        now = self._clock()
+        return self.pm_enabled and \
+            now - self._pm_on_since >= self._pm_warmup and \
+            now < self._pm_until
+
+    @property
+    def elapsed(self):
+        """
+        Time in seconds since :py:meth:`start`.
+
+        :type: float
+        """
+        if self._started_at is None:
+            return 0.0
+        return self._clock() - self._started_at
+
+    @property
+    def pm_time(self):
+        """
+        Total time in seconds the PM measurement was turned on.
+
+        :type: float
+        """
+        if self._pm_on_since is None:
+            return self._pm_time
+        return self._pm_time + self._clock() - self._pm_on_since
+
+    @property
+    def duty_cycle(self):
+        """
+        Fraction (0.0..1.0) of the time the PM measurement was turned on.
+
+        :type: float
+        """
+        elapsed = self.elapsed
+        return self.pm_time / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def coverage(self):
+        """
+        Fraction (0.0..1.0) of the returned samples with accepted PM values.
+
+        :type: float
+        """
+        return float(self.pm_samples) / self.samples if self.samples else 0.0
+
+    def start(self):
+        """
+        Start the measurement. If PM windows are scheduled, the first window
+        starts immediately (i.e. the measurement starts with PM), otherwise
+        the measurement starts in the low-power measure mode.
+        """
+        now = self._clock()
+        self._started_at = now
+        self._pm_on_since = None
+        self._pm_until = None
+        self._pm_time = 0.0
+        self._history.clear()
+        self.samples = 0
+        self.pm_samples = 0
+        self.events = 0
+        if self._pm_period is not None:
+            self._device.start_measurement()
+            self._pm_on_since = now
+            self._pm_until = now + self._pm_warmup + self._pm_window
+            self._next_window = now + self._pm_period
+        else:
+            self._device.start_measurement_without_pm()
+            self._next_window = None
+
+    def stop(self):
+        """
+        Stop the measurement.
+        """
+        if self._pm_on_since is not None:
+            self._pm_time += self._clock() - self._pm_on_since
+            self._pm_on_since = None
+        self._device.stop_measurement()
+
+    def update(self):
+        """
+        Read the measured values and switch the measure mode if needed. Call
+        this method once per measurement interval.
+
+        :return:
+            The measured values, with the mass concentrations marked as not
+            available if PM is turned off or still warming up.
+        :rtype:
+            ~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues
+        """
+        values = self._device.read_measured_values()
+        now = self._clock()
+        accepted = self._pm_on_since is not None and \
+            now - self._pm_on_since >= self._pm_warmup and \
+            now < self._pm_until
+        self.samples += 1
+        if accepted:
+            self.pm_samples += 1
+        else:
+            values = Sen5xMeasuredValues(_PM_NOT_AVAILABLE +
+                                         tuple(values.values[4:]))
+        self._schedule(now, values.values)
+        return values
+
+    def _schedule(self, now, ticks):
+        if self._next_window is not None and now >= self._next_window:
+            # Skip the windows missed during a long gap between updates.
+            missed = math.floor((now - self._next_window) / self._pm_period)
+            self._next_window += (missed + 1) * self._pm_period
+            self._extend(now, self._pm_window)
+        if self._detect_event(now, ticks):
+            self.events += 1
+            log.debug("VOC/NOx event detected, enabling PM measurement.")
+            self._extend(now, self._event_window)
+        if self._pm_on_since is not None and now >= self._pm_until:
+            self._switch(now, False)
+
+    def _extend(self, now, window):
+        if self._pm_on_since is None:
+            self._switch(now, True)
+            self._pm_until = now + self._pm_warmup + window
+        else:
+            warmup_end = self._pm_on_since + self._pm_warmup
+            self._pm_until = max(self._pm_until, max(now, warmup_end) + window)
+
+    def _switch(self, now, pm):
+        if self._switch_via_idle:
+            self._device.stop_measurement()
+        if pm:
+            self._device.start_measurement()
+            self._pm_on_since = now
+        else:
+            self._device.start_measurement_without_pm()
+            self._pm_time += now - self._pm_on_since
+            self._pm_on_since = None
+            self._pm_until = None
+
+    def _detect_event(self, now, ticks):
+        history = self._history
+        history.append((now, ticks))
+        while now - history[0][0] > self._trend_window:
+            history.popleft()
+        for threshold in self._thresholds:
+            if threshold is None:
+                continue
+            index, rise = threshold
+            current = ticks[index]
+            if current == _INDEX_NOT_AVAILABLE:
+                continue
+            lowest = min(t[index] for _, t in history
+                         if t[index] != _INDEX_NOT_AVAILABLE)
+            if current - lowest >= rise:
+                history.clear()  # do not trigger again on the same rise
+                return True
+        return False
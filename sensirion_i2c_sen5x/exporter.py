@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .instrumentation import escape_label_value
+from .serialization import FIELD_NAMES, format_fields
+from .status_monitor import STATUS_FLAGS
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import argparse
+import collections
+import json
+import queue
+import selectors
+import socket
+import threading
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Default TCP port of the HTTP server.
+DEFAULT_PORT = 9105
+
+#: Default number of worker threads of the HTTP server.
+DEFAULT_WORKERS = 4
+
+#: Default time [s] after which idle keep-alive connections are closed.
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+# Prometheus metric (name, help, extra label) per measured signal, in the
+# order of FIELD_NAMES.
+_METRICS = (
+    ('mass_concentration_ug_m3', 'Mass concentration in ug/m3.',
+     'size="1.0"'),
+    ('mass_concentration_ug_m3', 'Mass concentration in ug/m3.',
+     'size="2.5"'),
+    ('mass_concentration_ug_m3', 'Mass concentration in ug/m3.',
+     'size="4.0"'),
+    ('mass_concentration_ug_m3', 'Mass concentration in ug/m3.',
+     'size="10.0"'),
+    ('ambient_humidity_percent', 'Ambient relative humidity in %RH.', ''),
+    ('ambient_temperature_celsius', 'Ambient temperature in degC.', ''),
+    ('voc_index', 'VOC index.', ''),
+    ('nox_index', 'NOx index.', ''),
+)
+
+
+class Sen5xExporterSnapshot:
+    """
+    Pre-rendered responses of the exporter. A snapshot is never modified
+    after creation, it gets replaced as a whole after each sampling round.
+    """
+
+    def __init__(self, metrics, json, timestamp):
+        super(Sen5xExporterSnapshot, self).__init__()
+
+        #: Prometheus text exposition format (UTF-8 encoded bytes).
+        self.metrics = metrics
+
+        #: JSON document (UTF-8 encoded bytes).
+        self.json = json
+
+        #: Time of the sampling round (seconds since the epoch).
+        self.timestamp = timestamp
+
+
+class _DeviceState:
+    def __init__(self, name, device):
+        super(_DeviceState, self).__init__()
+        self.name = name
+        self.label = escape_label_value(name)
+        self.device = device
+        self.values = None
+        self.status = None
+        self.timestamp = None
+        self.status_time = None
+        self.up = False
+        self.errors = 0
+
+
+class Sen5xExporter:
+    """
+    Samples one or more devices in a background thread and keeps their
+    latest values and device status as pre-rendered snapshot, so serving a
+    scrape never communicates with a device and takes constant time and
+    memory.
+
+    If sampling a device fails, its measured values and device status are
+    dropped from the snapshot until it can be sampled again, so no stale
+    values are exported. ``<prefix>_up`` is 0 in this case, and
+    ``<prefix>_sample_timestamp_seconds`` keeps the time of the last
+    successful sampling.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        exporter = Sen5xExporter({'kitchen': device})
+        exporter.start()
+        server = Sen5xExporterServer(exporter, ('', DEFAULT_PORT))
+        server.serve_forever()
+
+    The exporter can also be started from the command line, see
+    ``python -m sensirion_i2c_sen5x.exporter --help``.
+    """
+
+    def __init__(self, devices, interval=1.0, status_interval=10.0,
+                 start_measurement=True, prefix='sen5x', clock=time.time):
+        """
+        Constructor.
+
+        :param dict devices:
+            The devices to sample, as dict with a name (used as label) as key
+            and a :py:class:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice` as
+            value.
+        :param float interval:
+            Sample interval in seconds.
+        :param float status_interval:
+            Interval in seconds to read the device status.
+        :param bool start_measurement:
+            Whether to start the measurement on :py:meth:`start` and to stop
+            it on :py:meth:`stop`.
+        :param str prefix:
+            Prefix of all Prometheus metric names.
+        :param callable clock:
+            Function returning the current time in seconds since the epoch.
+        """
+        super(Sen5xExporter, self).__init__()
+        self._devices = [_DeviceState(name, device)
+                         for name, device in sorted(devices.items())]
+        self._interval = interval
+        self._status_interval = status_interval
+        self._start_measurement = start_measurement
+        self._prefix = prefix
+        self._clock = clock
+        self._stop = threading.Event()
+        self._thread = None
+
+        #: The current snapshot
+        #: (:py:class:`~sensirion_i2c_sen5x.exporter.Sen5xExporterSnapshot`).
+        self.snapshot = self._render(None)
+
+    def start(self):
+        """
+        Start the measurement (if enabled) and the background sampling.
+        """
+        if self._start_measurement:
+            for state in self._devices:
+                state.device.start_measurement()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='sen5x-exporter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background sampling and the measurement (if enabled).
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._start_measurement:
+            for state in self._devices:
+                try:
+                    state.device.stop_measurement()
+                except Exception as e:
+                    log.warning("Failed to stop measurement of {}: {}".format(
+                        state.name, e))
+
+    def sample(self):
+        """
+        Sample all devices once and replace the snapshot. Called periodically
+        by the background thread.
+        """
+        now = self._clock()
+        for state in self._devices:
+            try:
+                state.values = state.device.read_measured_values()
+                if state.status_time is None or \
+                        now - state.status_time >= self._status_interval:
+                    state.status = state.device.read_device_status()
+                    state.status_time = now
+                state.timestamp = now
+                state.up = True
+            except Exception as e:
+                log.warning("Failed to sample {}: {}".format(state.name, e))
+                state.errors += 1
+                state.up = False
+                state.values = None
+                state.status = None
+                state.status_time = None
+        self.snapshot = self._render(now)
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            self.sample()
+            deadline += self._interval
+            self._stop.wait(max(deadline - time.monotonic(), 0.0))
+
+    def _render(self, now):
+        p = self._prefix
+        devices = self._devices
+        lines = [
+            '# HELP {}_up Whether the last sampling succeeded.'.format(p),
+            '# TYPE {}_up gauge'.format(p),
+        ]
+        for state in devices:
+            lines.append('{}_up{{device="{}"}} {}'.format(
+                p, state.label, int(state.up)))
+        lines.append('# HELP {}_sample_errors_total Number of failed '
+                     'samplings.'.format(p))
+        lines.append('# TYPE {}_sample_errors_total counter'.format(p))
+        for state in devices:
+            lines.append('{}_sample_errors_total{{device="{}"}} {}'.format(
+                p, state.label, state.errors))
+        lines.append('# HELP {}_sample_timestamp_seconds Time of the last '
+                     'successful sampling.'.format(p))
+        lines.append('# TYPE {}_sample_timestamp_seconds gauge'.format(p))
+        for state in devices:
+            if state.timestamp is not None:
+                lines.append('{}_sample_timestamp_seconds{{device="{}"}} {}'
+                             .format(p, state.label, state.timestamp))
+        fields = [format_fields(s.values) if s.values is not None else None
+                  for s in devices]
+        rendered = set()
+        for i, (metric, text, label) in enumerate(_METRICS):
+            if metric not in rendered:
+                rendered.add(metric)
+                lines.append('# HELP {}_{} {}'.format(p, metric, text))
+                lines.append('# TYPE {}_{} gauge'.format(p, metric))
+            for state, values in zip(devices, fields):
+                if values is not None and values[i] is not None:
+                    lines.append('{}_{}{{device="{}"{}}} {}'.format(
+                        p, metric, state.label, ',' + label if label else '',
+                        values[i]))
+        lines.append('# HELP {}_device_status Device status flags.'.format(p))
+        lines.append('# TYPE {}_device_status gauge'.format(p))
+        for state in devices:
+            if state.status is not None:
+                for flag in STATUS_FLAGS:
+                    lines.append('{}_device_status{{device="{}",flag="{}"}} '
+                                 '{}'.format(p, state.label, flag,
+                                             int(getattr(state.status,
+                                                         flag))))
+        document = {'timestamp': now, 'devices': {}}
+        for state, values in zip(devices, fields):
+            document['devices'][state.name] = {
+                'up': state.up,
+                'timestamp': state.timestamp,
+                'errors': state.errors,
+                'values': dict(
+                    (name, float(v) if v is not None else None)
+                    for name, v in zip(FIELD_NAMES, values)
+                ) if values is not None else None,
+                'status': dict(
+                    (flag, getattr(state.status, flag))
+                    for flag in STATUS_FLAGS
+                ) if state.status is not None else None,
+            }
+        return Sen5xExporterSnapshot(
+            metrics=('\n'.join(lines) + '\n').encode('utf-8'),
+            json=json.dumps(document, sort_keys=True).encode('utf-8'),
+            timestamp=now)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive for frequent scrapes
+    timeout = 2.0  # bound the time a slow client can hold a worker
+
+    def handle(self):
+        # Serve the requests already received; the server waits for further
+        # requests of a keep-alive connection without occupying a worker.
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._request_pending():
+            self.handle_one_request()
+
+    def _request_pending(self):
+        # Whether a pipelined request is already buffered, without blocking.
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        snapshot = self.server.exporter.snapshot
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            self._respond(200, 'text/plain; version=0.0.4; charset=utf-8',
+                          snapshot.metrics)
+        elif path in ('/', '/json'):
+            self._respond(200, 'application/json', snapshot.json)
+        else:
+            self._respond(404, 'text/plain; charset=utf-8', b'Not Found\n')
+
+    def _respond(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+class Sen5xExporterServer(HTTPServer):
+    """
+    HTTP server serving the snapshot of a :py:class:`Sen5xExporter`:
+
+    - ``/metrics``: Prometheus text exposition format.
+    - ``/json`` (or ``/``): JSON document.
+
+    Requests are handled by a fixed number of worker threads. Connections
+    with a pending request wait in a queue of the same size until a worker
+    is free; if the queue is full, further connections are closed
+    immediately, so the number of threads and pending connections is
+    bounded. Between requests, keep-alive connections are watched by a
+    single dispatcher thread and do not occupy a worker, so idle scrapers
+    cannot starve new ones. Connections idle for longer than
+    ``idle_timeout`` are closed.
+    """
+
+    def __init__(self, exporter, address=('', DEFAULT_PORT),
+                 workers=DEFAULT_WORKERS, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """
+        Constructor.
+
+        :param ~sensirion_i2c_sen5x.exporter.Sen5xExporter exporter:
+            The exporter to serve.
+        :param tuple address:
+            Address ``(host, port)`` to listen on.
+        :param int workers:
+            Number of worker threads.
+        :param float idle_timeout:
+            Time [s] after which idle keep-alive connections are closed.
+        """
+        HTTPServer.__init__(self, address, _RequestHandler)
+        self.exporter = exporter
+        self.idle_timeout = idle_timeout
+        self._requests = queue.Queue(workers)
+        self._closed = False
+        self._idle = selectors.DefaultSelector()
+        self._returned = collections.deque()  # connections back from workers
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._idle.register(self._wakeup_recv, selectors.EVENT_READ)
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name='sen5x-exporter-http-dispatcher')
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+        self._workers = []
+        for i in range(workers):
+            thread = threading.Thread(
+                target=self._work, name='sen5x-exporter-http-{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self._workers.append(thread)
+
+    def process_request(self, request, client_address):
+        try:
+            self._requests.put_nowait((request, client_address))
+        except queue.Full:
+            log.warning("Rejecting connection from {}: all workers busy."
+                        .format(client_address))
+            self.shutdown_request(request)
+
+    def finish_request(self, request, client_address):
+        handler = self.RequestHandlerClass(request, client_address, self)
+        return not handler.close_connection
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+            request, client_address = item
+            keep_alive = False
+            try:
+                keep_alive = self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            if keep_alive and not self._closed:
+                self._returned.append(item)
+                self._wake()
+            else:
+                self.shutdown_request(request)
+
+    def _wake(self):
+        try:
+            self._wakeup_send.send(b'\0')
+        except OSError:
+            pass  # already woken up, or closed
+
+    def _dispatch(self):
+        while not self._closed:
+            for key, _ in self._idle.select(timeout=1.0):
+                if key.fileobj is self._wakeup_recv:
+                    try:
+                        self._wakeup_recv.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                # Next request (or end of connection) pending.
+                self._idle.unregister(key.fileobj)
+                self.process_request(*key.data[:2])
+            now = time.monotonic()
+            while self._returned:
+                request, client_address = self._returned.popleft()
+                self._idle.register(request, selectors.EVENT_READ,
+                                    (request, client_address, now))
+            for key in list(self._idle.get_map().values()):
+                if key.data and now - key.data[2] > self.idle_timeout:
+                    self._idle.unregister(key.fileobj)
+                    self.shutdown_request(key.fileobj)
+        for key in list(self._idle.get_map().values()):
+            if key.data:
+                self.shutdown_request(key.fileobj)
+        while self._returned:
+            self.shutdown_request(self._returned.popleft()[0])
+        self._idle.close()
+        self._wakeup_recv.close()
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self._closed = True
+        self._wake()
+        self._dispatcher.join()
+        self._wakeup_send.close()
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self.shutdown_request(item[0])
+        for _ in self._workers:
+            self._requests.put(None)
+
+
+def main(argv=None):
+    """
+    Entry point of ``python -m sensirion_i2c_sen5x.exporter``.
+
+    :param list argv:
+        Command line arguments (defaults to ``sys.argv[1:]``).
+    """
+    from .cli import DEFAULT_BUS, open_devices
+    from contextlib import ExitStack
+
+    parser = argparse.ArgumentParser(
+        prog='python -m sensirion_i2c_sen5x.exporter',
+        description='Serve SEN5x measurements as Prometheus metrics and '
+                    'JSON over HTTP.')
+    parser.add_argument(
+        '-d', '--device', action='append', metavar='BUS[@ADDRESS]',
+        help='I2C bus device and optional slave address, e.g. '
+             '/dev/i2c-1@0x69 (can be given multiple times, default: '
+             '{})'.format(DEFAULT_BUS))
+    parser.add_argument('--host', default='',
+                        help='address to listen on (default: all)')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT,
+                        help='TCP port (default: %(default)s)')
+    parser.add_argument('-i', '--interval', type=float, default=1.0,
+                        help='sample interval in seconds '
+                             '(default: %(default)s)')
+    parser.add_argument('--status-interval', type=float, default=10.0,
+                        help='device status interval in seconds '
+                             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    with ExitStack() as stack:
+        devices = open_devices(stack, args.device or [DEFAULT_BUS])
+        exporter = Sen5xExporter(devices, interval=args.interval,
+                                 status_interval=args.status_interval)
+        server = Sen5xExporterServer(exporter, (args.host, args.port))
+        exporter.start()
+        log.info("Serving {} device(s) on port {}.".format(
+            len(devices), args.port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            exporter.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .measured_values import Sen5xMeasuredValues
+from collections import deque
+import math
+import random
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Raw ticks of unavailable values, per signal of the "Read Measured Values"
+#: response (mass concentrations PM1.0, PM2.5, PM4.0, PM10.0, RH, T, VOC
+#: index, NOx index).
+SENTINELS = (0xFFFF, 0xFFFF, 0xFFFF, 0xFFFF, 0x7FFF, 0x7FFF, 0x7FFF, 0x7FFF)
+
+#: Indices of the mass concentration signals.
+PM_SIGNALS = (0, 1, 2, 3)
+
+# Scale factor to estimate the standard deviation from the MAD of normally
+# distributed values.
+_MAD_SCALE = 1.4826
+
+
+class _Node:
+    __slots__ = ('value', 'next', 'width')
+
+    def __init__(self, value, next, width):
+        self.value = value
+        self.next = next
+        self.width = width
+
+
+# Terminal node, larger than every value.
+_NIL = _Node(float('inf'), [], [])
+
+
+class _IndexableSkiplist:
+    """
+    Sorted collection with O(log n) insertion, removal and access by index.
+    """
+
+    def __init__(self, expected_size):
+        self._size = 0
+        self._levels = int(1 + math.log(max(expected_size, 2), 2))
+        self._head = _Node(None, [_NIL] * self._levels, [1] * self._levels)
+        self._random = random.Random(expected_size).random
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        node = self._head
+        index += 1
+        for level in reversed(range(self._levels)):
+            while node.width[level] <= index:
+                index -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def insert(self, value):
+        levels = self._levels
+        chain = [None] * levels
+        steps_at_level = [0] * levels
+        node = self._head
+        for level in reversed(range(levels)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        height = min(levels, 1 - int(math.log(1.0 - self._random(), 2.0)))
+        new_node = _Node(value, [None] * height, [None] * height)
+        steps = 0
+        for level in range(height):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, levels):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, value):
+        levels = self._levels
+        chain = [None] * levels
+        node = self._head
+        for level in reversed(range(levels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        if chain[0].next[0].value != value:
+            raise KeyError(value)
+        height = len(chain[0].next[0].next)
+        for level in range(height):
+            previous = chain[level]
+            previous.width[level] += previous.next[level].width[level] - 1
+            previous.next[level] = previous.next[level].next[level]
+        for level in range(height, levels):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+
+def _kth_of_two(a, len_a, b, len_b, k):
+    """
+    Get the k-th smallest (0-based) element of the union of two sorted
+    sequences, given as accessor functions, with O(log n) accesses.
+    """
+    low = max(0, k + 1 - len_b)
+    high = min(k + 1, len_a)
+    while low < high:
+        i = (low + high) // 2
+        j = k + 1 - i
+        if j > 0 and b(j - 1) > a(i):
+            low = i + 1
+        else:
+            high = i
+    j = k + 1 - low
+    if low == 0:
+        return b(j - 1)
+    if j == 0:
+        return a(low - 1)
+    return max(a(low - 1), b(j - 1))
+
+
+class Sen5xMedianFilter:
+    """
+    Running median over the last ``window`` available samples of a single
+    signal, with O(log window) costs per sample.
+
+    Unavailable samples (``sentinel``) are neither added to the window nor
+    filtered, they are passed through unchanged.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        median = Sen5xMedianFilter(window=5)
+        for ticks in column:
+            print(median.update(ticks))
+    """
+
+    def __init__(self, window=5, sentinel=0xFFFF):
+        """
+        Constructor.
+
+        :param int window:
+            Number of samples in the window.
+        :param int sentinel:
+            Raw value of unavailable samples.
+        """
+        super(Sen5xMedianFilter, self).__init__()
+        if window < 1:
+            raise ValueError("Invalid window size: {}.".format(window))
+        self._window = window
+        self._sentinel = sentinel
+        self._samples = deque()
+        self._sorted = _IndexableSkiplist(window)
+
+    def reset(self):
+        """
+        Clear the window.
+        """
+        self._samples.clear()
+        self._sorted = _IndexableSkiplist(self._window)
+
+    def _add(self, ticks):
+        if len(self._samples) == self._window:
+            self._sorted.remove(self._samples.popleft())
+        self._samples.append(ticks)
+        self._sorted.insert(ticks)
+
+    def _median(self):
+        s = self._sorted
+        n = len(s)
+        if n % 2:
+            return s[n // 2]
+        return (s[n // 2 - 1] + s[n // 2]) / 2.0
+
+    def update(self, ticks):
+        """
+        Add a sample and get the filtered value.
+
+        :param int ticks:
+            Raw value of the sample.
+        :return:
+            Median of the window (rounded to integer ticks), or ``sentinel``
+            if the sample is not available.
+        :rtype:
+            int
+        """
+        if ticks == self._sentinel:
+            return ticks
+        self._add(ticks)
+        return int(round(self._median()))
+
+    def filter(self, column):
+        """
+        Filter a whole column of samples (batch mode). Equivalent to calling
+        :py:meth:`update` for each sample.
+
+        :param iterable column:
+            Raw values of the samples.
+        :return:
+            The filtered values.
+        :rtype:
+            list
+        """
+        update = self.update
+        return [update(ticks) for ticks in column]
+
+
+class Sen5xHampelFilter(Sen5xMedianFilter):
+    """
+    Hampel filter over the last ``window`` available samples of a single
+    signal. A sample which deviates from the window median by more than
+    ``threshold`` times the scaled median absolute deviation (MAD) is
+    considered as outlier and replaced by the median.
+
+    The MAD is determined without sorting the deviations: the deviations of
+    the samples below and above the median form two sorted sequences, and the
+    MAD is their median, found by a binary search over both sequences. This
+    keeps the costs per sample at O(log² window).
+
+    Unavailable samples (``sentinel``) are neither added to the window nor
+    filtered, they are passed through unchanged.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        hampel = Sen5xHampelFilter(window=7, threshold=3.0)
+        filtered = hampel.filter(column)
+        print("{} outliers replaced".format(hampel.outliers))
+    """
+
+    def __init__(self, window=7, threshold=3.0, sentinel=0xFFFF):
+        """
+        Constructor.
+
+        :param int window:
+            Number of samples in the window.
+        :param float threshold:
+            Outlier threshold in (estimated) standard deviations.
+        :param int sentinel:
+            Raw value of unavailable samples.
+        """
+        super(Sen5xHampelFilter, self).__init__(window, sentinel)
+        self._threshold = threshold
+
+        #: Number of replaced outliers.
+        self.outliers = 0
+
+    def _mad(self, median):
+        s = self._sorted
+        n = len(s)
+        split = (n + 1) // 2  # s[:split] <= median <= s[split:]
+
+        def below(i):
+            return median - s[split - 1 - i]
+
+        def above(i):
+            return s[split + i] - median
+
+        if n % 2:
+            return _kth_of_two(below, split, above, n - split, n // 2)
+        return (_kth_of_two(below, split, above, n - split, n // 2 - 1) +
+                _kth_of_two(below, split, above, n - split, n // 2)) / 2.0
+
+    def update(self, ticks):
+        """
+        Add a sample and get the filtered value.
+
+        :param int ticks:
+            Raw value of the sample.
+        :return:
+            The sample itself, or the window median (rounded to integer
+            ticks) if the sample is an outlier, or ``sentinel`` if the sample
+            is not available.
+        :rtype:
+            int
+        """
+        if ticks == self._sentinel:
+            return ticks
+        self._add(ticks)
+        median = self._median()
+        deviation = abs(ticks - median)
+        if deviation and \
+                deviation > self._threshold * _MAD_SCALE * self._mad(median):
+            self.outliers += 1
+            return int(round(median))
+        return ticks
+
+
+class Sen5xFilterStage:
+    """
+    Applies a filter per signal to the "Read Measured Values" data, either
+    sample by sample (streaming mode) or to columns of history (batch mode).
+
+    By default, a :py:class:`Sen5xHampelFilter` is applied to the mass
+    concentrations. The unavailable sentinel of each signal is handled
+    automatically.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        stage = Sen5xFilterStage()
+
+        # Streaming mode:
+        while True:
+            values = stage.update(device.read_measured_values())
+            print(values)
+
+        # Batch mode (one sequence of raw ticks per signal):
+        filtered = Sen5xFilterStage().filter_columns(columns)
+    """
+
+    def __init__(self, factory=Sen5xHampelFilter, signals=PM_SIGNALS,
+                 **kwargs):
+        """
+        Constructor.
+
+        :param callable factory:
+            Filter class (or function) to create the filter of each signal,
+            called with the keyword arguments ``kwargs`` and ``sentinel``.
+        :param tuple signals:
+            Indices of the signals to filter (see :py:data:`SENTINELS` for
+            the order), the other signals are passed through.
+        """
+        super(Sen5xFilterStage, self).__init__()
+        self._factory = factory
+        self._kwargs = kwargs
+        self._signals = tuple(signals)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the windows of all filters.
+        """
+        #: The filters as dict with the signal index as key.
+        self.filters = dict(
+            (i, self._factory(sentinel=SENTINELS[i], **self._kwargs))
+            for i in self._signals)
+
+    def update(self, values):
+        """
+        Filter a single sample (streaming mode).
+
+        :param values:
+            The raw ticks (tuple of 8 integers) or a
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            object.
+        :return:
+            The filtered sample, of the same type as ``values``.
+        """
+        ticks = list(getattr(values, 'values', values))
+        for i, f in self.filters.items():
+            ticks[i] = f.update(ticks[i])
+        if isinstance(values, Sen5xMeasuredValues):
+            return Sen5xMeasuredValues(tuple(ticks))
+        return tuple(ticks)
+
+    def filter_columns(self, columns):
+        """
+        Filter columnar history (batch mode).
+
+        :param list columns:
+            One sequence of raw ticks per signal (8 sequences).
+        :return:
+            The filtered columns, as list of 8 lists.
+        :rtype:
+            list
+        """
+        return [self.filters[i].filter(column) if i in self.filters
+                else list(column) for i, column in enumerate(columns)]
@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cCommand
+from sensirion_i2c_driver.errors import I2cChecksumError, I2cNackError, \
+    I2cTimeoutError
+from .clock import SYSTEM_CLOCK
+from bisect import bisect_left
+import threading
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Default upper bounds (in seconds) of the histogram buckets.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+#: Names of the error counters, see :py:func:`error_kind`.
+ERROR_KINDS = ('crc', 'nack', 'timeout', 'other')
+
+
+def command_name(command):
+    """
+    Get a short name of a command to be used as label, e.g.
+    ``'ReadMeasuredValues'`` for
+    :py:class:`~sensirion_i2c_sen5x.commands.wrapped.Sen5xI2cCmdReadMeasuredValues`.
+
+    :param command:
+        The command object.
+    :return:
+        The command name.
+    :rtype:
+        str
+    """
+    name = type(command).__name__
+    return name[11:] if name.startswith('Sen5xI2cCmd') else name
+
+
+def escape_label_value(value):
+    """
+    Escape a label value for the Prometheus text exposition format, i.e.
+    backslashes, double quotes and line feeds.
+
+    :param value:
+        The label value (converted with :py:func:`str`).
+    :return:
+        The escaped label value.
+    :rtype:
+        str
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def error_kind(error):
+    """
+    Classify an exception raised while executing a command.
+
+    :param Exception error:
+        The raised exception.
+    :return:
+        One of :py:data:`ERROR_KINDS`.
+    :rtype:
+        str
+    """
+    if isinstance(error, I2cChecksumError):
+        return 'crc'
+    elif isinstance(error, I2cNackError):
+        return 'nack'
+    elif isinstance(error, I2cTimeoutError):
+        return 'timeout'
+    return 'other'
+
+
+class Sen5xLatencyHistogram:
+    """
+    Histogram of latencies with fixed bucket bounds.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Constructor.
+
+        :param tuple(float) buckets:
+            Sorted upper bounds of the buckets in seconds. An additional
+            bucket for all larger values is added implicitly.
+        """
+        super(Sen5xLatencyHistogram, self).__init__()
+
+        #: Upper bounds of the buckets in seconds.
+        self.buckets = tuple(buckets)
+
+        #: Number of observations per bucket (not cumulative), including the
+        #: implicit ``+Inf`` bucket as last element.
+        self.counts = [0] * (len(self.buckets) + 1)
+
+        #: Sum of all observed values in seconds.
+        self.sum = 0.0
+
+        #: Number of observations.
+        self.count = 0
+
+    def observe(self, seconds):
+        """
+        Add an observation.
+
+        :param float seconds:
+            The observed latency in seconds.
+        """
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Get the cumulative bucket counts, as used by Prometheus.
+
+        :return:
+            List of tuples ``(upper_bound, cumulative_count)``, the last upper
+            bound being ``float('inf')``.
+        :rtype:
+            list(tuple(float, int))
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class _CommandStatistics:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.phases = {}
+        self.errors = dict((kind, 0) for kind in ERROR_KINDS)
+        self.count = 0
+
+    def observe(self, phase, seconds):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Sen5xLatencyHistogram(
+                self.buckets)
+        histogram.observe(seconds)
+
+
+class _TimedCommand:
+    """
+    Proxy around a command which measures the time when the connection
+    starts and finishes interpreting the response.
+    """
+
+    def __init__(self, command, clock):
+        self._command = command
+        self._clock = clock
+        self.decode_start = None
+        self.decode_end = None
+
+    def __getattr__(self, name):
+        return getattr(self._command, name)
+
+    def interpret_response(self, data):
+        self.decode_start = self._clock()
+        try:
+            return self._command.interpret_response(data)
+        finally:
+            self.decode_end = self._clock()
+
+
+class Sen5xInstrumentation:
+    """
+    Records per-command latency histograms and error counters.
+
+    The instrumentation is opt-in: attach it to one or more devices with
+    :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.instrumentation`.
+    Devices without instrumentation execute commands without any overhead.
+
+    For each command class, the following phases are recorded:
+
+    - ``transfer``: The whole I²C transfer (write, read delay and read).
+      Only recorded if ``split_phases`` is ``False``.
+    - ``write``, ``delay``, ``read``: The single parts of the transfer. Only
+      recorded if ``split_phases`` is ``True``.
+    - ``decode``: CRC check and interpretation of the response.
+    - ``post_processing``: Waiting for the post processing time of the
+      device.
+    - ``total``: All of the above.
+
+    In addition, CRC errors, NACKs, timeouts and other errors are counted per
+    command class.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        instrumentation = Sen5xInstrumentation()
+        device.instrumentation = instrumentation
+        ...
+        print(instrumentation.to_prometheus())
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, split_phases=False,
+                 clock=time.perf_counter, sleep=None):
+        """
+        Constructor.
+
+        :param tuple(float) buckets:
+            Upper bounds of the histogram buckets in seconds.
+        :param bool split_phases:
+            If ``True``, each command is executed as separate write and read
+            transfers with the read delay awaited in between on the host, so
+            write, delay and read can be measured separately. This is how the
+            SEN5x protocol is specified, but it might add overhead with
+            transceivers which perform write, delay and read in a single
+            operation (e.g. the SensorBridge). If ``False`` (the default),
+            the transfer is measured as a whole. Split phases are not
+            supported with multi-channel connections.
+        :param callable clock:
+            Function returning a monotonic time in seconds, used to measure
+            latencies.
+        :param callable sleep:
+            Function to sleep for a given number of seconds. Defaults to the
+            sleep of the clock of the device executing the command (see
+            :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.clock`).
+        """
+        super(Sen5xInstrumentation, self).__init__()
+        self._buckets = tuple(buckets)
+        self._split_phases = split_phases
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._commands = {}
+
+    def reset(self):
+        """
+        Clear all recorded data.
+        """
+        with self._lock:
+            self._commands = {}
+
+    def execute(self, connection, slave_address, command,
+                wait_post_process=True, clock=None):
+        """
+        Execute a command and record its latencies and errors. This is called
+        by :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.execute`.
+
+        :param ~sensirion_i2c_driver.connection.I2cConnection connection:
+            The connection to execute the command on.
+        :param byte slave_address:
+            The I²C slave address of the device.
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to execute.
+        :param bool wait_post_process:
+            Whether to wait for the post processing time of the command.
+        :param clock:
+            The clock of the device (e.g.
+            :py:class:`~sensirion_i2c_sen5x.clock.Sen5xVirtualClock`), used
+            to wait if no ``sleep`` function was passed to the constructor.
+            ``None`` means :py:data:`~sensirion_i2c_sen5x.clock.SYSTEM_CLOCK`.
+        :return:
+            The interpreted response of the command.
+        """
+        sleep = self._sleep or (clock or SYSTEM_CLOCK).sleep
+        phases = []
+        start = self._clock()
+        try:
+            try:
+                if self._split_phases and not connection.is_multi_channel:
+                    result = self._execute_split(connection, slave_address,
+                                                 command, phases, sleep)
+                else:
+                    result = self._execute_combined(connection, slave_address,
+                                                    command, phases)
+            finally:
+                if wait_post_process and command.post_processing_time > 0.0:
+                    t = self._clock()
+                    sleep(command.post_processing_time)
+                    phases.append(('post_processing', self._clock() - t))
+        except Exception as e:
+            self._record(command, phases, self._clock() - start, e)
+            raise
+        self._record(command, phases, self._clock() - start, None)
+        return result
+
+    def _execute_combined(self, connection, slave_address, command, phases):
+        timed = _TimedCommand(command, self._clock)
+        start = self._clock()
+        try:
+            return connection.execute(slave_address, timed,
+                                      wait_post_process=False)
+        finally:
+            if timed.decode_start is None:
+                phases.append(('transfer', self._clock() - start))
+            else:
+                phases.append(('transfer', timed.decode_start - start))
+                phases.append(('decode',
+                               timed.decode_end - timed.decode_start))
+
+    def _execute_split(self, connection, slave_address, command, phases,
+                       sleep):
+        t0 = self._clock()
+        if command.tx_data is not None:
+            connection.execute(slave_address, I2cCommand(
+                tx_data=command.tx_data, rx_length=None, read_delay=0.0,
+                timeout=command.timeout), wait_post_process=False)
+        t1 = self._clock()
+        phases.append(('write', t1 - t0))
+        if command.rx_length is None:
+            data = b''
+        else:
+            if command.read_delay > 0.0:
+                sleep(command.read_delay)
+            t2 = self._clock()
+            phases.append(('delay', t2 - t1))
+            data = connection.execute(slave_address, I2cCommand(
+                tx_data=None, rx_length=command.rx_length, read_delay=0.0,
+                timeout=command.timeout), wait_post_process=False) or b''
+            t1 = self._clock()
+            phases.append(('read', t1 - t2))
+        result = command.interpret_response(data)
+        phases.append(('decode', self._clock() - t1))
+        return result
+
+    def _record(self, command, phases, total, error):
+        name = command_name(command)
+        with self._lock:
+            stats = self._commands.get(name)
+            if stats is None:
+                stats = self._commands[name] = \
+                    _CommandStatistics(self._buckets)
+            stats.count += 1
+            for phase, seconds in phases:
+                stats.observe(phase, seconds)
+            stats.observe('total', total)
+            if error is not None:
+                stats.errors[error_kind(error)] += 1
+
+    def to_dict(self):
+        """
+        Export all recorded data as plain dict.
+
+        :return:
+            Dict with the command name as key and a dict with the keys
+            ``count`` (number of executions), ``errors`` (dict of error
+            counters, see :py:data:`ERROR_KINDS`) and ``phases`` as value.
+            ``phases`` contains for each phase a dict with the keys ``count``,
+            ``sum`` (seconds) and ``buckets`` (list of tuples of upper bound
+            and cumulative count).
+        :rtype:
+            dict
+        """
+        with self._lock:
+            return dict(
+                (name, {
+                    'count': stats.count,
+                    'errors': dict(stats.errors),
+                    'phases': dict(
+                        (phase, {
+                            'count': histogram.count,
+                            'sum': histogram.sum,
+                            'buckets': histogram.cumulative(),
+                        }) for phase, histogram in stats.phases.items()),
+                }) for name, stats in self._commands.items())
+
+    def to_prometheus(self, prefix='sen5x', labels=None):
+        """
+        Export all recorded data in the Prometheus text exposition format.
+
+        :param str prefix:
+            Prefix of all metric names.
+        :param dict labels:
+            Additional labels added to all samples (e.g. the device serial
+            number).
+        :return:
+            The metrics as text.
+        :rtype:
+            str
+        """
+        extra = ''.join(',{}="{}"'.format(k, escape_label_value(v))
+                        for k, v in sorted((labels or {}).items()))
+        data = self.to_dict()
+        lines = [
+            '# HELP {}_command_duration_seconds Latency of I2C commands '
+            'per phase.'.format(prefix),
+            '# TYPE {}_command_duration_seconds histogram'.format(prefix),
+        ]
+        for name in sorted(data):
+            for phase in sorted(data[name]['phases']):
+                histogram = data[name]['phases'][phase]
+                label = 'command="{}",phase="{}"{}'.format(name, phase, extra)
+                for bound, count in histogram['buckets']:
+                    lines.append('{}_command_duration_seconds_bucket'
+                                 '{{{},le="{}"}} {}'.format(
+                                     prefix, label, _format_bound(bound),
+                                     count))
+                lines.append('{}_command_duration_seconds_sum{{{}}} {!r}'
+                             .format(prefix, label, histogram['sum']))
+                lines.append('{}_command_duration_seconds_count{{{}}} {}'
+                             .format(prefix, label, histogram['count']))
+        lines.append('# HELP {}_commands_total Number of executed I2C '
+                     'commands.'.format(prefix))
+        lines.append('# TYPE {}_commands_total counter'.format(prefix))
+        for name in sorted(data):
+            lines.append('{}_commands_total{{command="{}"{}}} {}'.format(
+                prefix, name, extra, data[name]['count']))
+        lines.append('# HELP {}_command_errors_total Number of failed I2C '
+                     'commands.'.format(prefix))
+        lines.append('# TYPE {}_command_errors_total counter'.format(prefix))
+        for name in sorted(data):
+            for kind in ERROR_KINDS:
+                lines.append(
+                    '{}_command_errors_total{{command="{}",error="{}"{}}} {}'
+                    .format(prefix, name, kind, extra,
+                            data[name]['errors'][kind]))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
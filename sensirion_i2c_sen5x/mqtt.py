@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from collections import deque
+from struct import Struct, error as StructError
+import os
+import queue
+import threading
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Magic bytes at the beginning of each batch payload.
+MAGIC = b'S5'
+
+#: Version of the batch payload format.
+FORMAT_VERSION = 1
+
+# Batch header: magic, format version, sample count, base timestamp [ns].
+_HEADER = Struct('>2sBHq')
+
+# Sample: offset to the base timestamp [ms], 4x uint16 PM, 4x int16 RH, T,
+# VOC, NOx (the raw ticks as received from the device).
+_SAMPLE = Struct('>I4H4h')
+
+# Spill file record: topic length, payload length.
+_SPILL_RECORD = Struct('>HI')
+
+# Spill segment file names (with the segment index) and the file storing the
+# read position as "<segment index> <offset>".
+_SPILL_SEGMENT = 'sen5x-mqtt-{:08d}.spill'
+_SPILL_OFFSET = 'sen5x-mqtt.offset'
+
+
+def encode_batch(samples):
+    """
+    Encode samples into a compact batch payload: a 13 byte header (magic,
+    format version, sample count, base timestamp in nanoseconds) followed by
+    20 bytes per sample (millisecond offset to the base timestamp and the
+    eight raw ticks). The base timestamp is the earliest timestamp, so the
+    samples do not need to be ordered by time (e.g. after the system clock
+    was set back).
+
+    :param list samples:
+        List of tuples ``(timestamp_ns, ticks)``.
+    :return:
+        The payload.
+    :rtype:
+        bytes
+    :raise struct.error:
+        If the timestamps span more than 2**32 milliseconds or the ticks are
+        out of range.
+    """
+    base = min(timestamp_ns for timestamp_ns, _ in samples) if samples else 0
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(samples), base)]
+    for timestamp_ns, ticks in samples:
+        parts.append(_SAMPLE.pack((timestamp_ns - base) // 1000000, *ticks))
+    return b''.join(parts)
+
+
+def decode_batch(payload):
+    """
+    Decode a payload created by :py:func:`encode_batch`.
+
+    :param bytes payload:
+        The payload.
+    :return:
+        List of tuples ``(timestamp_ns, ticks)`` in the encoded order, with
+        the timestamps truncated to milliseconds relative to the earliest
+        sample.
+    :rtype:
+        list
+    :raise ValueError:
+        If the payload is not a valid batch.
+    """
+    magic, version, count, base = _HEADER.unpack_from(payload)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Unsupported batch format.")
+    if len(payload) != _HEADER.size + count * _SAMPLE.size:
+        raise ValueError("Invalid batch length: {}.".format(len(payload)))
+    samples = []
+    for i in range(count):
+        fields = _SAMPLE.unpack_from(payload, _HEADER.size + i * _SAMPLE.size)
+        samples.append((base + fields[0] * 1000000, fields[1:]))
+    return samples
+
+
+class Sen5xMqttPublisher:
+    """
+    Publishes measured values in batches to an MQTT broker.
+
+    Samples are collected per topic and published as one message per
+    ``interval`` seconds (or ``max_samples`` samples) and topic, see
+    :py:func:`encode_batch`. Publishing is done in a background thread, so
+    :py:meth:`put` never waits for the broker nor for the disk. If the broker
+    is slow or unreachable, sealed batches are queued up to ``queue_size``
+    messages. Further batches are handed over to the background thread, which
+    appends them to spill files in ``spill_dir`` (if given, otherwise they
+    are dropped) and publishes them as soon as the queue got drained.
+
+    Spill files are append-only segments of at most about
+    ``spill_segment_size`` bytes, which are read sequentially and deleted
+    once they are published completely. The read position is stored in the
+    spill directory as well, so spilled messages survive a restart.
+
+    The client is any object with a paho-mqtt compatible method
+    ``publish(topic, payload, qos)``. A publish is considered as failed if it
+    raises an exception or returns an object with a non-zero ``rc``
+    attribute, and is retried after ``retry_delay`` seconds.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        import paho.mqtt.client as mqtt
+
+        client = mqtt.Client()
+        client.connect('broker.local')
+        client.loop_start()
+        publisher = Sen5xMqttPublisher(client, interval=10.0,
+                                       spill_dir='/var/spool/sen5x')
+        publisher.start()
+        while True:
+            values = device.read_measured_values()
+            publisher.put('sen5x/' + serial_number, values)
+            time.sleep(1.0)
+    """
+
+    def __init__(self, client, interval=10.0, max_samples=600, qos=1,
+                 queue_size=1000, spill_dir=None, retry_delay=1.0,
+                 clock=time.monotonic, wall_clock=time.time,
+                 spill_segment_size=1048576):
+        """
+        Constructor.
+
+        :param client:
+            The MQTT client.
+        :param float interval:
+            Maximum time in seconds samples are collected before publishing.
+        :param int max_samples:
+            Maximum number of samples per message.
+        :param int qos:
+            MQTT quality of service level.
+        :param int queue_size:
+            Maximum number of messages waiting for publishing in memory.
+        :param str spill_dir:
+            Directory for the spill files, or ``None`` to drop messages if the
+            queue is full.
+        :param float retry_delay:
+            Delay in seconds before retrying a failed publish.
+        :param callable clock:
+            Function returning a monotonic time in seconds.
+        :param callable wall_clock:
+            Function returning the current time in seconds since the epoch,
+            used as sample timestamp if none is given to :py:meth:`put`.
+        :param int spill_segment_size:
+            Size in bytes after which a new spill file is started.
+        """
+        super(Sen5xMqttPublisher, self).__init__()
+        self._client = client
+        self._interval = interval
+        self._max_samples = max_samples
+        self._qos = qos
+        self._retry_delay = retry_delay
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._overflow = deque()
+        self._lock = threading.Lock()
+        self._batches = {}
+        self._spill_dir = spill_dir
+        self._spill_segment_size = spill_segment_size
+        self._segments = None
+        self._writer = None
+        self._reader = None
+        self._read_offset = 0
+        self._stop = threading.Event()
+        self._draining = threading.Event()
+        self._thread = None
+
+        #: Number of published messages.
+        self.published = 0
+
+        #: Number of failed publish attempts.
+        self.failures = 0
+
+        #: Number of messages written to the spill files.
+        self.spilled = 0
+
+        #: Number of dropped messages (queue full and no spill directory, or
+        #: samples which could not be encoded).
+        self.dropped = 0
+
+    @property
+    def pending(self):
+        """
+        Number of messages waiting in memory for publishing.
+
+        :type: int
+        """
+        return self._queue.qsize()
+
+    def put(self, topic, values, timestamp_ns=None):
+        """
+        Add a sample. Never blocks on the broker.
+
+        :param str topic:
+            The MQTT topic.
+        :param values:
+            The raw ticks (tuple of 8 integers) or a
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            object.
+        :param int timestamp_ns:
+            Time of the sample in nanoseconds since the epoch. Defaults to
+            the current time.
+        """
+        if timestamp_ns is None:
+            timestamp_ns = int(self._wall_clock() * 1e9)
+        ticks = getattr(values, 'values', values)
+        now = self._clock()
+        with self._lock:
+            batch = self._batches.get(topic)
+            if batch is None:
+                batch = self._batches[topic] = (now, [])
+            batch[1].append((timestamp_ns, ticks))
+            if len(batch[1]) >= self._max_samples or \
+                    now - batch[0] >= self._interval:
+                del self._batches[topic]
+            else:
+                batch = None
+        if batch is not None:
+            self._seal(topic, batch[1])
+
+    def flush(self):
+        """
+        Seal all open batches, i.e. queue them for publishing immediately.
+        """
+        with self._lock:
+            batches, self._batches = self._batches, {}
+        for topic, (_, samples) in sorted(batches.items()):
+            self._seal(topic, samples)
+
+    def start(self):
+        """
+        Start publishing in the background.
+        """
+        self._stop.clear()
+        self._draining.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='sen5x-mqtt-publisher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Seal all open batches and stop the background thread after the
+        messages in memory were published (or ``timeout`` expired). Messages
+        still in memory afterwards are spilled (if possible). Spilled
+        messages are kept on disk and published after the next
+        :py:meth:`start`.
+
+        :param float timeout:
+            Maximum time in seconds to wait for publishing the messages in
+            memory.
+        """
+        self.flush()
+        if self._thread is not None:
+            self._draining.set()
+            self._thread.join(timeout)
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        while True:
+            try:
+                message = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._spill(*message)
+            self._queue.task_done()
+        while self._overflow:
+            self._spill(*self._overflow.popleft())
+        self._close_spill()
+
+    def _seal(self, topic, samples):
+        try:
+            payload = encode_batch(samples)
+        except StructError as e:
+            self.dropped += 1
+            log.error("Dropping batch of {} samples for '{}': {}".format(
+                len(samples), topic, e))
+            return
+        self._enqueue(topic, payload)
+
+    def _enqueue(self, topic, payload):
+        try:
+            self._queue.put_nowait((topic, payload))
+        except queue.Full:
+            if self._spill_dir is None:
+                self.dropped += 1
+                log.warning("Publish queue full, dropping message.")
+            else:
+                # Spilled by the background thread, to not block on the disk.
+                self._overflow.append((topic, payload))
+
+    def _drain_overflow(self):
+        """
+        Move messages handed over by :py:meth:`_enqueue` into the queue (as
+        many as fit) and spill the others.
+        """
+        while self._overflow:
+            message = self._overflow.popleft()
+            try:
+                self._queue.put_nowait(message)
+            except queue.Full:
+                self._spill(*message)
+
+    def _segment_path(self, index):
+        return os.path.join(self._spill_dir, _SPILL_SEGMENT.format(index))
+
+    def _open_spill(self):
+        if self._segments is not None:
+            return
+        self._segments = deque()
+        if self._spill_dir is None:
+            return
+        prefix, suffix = _SPILL_SEGMENT.split('{:08d}')
+        for name in os.listdir(self._spill_dir):
+            if name.startswith(prefix) and name.endswith(suffix):
+                try:
+                    self._segments.append(int(name[len(prefix):-len(suffix)]))
+                except ValueError:
+                    pass
+        self._segments = deque(sorted(self._segments))
+        self._read_offset = 0
+        try:
+            with open(os.path.join(self._spill_dir, _SPILL_OFFSET)) as f:
+                index, offset = (int(x) for x in f.read().split())
+            if self._segments and self._segments[0] == index:
+                self._read_offset = offset
+        except (IOError, ValueError):
+            pass
+
+    def _close_spill(self):
+        for f in (self._reader, self._writer):
+            if f is not None:
+                f.close()
+        self._reader = self._writer = None
+        self._segments = None
+
+    def _spill(self, topic, payload):
+        self._open_spill()
+        if self._writer is None or \
+                self._writer.tell() >= self._spill_segment_size:
+            if self._writer is not None:
+                self._writer.close()
+            index = self._segments[-1] + 1 if self._segments else 0
+            self._writer = open(self._segment_path(index), 'ab')
+            self._segments.append(index)
+        data = topic.encode('utf-8')
+        self._writer.write(_SPILL_RECORD.pack(len(data), len(payload)) + data +
+                           payload)
+        self._writer.flush()
+        self.spilled += 1
+
+    def _read_spilled(self):
+        offset = self._read_offset
+        header = self._reader.read(_SPILL_RECORD.size)
+        if len(header) == _SPILL_RECORD.size:
+            topic_length, payload_length = _SPILL_RECORD.unpack(header)
+            data = self._reader.read(topic_length + payload_length)
+            if len(data) == topic_length + payload_length:
+                self._read_offset = self._reader.tell()
+                return data[:topic_length].decode('utf-8'), \
+                    data[topic_length:]
+        self._reader.seek(offset)
+        return None
+
+    def _unspill(self):
+        """
+        Move spilled messages back into the queue (as many as fit), reading
+        the spill files sequentially from the stored read position.
+        """
+        self._open_spill()
+        if not self._segments:
+            return
+        position = (self._segments[0], self._read_offset)
+        while self._segments and not self._queue.full():
+            index = self._segments[0]
+            if self._reader is None:
+                self._reader = open(self._segment_path(index), 'rb')
+            self._reader.seek(self._read_offset)
+            message = self._read_spilled()
+            if message is not None:
+                self._queue.put_nowait(message)
+                continue
+            # End of the segment: delete it, unless it is still written.
+            if self._writer is not None and \
+                    self._writer.name == self._reader.name:
+                if self._writer.tell() > self._read_offset:
+                    break  # incomplete record, should not happen
+                self._writer.close()
+                self._writer = None
+            elif os.path.getsize(self._reader.name) > self._read_offset:
+                log.warning("Ignoring incomplete record at end of {}.".format(
+                    self._reader.name))
+            self._reader.close()
+            self._reader = None
+            os.remove(self._segment_path(index))
+            self._segments.popleft()
+            self._read_offset = 0
+        offset_path = os.path.join(self._spill_dir, _SPILL_OFFSET)
+        if not self._segments:
+            if os.path.exists(offset_path):
+                os.remove(offset_path)
+        elif (self._segments[0], self._read_offset) != position:
+            temp_path = offset_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                f.write('{} {}'.format(self._segments[0], self._read_offset))
+            os.replace(temp_path, offset_path)
+
+    def _publish(self, topic, payload):
+        try:
+            result = self._client.publish(topic, payload, qos=self._qos)
+        except Exception as e:
+            log.warning("Failed to publish to '{}': {}".format(topic, e))
+            return False
+        rc = getattr(result, 'rc', 0)
+        if rc:
+            log.warning("Failed to publish to '{}': rc={}".format(topic, rc))
+            return False
+        return True
+
+    def _seal_expired(self):
+        now = self._clock()
+        with self._lock:
+            expired = [topic for topic, (started, _) in self._batches.items()
+                       if now - started >= self._interval]
+            batches = [(topic, self._batches.pop(topic)[1])
+                       for topic in sorted(expired)]
+        for topic, samples in batches:
+            self._seal(topic, samples)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._seal_expired()
+            self._drain_overflow()
+            if self._queue.empty():
+                if self._draining.is_set():
+                    break
+                self._unspill()
+            try:
+                topic, payload = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            while not self._publish(topic, payload):
+                self.failures += 1
+                self._drain_overflow()
+                if self._stop.wait(self._retry_delay):
+                    self._spill(topic, payload)
+                    break
+            else:
+                self.published += 1
+            self._queue.task_done()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+import random
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# Registered hooks as list of tuples (hook, sample_rate). The driver only
+# checks whether this list is empty, so profiling costs nothing as long as
+# no hook is registered.
+_hooks = []
+
+if hasattr(time, 'monotonic_ns'):
+    _monotonic_ns = time.monotonic_ns
+else:  # Python < 3.7
+    def _monotonic_ns():
+        return int(time.monotonic() * 1e9)
+
+
+def timestamp_ns():
+    """
+    Get the current monotonic time in nanoseconds, as passed to the hooks.
+
+    :return: Monotonic timestamp in nanoseconds.
+    :rtype: int
+    """
+    return _monotonic_ns()
+
+
+class Sen5xProfilingHook:
+    """
+    Base class for profiling hooks. Derive from this class and override the
+    methods you are interested in, then register the hook with
+    :py:func:`add_hook`.
+
+    All timestamps are taken from :py:func:`timestamp_ns` (monotonic
+    nanoseconds). Hooks are called synchronously in the thread executing the
+    command, so they should return quickly (e.g. just enqueue the timings
+    for a tracer).
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        class TracerHook(Sen5xProfilingHook):
+            def post_decode(self, command_id, stage, start_ns, end_ns, error):
+                tracer.record('sen5x.{:04X}.{}'.format(command_id, stage),
+                              end_ns - start_ns)
+
+        add_hook(TracerHook(), sample_rate=0.01)
+    """
+
+    def pre_execute(self, command_id, timestamp_ns):
+        """
+        Called before a command is executed by
+        :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.execute`.
+
+        :param int command_id: The command ID, e.g. 0x03C4.
+        :param int timestamp_ns: Start time.
+        """
+        pass
+
+    def post_execute(self, command_id, start_ns, end_ns, error):
+        """
+        Called after a command was executed by
+        :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.execute`.
+
+        :param int command_id: The command ID, e.g. 0x03C4.
+        :param int start_ns: Start time (as passed to :py:meth:`pre_execute`).
+        :param int end_ns: End time.
+        :param Exception error: The raised exception, or ``None``.
+        """
+        pass
+
+    def pre_decode(self, command_id, stage, timestamp_ns):
+        """
+        Called before a stage of decoding a response starts.
+
+        The "Read Measured Values" response is decoded in the stages ``'crc'``
+        (CRC validation and conversion of the raw bytes into integers) and
+        ``'measured_values'`` (creation of the
+        :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+        object).
+
+        :param int command_id: The command ID, e.g. 0x03C4.
+        :param str stage: Name of the decoding stage.
+        :param int timestamp_ns: Start time.
+        """
+        pass
+
+    def post_decode(self, command_id, stage, start_ns, end_ns, error):
+        """
+        Called after a stage of decoding a response has finished.
+
+        :param int command_id: The command ID, e.g. 0x03C4.
+        :param str stage: Name of the decoding stage.
+        :param int start_ns: Start time (as passed to :py:meth:`pre_decode`).
+        :param int end_ns: End time.
+        :param Exception error: The raised exception, or ``None``.
+        """
+        pass
+
+
+def add_hook(hook, sample_rate=1.0):
+    """
+    Register a profiling hook.
+
+    :param ~sensirion_i2c_sen5x.profiling.Sen5xProfilingHook hook:
+        The hook to register.
+    :param float sample_rate:
+        Fraction (0.0..1.0) of calls the hook gets called for, e.g. 0.01 to
+        sample 1% of all calls. Each execution and each decoding is sampled
+        independently, but the pre- and post-method of the same call are
+        always called together.
+    """
+    _hooks.append((hook, float(sample_rate)))
+
+
+def remove_hook(hook):
+    """
+    Unregister a profiling hook previously registered with
+    :py:func:`add_hook`.
+
+    :param ~sensirion_i2c_sen5x.profiling.Sen5xProfilingHook hook:
+        The hook to unregister.
+    """
+    _hooks[:] = [(h, rate) for h, rate in _hooks if h is not hook]
+
+
+def clear_hooks():
+    """
+    Unregister all profiling hooks.
+    """
+    del _hooks[:]
+
+
+def sample():
+    """
+    Select the hooks to be called for the current call, according to their
+    sample rates.
+
+    :return: The selected hooks.
+    :rtype: list
+    """
+    return [hook for hook, rate in _hooks
+            if rate >= 1.0 or random.random() < rate]
+
+
+def command_id(command):
+    """
+    Get the command ID of a command object.
+
+    :param ~sensirion_i2c_driver.command.I2cCommand command:
+        The command.
+    :return:
+        The 16-bit command ID, or ``None`` if the command does not send any
+        data.
+    :rtype:
+        int/None
+    """
+    tx_data = command.tx_data
+    if not tx_data or len(tx_data) < 2:
+        return None
+    return (tx_data[0] << 8) | tx_data[1]
+
+
+def run_execute(function, command, *args):
+    """
+    Call ``function(command, *args)`` surrounded by the execute hooks of all
+    sampled hooks.
+    """
+    hooks = sample()
+    if not hooks:
+        return function(command, *args)
+    cid = command_id(command)
+    start = timestamp_ns()
+    for hook in hooks:
+        hook.pre_execute(cid, start)
+    error = None
+    try:
+        return function(command, *args)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        end = timestamp_ns()
+        for hook in hooks:
+            hook.post_execute(cid, start, end, error)
+
+
+def run_decode(hooks, cid, stage, function, *args):
+    """
+    Call ``function(*args)`` surrounded by the decode hooks of the given
+    (already sampled) hooks.
+    """
+    if not hooks:
+        return function(*args)
+    start = timestamp_ns()
+    for hook in hooks:
+        hook.pre_decode(cid, stage, start)
+    error = None
+    try:
+        return function(*args)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        end = timestamp_ns()
+        for hook in hooks:
+            hook.post_decode(cid, stage, start, end, error)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .configuration import Sen5xConfigurator
+from .device import Sen5xI2cDevice
+from sensirion_i2c_driver import I2cConnection, I2cCommand
+from collections import OrderedDict
+import threading
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class Sen5xProvisioningTarget:
+    """
+    Identifies a single SEN5x device in a fleet: the I²C bus, an optional
+    channel of an I²C multiplexer (e.g. TCA9548A) and the slave address.
+    """
+
+    def __init__(self, bus, slave_address=0x69, mux_channel=None,
+                 mux_address=0x70):
+        """
+        Constructor.
+
+        :param bus:
+            Identifier of the I²C bus, passed to the transceiver factory of
+            :py:func:`provision` (e.g. ``'/dev/i2c-1'``).
+        :param byte slave_address:
+            The I²C slave address of the SEN5x, defaults to 0x69.
+        :param int mux_channel:
+            Channel (0..7) of the I²C multiplexer the device is connected to,
+            or ``None`` if the device is connected directly.
+        :param byte mux_address:
+            I²C slave address of the multiplexer, defaults to 0x70.
+        """
+        super(Sen5xProvisioningTarget, self).__init__()
+        self.bus = bus
+        self.slave_address = slave_address
+        self.mux_channel = mux_channel
+        self.mux_address = mux_address
+
+    def __str__(self):
+        if self.mux_channel is None:
+            return '{}@0x{:02X}'.format(self.bus, self.slave_address)
+        return '{}/mux{}@0x{:02X}'.format(
+            self.bus, self.mux_channel, self.slave_address)
+
+
+class Sen5xProvisioningResult:
+    """
+    Result of provisioning a single device.
+    """
+
+    def __init__(self, target):
+        super(Sen5xProvisioningResult, self).__init__()
+
+        #: The provisioned target (:py:class:`Sen5xProvisioningTarget`).
+        self.target = target
+
+        #: The configuration report
+        #: (:py:class:`~sensirion_i2c_sen5x.configuration.Sen5xConfigurationReport`),
+        #: or ``None`` if the configuration could not be applied at all.
+        self.report = None
+
+        #: The exception which aborted provisioning, or ``None``.
+        self.error = None
+
+        #: Time in seconds needed for this device, including multiplexer
+        #: channel selection.
+        self.duration = 0.0
+
+    @property
+    def success(self):
+        """
+        Whether the device was provisioned and verified successfully.
+
+        :type: bool
+        """
+        return (self.error is None) and (self.report is not None) and \
+            self.report.success
+
+    def __str__(self):
+        if self.error is not None:
+            return '{}: FAILED ({})'.format(self.target, self.error)
+        return '{}: {}'.format(self.target, self.report)
+
+
+def _write_mux_channels(connection, target, channels):
+    connection.execute(target.mux_address, I2cCommand(
+        tx_data=[channels], rx_length=None, read_delay=0.0, timeout=0.0))
+
+
+def _deselect_mux_channels(connection, target):
+    # Disconnect all channels, so the device does not stay attached to the
+    # bus while the next device (possibly with the same address) is
+    # provisioned.
+    try:
+        _write_mux_channels(connection, target, 0x00)
+    except Exception as e:
+        log.warning("Deselecting multiplexer channel of {} failed: {}".format(
+            target, e))
+
+
+def _provision_bus(bus, targets, results, config, transceiver_factory,
+                   options):
+    """
+    Provision all targets of a single bus sequentially. Runs in its own
+    thread per bus.
+    """
+    try:
+        transceiver = transceiver_factory(bus)
+    except Exception as e:
+        for index, target in targets:
+            results[index].error = e
+        return
+    try:
+        connection = I2cConnection(transceiver)
+        for index, target in targets:
+            result = results[index]
+            start = time.monotonic()
+            try:
+                if target.mux_channel is not None:
+                    _write_mux_channels(connection, target,
+                                        1 << target.mux_channel)
+                try:
+                    device = Sen5xI2cDevice(connection, target.slave_address)
+                    result.report = Sen5xConfigurator(device).apply(
+                        config, **options)
+                finally:
+                    if target.mux_channel is not None:
+                        _deselect_mux_channels(connection, target)
+            except Exception as e:
+                log.warning("Provisioning {} failed: {}".format(target, e))
+                result.error = e
+            result.duration = time.monotonic() - start
+    finally:
+        if hasattr(transceiver, 'close'):
+            transceiver.close()
+
+
+def provision(targets, config, transceiver_factory=None,
+              stop_measurement=False, verify=True,
+              restart_measurement=False):
+    """
+    Apply a configuration to many devices, in parallel across I²C buses.
+
+    One worker thread is started per bus. Within a bus, the devices are
+    configured one after another since they share the bus (and possibly a
+    multiplexer). A failing device does not abort provisioning of the
+    remaining devices.
+
+    Example how to use this function:
+
+    .. code-block:: python
+
+        targets = [Sen5xProvisioningTarget('/dev/i2c-{}'.format(bus),
+                                           mux_channel=channel)
+                   for bus in range(1, 5) for channel in range(8)]
+        config = Sen5xConfiguration(rht_acceleration_mode=1)
+        for result in provision(targets, config):
+            print(result)
+
+    :param list targets:
+        List of :py:class:`Sen5xProvisioningTarget` objects.
+    :param ~sensirion_i2c_sen5x.configuration.Sen5xConfiguration config:
+        The desired configuration.
+    :param callable transceiver_factory:
+        Function taking a bus identifier and returning an opened I²C
+        transceiver for it. Defaults to
+        :py:class:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver`.
+        If the transceiver has a ``close()`` method, it is called when all
+        devices of the bus are done.
+    :param bool stop_measurement:
+        See :py:meth:`~sensirion_i2c_sen5x.configuration.Sen5xConfigurator.apply`.
+    :param bool verify:
+        See :py:meth:`~sensirion_i2c_sen5x.configuration.Sen5xConfigurator.apply`.
+    :param bool restart_measurement:
+        See :py:meth:`~sensirion_i2c_sen5x.configuration.Sen5xConfigurator.apply`.
+    :return:
+        One result per target, in the same order as ``targets``.
+    :rtype:
+        list(~sensirion_i2c_sen5x.provisioning.Sen5xProvisioningResult)
+    """
+    if transceiver_factory is None:
+        from sensirion_i2c_driver import LinuxI2cTransceiver
+        transceiver_factory = LinuxI2cTransceiver
+    options = dict(stop_measurement=stop_measurement, verify=verify,
+                   restart_measurement=restart_measurement)
+    results = [Sen5xProvisioningResult(target) for target in targets]
+    buses = OrderedDict()
+    for index, target in enumerate(targets):
+        buses.setdefault(target.bus, []).append((index, target))
+    threads = [
+        threading.Thread(
+            target=_provision_bus,
+            args=(bus, bus_targets, results, config, transceiver_factory,
+                  options),
+            name='sen5x-provisioning-{}'.format(bus))
+        for bus, bus_targets in buses.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
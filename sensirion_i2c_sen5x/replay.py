@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .commands.wrapped import Sen5xI2cCmdReadMeasuredValues
+from sensirion_i2c_driver import CrcCalculator
+from sensirion_i2c_driver.errors import I2cChecksumError
+from array import array
+from collections import deque
+from struct import pack, unpack_from
+import multiprocessing
+import os
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Size of the raw frame in bytes (8 words with 2 data bytes + 1 CRC byte).
+FRAME_SIZE = 24
+
+#: Size of one archive record in bytes (timestamp + raw frame).
+RECORD_SIZE = 8 + FRAME_SIZE
+
+#: Number of signals per frame.
+SIGNAL_COUNT = 8
+
+_CRC = CrcCalculator(8, 0x31, 0xFF, 0x00)
+_TIMESTAMP_FORMAT = '>q'
+_WORD_FORMATS = ('>H', '>H', '>H', '>H', '>h', '>h', '>h', '>h')
+
+
+def encode_frame(values):
+    """
+    Encode measured values into a raw frame as sent by the device, i.e.
+    the inverse of
+    :py:meth:`~sensirion_i2c_sen5x.commands.wrapped.Sen5xI2cCmdReadMeasuredValues.interpret_response`.
+
+    :param values:
+        Either a
+        :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+        object or a tuple of the eight raw ticks.
+    :return:
+        The raw frame including CRCs.
+    :rtype:
+        bytes
+    """
+    frame = bytearray()
+    for ticks, word_format in zip(getattr(values, 'values', values),
+                                  _WORD_FORMATS):
+        word = pack(word_format, ticks)
+        frame += word
+        frame.append(_CRC(word))
+    return bytes(frame)
+
+
+class Sen5xFrameArchiveWriter:
+    """
+    Writes raw "Read Measured Values" frames into an archive file.
+
+    An archive file is a plain sequence of fixed-size records without any
+    file header. Each record consists of :py:data:`RECORD_SIZE` bytes:
+
+    - 8 bytes: Timestamp in nanoseconds as big-endian signed integer.
+    - 24 bytes: Raw frame as received from the device (including CRCs).
+
+    Since all records have the same size, archives can be split into shards
+    at arbitrary record boundaries and decoded in parallel with
+    :py:func:`~sensirion_i2c_sen5x.replay.replay_archives`.
+    """
+
+    def __init__(self, stream):
+        """
+        Constructor.
+
+        :param stream:
+            Binary file-like object opened for writing.
+        """
+        super(Sen5xFrameArchiveWriter, self).__init__()
+        self._stream = stream
+
+    def write(self, timestamp_ns, frame):
+        """
+        Append one record to the archive.
+
+        :param int timestamp_ns:
+            Timestamp of the frame in nanoseconds.
+        :param bytes frame:
+            Raw frame including CRCs, as received from the device.
+        """
+        if len(frame) != FRAME_SIZE:
+            raise ValueError("Invalid frame length: {} (expected {}).".format(
+                len(frame), FRAME_SIZE))
+        self._stream.write(pack(_TIMESTAMP_FORMAT, timestamp_ns) +
+                           bytes(frame))
+
+
+class Sen5xReplayResult:
+    """
+    Decoded records of a chunk (consecutive records) of one archive file, as
+    yielded by :py:func:`replay_archives`.
+
+    The records are stored in flat arrays, which can also be wrapped without
+    copying, e.g. with
+    ``numpy.frombuffer(result.ticks, dtype=numpy.int32).reshape(-1, 8)``.
+    """
+
+    def __init__(self, path, first_record, timestamps, ticks, valid):
+        super(Sen5xReplayResult, self).__init__()
+
+        #: Path of the archive file.
+        self.path = path
+
+        #: Index of the first record of this chunk within the archive file.
+        self.first_record = first_record
+
+        #: Timestamps in nanoseconds, one per record (array of int64).
+        self.timestamps = timestamps
+
+        #: Raw ticks, :py:data:`SIGNAL_COUNT` values per record (array of
+        #: int32).
+        self.ticks = ticks
+
+        #: Validity flag per record (array of int8). Zero means the record
+        #: had a wrong CRC and its ticks are meaningless.
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def checksum_errors(self):
+        """
+        Number of records which could not be decoded due to wrong CRCs.
+
+        :type: int
+        """
+        return len(self.valid) - sum(self.valid)
+
+    def values(self, index):
+        """
+        Get the raw ticks of a single record.
+
+        :param int index:
+            Record index (within this chunk).
+        :return:
+            The eight raw ticks of the record.
+        :rtype:
+            tuple(int)
+        """
+        start = index * SIGNAL_COUNT
+        return tuple(self.ticks[start:start + SIGNAL_COUNT])
+
+    def __iter__(self):
+        """
+        Iterate over all valid records.
+
+        :return:
+            Iterator over tuples ``(timestamp_ns, ticks)``.
+        """
+        for index in range(len(self.timestamps)):
+            if self.valid[index]:
+                yield self.timestamps[index], self.values(index)
+
+
+# Decode buffers of the current worker process, set by _init_worker().
+_buffers = None
+
+
+def _init_worker(buffers):
+    global _buffers
+    _buffers = buffers
+
+
+def _allocate(context, records):
+    return (context.RawArray('q', records),
+            context.RawArray('i', records * SIGNAL_COUNT),
+            context.RawArray('b', records))
+
+
+def _decode_into(buffers, task):
+    """
+    Decode a range of records of one archive file into a decode buffer.
+    """
+    path, first_record, count, slot = task
+    timestamps, ticks, valid = buffers[slot]
+    command = Sen5xI2cCmdReadMeasuredValues()
+    with open(path, 'rb') as f:
+        f.seek(first_record * RECORD_SIZE)
+        data = f.read(count * RECORD_SIZE)
+    for index in range(count):
+        offset = index * RECORD_SIZE
+        timestamps[index] = unpack_from(_TIMESTAMP_FORMAT, data, offset)[0]
+        try:
+            values = command.interpret_response(
+                data[offset + 8:offset + RECORD_SIZE]).values
+        except I2cChecksumError:
+            valid[index] = 0
+            continue
+        ticks[index * SIGNAL_COUNT:(index + 1) * SIGNAL_COUNT] = values
+        valid[index] = 1
+
+
+def _decode_shard(task):
+    """
+    Decode a shard into the decode buffers of the worker process.
+    """
+    _decode_into(_buffers, task)
+
+
+def _copy(buffer, count, typecode):
+    result = array(typecode)
+    result.frombytes(memoryview(buffer).cast('B')[:count * result.itemsize])
+    return result
+
+
+def _result(task, buffers):
+    path, first_record, count, slot = task
+    timestamps, ticks, valid = buffers[slot]
+    return Sen5xReplayResult(path, first_record,
+                             _copy(timestamps, count, 'q'),
+                             _copy(ticks, count * SIGNAL_COUNT, 'i'),
+                             _copy(valid, count, 'b'))
+
+
+def _shards(paths, chunk_records):
+    shards = []
+    for path in paths:
+        size = os.path.getsize(path)
+        if size % RECORD_SIZE:
+            log.warning("Ignoring incomplete record at end of {}.".format(
+                path))
+        count = size // RECORD_SIZE
+        for first in range(0, count, chunk_records):
+            shards.append((path, first, min(chunk_records, count - first)))
+    return shards
+
+
+def replay_archives(paths, processes=None, chunk_records=65536,
+                    context=None):
+    """
+    Decode archive files in parallel with a process pool, streaming the
+    decoded records in chunks.
+
+    The archives are split into shards of at most ``chunk_records`` records,
+    which are distributed to the worker processes. Each worker decodes its
+    shards with
+    :py:class:`~sensirion_i2c_sen5x.commands.wrapped.Sen5xI2cCmdReadMeasuredValues`
+    (i.e. exactly like frames received from a device, including CRC
+    validation) and writes the results directly into shared memory, so no
+    decoded objects need to be pickled.
+
+    The shared memory consists of two decode buffers of ``chunk_records``
+    records per worker, and the next shard is only assigned to a worker when
+    a buffer got free, so the memory is bounded independent of the size of
+    the archives.
+
+    Example how to use this function:
+
+    .. code-block:: python
+
+        for chunk in replay_archives(paths):
+            print(chunk.path, len(chunk), chunk.checksum_errors)
+
+    :param list(str) paths:
+        Archive files to decode.
+    :param int processes:
+        Number of worker processes. ``None`` uses the number of CPUs. With
+        ``1``, the archives are decoded in the calling process.
+    :param int chunk_records:
+        Maximum number of records per shard (and per yielded chunk).
+    :param context:
+        Optional :py:mod:`multiprocessing` context (e.g. to select the
+        "spawn" start method).
+    :return:
+        Generator of :py:class:`Sen5xReplayResult`, one per shard, in the
+        order of ``paths`` and the records within the files.
+    """
+    context = context or multiprocessing.get_context()
+    shards = _shards(paths, chunk_records)
+    total = errors = 0
+    if processes == 1 or len(shards) <= 1:
+        buffers = [_allocate(context, chunk_records)]
+        for shard in shards:
+            task = shard + (0,)
+            _decode_into(buffers, task)
+            result = _result(task, buffers)
+            total += len(result)
+            errors += result.checksum_errors
+            yield result
+    else:
+        processes = processes or os.cpu_count() or 1
+        buffers = [_allocate(context, chunk_records)
+                   for _ in range(2 * processes)]
+        free = list(range(len(buffers)))
+        pending = deque()
+        shards = iter(shards)
+        with context.Pool(processes, _init_worker, (buffers,)) as pool:
+            while True:
+                while free:
+                    shard = next(shards, None)
+                    if shard is None:
+                        break
+                    task = shard + (free.pop(),)
+                    pending.append(
+                        (task, pool.apply_async(_decode_shard, (task,))))
+                if not pending:
+                    break
+                task, async_result = pending.popleft()
+                async_result.get()
+                result = _result(task, buffers)
+                free.append(task[3])
+                total += len(result)
+                errors += result.checksum_errors
+                yield result
+    log.debug("Replayed {} records from {} files ({} checksum errors).".format(
+        total, len(paths), errors))
+
+
+def replay_records(paths, processes=None, chunk_records=65536, context=None):
+    """
+    Decode archive files like :py:func:`replay_archives`, but iterate over
+    the single valid records.
+
+    :param list(str) paths:
+        Archive files to decode.
+    :param int processes:
+        Number of worker processes, see :py:func:`replay_archives`.
+    :param int chunk_records:
+        Maximum number of records per shard.
+    :param context:
+        Optional :py:mod:`multiprocessing` context.
+    :return:
+        Generator of tuples ``(timestamp_ns, ticks)``.
+    """
+    for chunk in replay_archives(paths, processes, chunk_records, context):
+        for record in chunk:
+            yield record
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .filters import SENTINELS
+from collections import deque
+import heapq
+import math
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Interpolation method: value of the sample nearest to the grid point.
+NEAREST = 'nearest'
+
+#: Interpolation method: linear interpolation between the samples before and
+#: after the grid point.
+LINEAR = 'linear'
+
+#: Interpolation method: value of the last sample before (or at) the grid
+#: point (zero-order hold).
+HOLD = 'hold'
+
+#: All interpolation methods.
+METHODS = (NEAREST, LINEAR, HOLD)
+
+
+class Sen5xAlignedFrame:
+    """
+    Values of all streams at one grid point, stored column by column (one
+    column per signal, one value per stream), so an operation over all
+    streams is a single operation on a column.
+    """
+
+    def __init__(self, timestamp, columns):
+        """
+        Constructor.
+
+        :param float timestamp:
+            Time of the grid point.
+        :param tuple columns:
+            One tuple per signal (see
+            :py:data:`~sensirion_i2c_sen5x.serialization.FIELD_NAMES` for the
+            order) with the raw ticks of each stream. Unavailable values are
+            given as the sentinel of the signal (see
+            :py:data:`~sensirion_i2c_sen5x.filters.SENTINELS`).
+        """
+        super(Sen5xAlignedFrame, self).__init__()
+
+        #: Time of the grid point.
+        self.timestamp = timestamp
+
+        #: Raw ticks as tuple of columns, see constructor.
+        self.columns = columns
+
+    def values(self, stream):
+        """
+        Get the raw ticks of a single stream.
+
+        :param int stream:
+            Index of the stream.
+        :return:
+            The eight raw ticks of the stream.
+        :rtype:
+            tuple(int)
+        """
+        return tuple(column[stream] for column in self.columns)
+
+
+class Sen5xResampler:
+    """
+    Aligns samples of several streams (e.g. one per device) with unaligned,
+    jittering timestamps and gaps onto a common time grid.
+
+    Samples are pushed with :py:meth:`put` and aligned frames are returned as
+    soon as all streams got a sample at or after a grid point, or no sample
+    within ``max_gap`` can arrive anymore. Each stream must be ordered by
+    time, and samples are expected to arrive at most ``max_gap`` late
+    compared to the other streams. Only the samples needed for pending grid
+    points are buffered, so the memory is bounded by the sample rate and
+    ``max_gap``.
+
+    Values further away than ``max_gap`` from the grid point are not used,
+    i.e. the value is unavailable. For :py:data:`LINEAR`, both neighbours
+    must be available.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        resampler = Sen5xResampler(len(devices), interval=1.0)
+        while True:
+            for i, device in enumerate(devices):
+                values = device.read_measured_values()
+                for frame in resampler.put(i, time.time(), values):
+                    pm2p5 = frame.columns[1]  # PM2.5 of all devices
+                    print(frame.timestamp, max(pm2p5))
+
+    For recorded streams, see :py:func:`resample`.
+    """
+
+    def __init__(self, count, interval=1.0, method=LINEAR, max_gap=None,
+                 start=None):
+        """
+        Constructor.
+
+        :param int count:
+            Number of streams.
+        :param float interval:
+            Interval of the grid.
+        :param str method:
+            Interpolation method, one of :py:data:`METHODS`.
+        :param float max_gap:
+            Maximum distance between a grid point and the samples used for
+            it. Defaults to twice the interval.
+        :param float start:
+            First grid point. Defaults to the first multiple of ``interval``
+            at or after the first sample.
+        """
+        super(Sen5xResampler, self).__init__()
+        if method not in METHODS:
+            raise ValueError("Unknown interpolation method: '{}'.".format(
+                method))
+        self._interval = interval
+        self._method = method
+        self._max_gap = 2.0 * interval if max_gap is None else max_gap
+        self._lookahead = 0.0 if method == HOLD else self._max_gap
+        self._start = start
+        self._index = 0
+        self._next = start
+        self._buffers = [deque() for _ in range(count)]
+        self._horizon = None
+
+    def put(self, stream, timestamp, values):
+        """
+        Add a sample.
+
+        :param int stream:
+            Index of the stream.
+        :param float timestamp:
+            Time of the sample.
+        :param values:
+            The raw ticks (tuple of 8 integers) or a
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            object.
+        :return:
+            The frames which got ready (possibly empty).
+        :rtype:
+            list(~sensirion_i2c_sen5x.resampling.Sen5xAlignedFrame)
+        """
+        buffer = self._buffers[stream]
+        if buffer and timestamp < buffer[-1][0]:
+            log.warning("Dropping out-of-order sample of stream {}.".format(
+                stream))
+            return []
+        buffer.append((timestamp, tuple(getattr(values, 'values', values))))
+        if self._horizon is None or timestamp > self._horizon:
+            self._horizon = timestamp
+        if self._start is None:
+            self._start = math.ceil(timestamp / self._interval) * \
+                self._interval
+            self._next = self._start
+        frames = []
+        while self._is_ready(self._next):
+            frames.append(self._emit())
+        return frames
+
+    def flush(self):
+        """
+        Emit all remaining frames up to the latest sample, e.g. at the end of
+        recorded streams.
+
+        :return:
+            The remaining frames.
+        :rtype:
+            list(~sensirion_i2c_sen5x.resampling.Sen5xAlignedFrame)
+        """
+        frames = []
+        while self._horizon is not None and self._next <= self._horizon:
+            frames.append(self._emit())
+        return frames
+
+    def _is_ready(self, grid):
+        if self._horizon < grid:
+            return False
+        if self._horizon > grid + self._lookahead:
+            return True
+        return all(buffer and buffer[-1][0] >= grid
+                   for buffer in self._buffers)
+
+    def _emit(self):
+        grid = self._next
+        self._index += 1
+        self._next = self._start + self._index * self._interval
+        rows = [self._interpolate(buffer, grid) for buffer in self._buffers]
+        return Sen5xAlignedFrame(grid, tuple(zip(*rows)))
+
+    def _interpolate(self, buffer, grid):
+        # Discard samples which are not needed anymore, but keep the last one
+        # at or before the grid point.
+        while len(buffer) > 1 and buffer[1][0] <= grid:
+            buffer.popleft()
+        before = after = None
+        for sample in buffer:
+            if sample[0] <= grid:
+                before = sample
+            else:
+                after = sample
+                break
+        max_gap = self._max_gap
+        if before is not None and grid - before[0] > max_gap:
+            before = None
+        if after is not None and after[0] - grid > max_gap:
+            after = None
+        method = self._method
+        if before is not None and (before[0] == grid or method == HOLD):
+            return before[1]
+        if method == HOLD or before is None and after is None:
+            return SENTINELS
+        if method == NEAREST:
+            if after is None or \
+                    (before is not None and
+                     grid - before[0] <= after[0] - grid):
+                return before[1]
+            return after[1]
+        if before is None or after is None:
+            return SENTINELS
+        weight = (grid - before[0]) / float(after[0] - before[0])
+        return tuple(
+            s if a == s or b == s else int(round(a + (b - a) * weight))
+            for a, b, s in zip(before[1], after[1], SENTINELS))
+
+
+def resample(streams, interval=1.0, method=LINEAR, max_gap=None, start=None,
+             timestamp_scale=1.0):
+    """
+    Align recorded streams onto a common time grid, see
+    :py:class:`Sen5xResampler`. The streams are read lazily in a k-way merge
+    by time, so only a few samples per stream are buffered at any time.
+
+    Example how to use this function:
+
+    .. code-block:: python
+
+        streams = [replay_records([path]) for path in paths]
+        for frame in resample(streams, timestamp_scale=1e-9):
+            print(frame.timestamp, frame.columns[6])  # VOC index of all
+
+    :param list streams:
+        One iterable of tuples ``(timestamp, values)`` per stream, each
+        ordered by time (e.g.
+        :py:func:`~sensirion_i2c_sen5x.replay.replay_records`).
+    :param float interval:
+        Interval of the grid in seconds.
+    :param str method:
+        Interpolation method, one of :py:data:`METHODS`.
+    :param float max_gap:
+        Maximum distance in seconds between a grid point and the samples used
+        for it. Defaults to twice the interval.
+    :param float start:
+        First grid point in seconds.
+    :param float timestamp_scale:
+        Factor to convert the timestamps into seconds.
+    :return:
+        Generator of :py:class:`Sen5xAlignedFrame`, with the timestamps in
+        seconds.
+    """
+    def tag(index, stream):
+        # The sequence number keeps the values out of the comparison.
+        for sequence, (timestamp, values) in enumerate(stream):
+            yield timestamp * timestamp_scale, index, sequence, values
+
+    resampler = Sen5xResampler(len(streams), interval, method, max_gap, start)
+    merged = heapq.merge(*[tag(i, stream) for i, stream in enumerate(streams)])
+    for timestamp, index, _, values in merged:
+        for frame in resampler.put(index, timestamp, values):
+            yield frame
+    for frame in resampler.flush():
+        yield frame
@@ -151,7 +151,14 @@ class Sen5xDeviceStatus:
     received from the device. The convenience attribute :py:attr:`flags`
     allows you to get all set flags as strings. In addition, each flag is
     provided as separate bool attribute.
+
+    Use :py:meth:`from_value` to get shared, read-only instances instead of
+    creating a new object for every received status value.
     """
+
+    #: Maximum number of distinct values cached by :py:meth:`from_value`.
+    CACHE_SIZE = 256
+
     def __init__(self, value):
         """
         Creates an instance from the received raw data.
@@ -185,6 +192,36 @@ class Sen5xDeviceStatus:
         #: Flag (bool) whether the fan speed is currently out of specs.
         self.fan_speed_out_of_specs = self._add(21, 'fan_speed_out_of_specs')
 
+    @classmethod
+    def from_value(cls, value):
+        """
+        Get a shared, read-only instance for the given raw status value.
+
+        Decoded instances are cached by their 32-bit value, so repeatedly
+        receiving the same status does not allocate new objects. The returned
+        object is shared with all other callers and must not be modified
+        (including its :py:attr:`flags` list). Each class (including
+        subclasses) has its own cache.
+
+        :param int value:
+            The raw device status value as received from the device.
+        :return:
+            The decoded device status.
+        :rtype:
+            ~sensirion_i2c_sen5x.response_types.Sen5xDeviceStatus
+        """
+        cache = cls.__dict__.get('_cache')
+        if cache is None:
+            cache = cls._cache = {}
+        try:
+            return cache[value]
+        except KeyError:
+            pass
+        status = cls(value)
+        if len(cache) < cls.CACHE_SIZE:
+            cache[value] = status
+        return status
+
     def _add(self, index, name):
         is_set = (self.value & (1 << index)) != 0
         if is_set:
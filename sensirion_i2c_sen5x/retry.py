@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .clock import get_clock
+from .commands import Sen5xI2cCmdDeviceReset, \
+    Sen5xI2cCmdReadAndClearDeviceStatus, Sen5xI2cCmdStartFanCleaning
+from sensirion_i2c_driver.errors import I2cError
+from collections import deque
+import random
+import threading
+import weakref
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Command classes which must not be replayed after a failure, since the
+#: first attempt might already have had an effect on the device:
+#:
+#: - Device reset: A replay resets the device a second time.
+#: - Start fan cleaning: A replay could restart the cleaning.
+#: - Read and clear device status: The first attempt might already have
+#:   cleared the flags, so a replay would lose them.
+NON_IDEMPOTENT_COMMANDS = (
+    Sen5xI2cCmdDeviceReset,
+    Sen5xI2cCmdStartFanCleaning,
+    Sen5xI2cCmdReadAndClearDeviceStatus,
+)
+
+
+def reset_device(device):
+    """
+    Escalation action for :py:class:`Sen5xRetryPolicy` which performs a
+    device reset (bypassing the retry policy).
+
+    .. note:: All volatile configuration gets lost with a device reset, and
+              the measurement is stopped.
+
+    :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+        The device to reset.
+    """
+    command = Sen5xI2cCmdDeviceReset()
+    try:
+        device.connection.execute(device.slave_address, command,
+                                  wait_post_process=False)
+    finally:
+        get_clock(device).sleep(command.post_processing_time)
+
+
+class _DeviceState:
+    __slots__ = ('consecutive_failures', 'failing_since')
+
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.failing_since = None
+
+
+class Sen5xRetryPolicy:
+    """
+    Retry and recovery policy for transient communication errors, e.g. CRC
+    errors or NACKs on long cables.
+
+    Attach the policy to a device with
+    :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.retry_policy`. Each
+    failed command is retried up to ``max_attempts`` times in total with an
+    exponentially increasing, jittered backoff, unless the command is not
+    idempotent (see :py:data:`NON_IDEMPOTENT_COMMANDS`). If
+    ``escalation_threshold`` commands failed in a row (after all retries),
+    the ``escalation`` action is executed, e.g. a device reset or a reset of
+    the I²C bus.
+
+    The policy also tracks how long it took to recover from failures (time
+    from the first failed attempt until the next successful command), which
+    helps to size application timeouts.
+
+    The same policy can be shared between several devices: consecutive
+    failures and recovery times are tracked per device, while the
+    statistics (:py:attr:`retries`, :py:attr:`failures`,
+    :py:attr:`escalations` and :py:attr:`recovery_times`) are aggregated
+    over all devices.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        device.retry_policy = Sen5xRetryPolicy(
+            max_attempts=3, backoff=0.01, escalation_threshold=10,
+            escalation=reset_device)
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.01, backoff_factor=2.0,
+                 max_backoff=1.0, jitter=0.5, escalation_threshold=None,
+                 escalation=None, idempotency=None, retry_on=(I2cError,),
+                 history_size=100, sleep=None, clock=None,
+                 random=random.random):
+        """
+        Constructor.
+
+        :param int max_attempts:
+            Maximum number of attempts per command (including the first one).
+        :param float backoff:
+            Delay in seconds before the first retry.
+        :param float backoff_factor:
+            Factor to increase the delay for each further retry.
+        :param float max_backoff:
+            Maximum delay in seconds between two attempts.
+        :param float jitter:
+            Fraction (0.0..1.0) by which each delay is randomly reduced, to
+            avoid synchronized retries of many devices.
+        :param int escalation_threshold:
+            Number of consecutively failed commands after which the escalation
+            action is executed. ``None`` disables escalation.
+        :param callable escalation:
+            Escalation action, called with the device as argument (e.g.
+            :py:func:`reset_device`). Errors raised by the action are logged
+            and ignored.
+        :param dict idempotency:
+            Optional per-command rules overriding the defaults, as dict with
+            a command class as key and a bool as value (``True`` if the
+            command may be replayed).
+        :param tuple retry_on:
+            Exception types which are considered as transient.
+        :param int history_size:
+            Maximum number of recovery times kept in :py:attr:`recovery_times`.
+        :param callable sleep:
+            Function to sleep for a given number of seconds. Defaults to the
+            sleep of the device's clock (see
+            :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.clock`).
+        :param callable clock:
+            Function returning a monotonic time in seconds. Defaults to the
+            device's clock.
+        :param callable random:
+            Function returning a random float in the range [0.0, 1.0).
+        """
+        super(Sen5xRetryPolicy, self).__init__()
+        self._max_attempts = max(int(max_attempts), 1)
+        self._backoff = backoff
+        self._backoff_factor = backoff_factor
+        self._max_backoff = max_backoff
+        self._jitter = jitter
+        self._escalation_threshold = escalation_threshold
+        self._escalation = escalation
+        self._idempotency = dict(idempotency or {})
+        self._retry_on = tuple(retry_on)
+        self._sleep = sleep
+        self._clock = clock
+        self._random = random
+        self._lock = threading.Lock()
+        self._states = weakref.WeakKeyDictionary()
+
+        #: Total number of retries (attempts after the first one).
+        self.retries = 0
+
+        #: Total number of commands which failed after all attempts.
+        self.failures = 0
+
+        #: Number of executed escalation actions.
+        self.escalations = 0
+
+        #: Recent recovery times in seconds (oldest first), i.e. the time from
+        #: the first failed attempt until the next successful command.
+        self.recovery_times = deque(maxlen=history_size)
+
+    @property
+    def max_recovery_time(self):
+        """
+        The longest recorded recovery time in seconds, or ``None`` if no
+        recovery happened yet.
+
+        :type: float
+        """
+        return max(self.recovery_times) if self.recovery_times else None
+
+    def is_idempotent(self, command):
+        """
+        Check whether a command may be replayed after a failure.
+
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command.
+        :return:
+            ``True`` if the command may be replayed.
+        :rtype:
+            bool
+        """
+        for command_type in type(command).__mro__:
+            if command_type in self._idempotency:
+                return self._idempotency[command_type]
+        return not isinstance(command, NON_IDEMPOTENT_COMMANDS)
+
+    def delay(self, retry):
+        """
+        Get the (jittered) delay before a retry.
+
+        :param int retry:
+            Number of the retry (1 for the first retry).
+        :return:
+            The delay in seconds.
+        :rtype:
+            float
+        """
+        delay = min(self._backoff * self._backoff_factor ** (retry - 1),
+                    self._max_backoff)
+        return delay * (1.0 - self._jitter * self._random())
+
+    def execute(self, device, function, command, *args):
+        """
+        Execute a command according to this policy. This is called by
+        :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.execute`.
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device executing the command (passed to the escalation
+            action).
+        :param callable function:
+            Function performing a single attempt, called with ``command`` and
+            ``args``.
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to execute.
+        :return:
+            The interpreted response of the command.
+        """
+        attempts = self._max_attempts if self.is_idempotent(command) else 1
+        device_clock = get_clock(device)
+        clock = self._clock or device_clock.monotonic
+        sleep = self._sleep or device_clock.sleep
+        with self._lock:
+            state = self._states.get(device)
+            if state is None:
+                state = self._states[device] = _DeviceState()
+        attempt = 1
+        while True:
+            try:
+                result = function(command, *args)
+            except self._retry_on as e:
+                with self._lock:
+                    if state.failing_since is None:
+                        state.failing_since = clock()
+                if attempt >= attempts:
+                    self._on_failure(device, state)
+                    raise
+                log.debug("Retrying {} after error: {}".format(
+                    type(command).__name__, e))
+                with self._lock:
+                    self.retries += 1
+                sleep(self.delay(attempt))
+                attempt += 1
+            else:
+                self._on_success(state, clock)
+                return result
+
+    def _on_success(self, state, clock):
+        with self._lock:
+            state.consecutive_failures = 0
+            if state.failing_since is not None:
+                self.recovery_times.append(clock() - state.failing_since)
+                state.failing_since = None
+
+    def _on_failure(self, device, state):
+        with self._lock:
+            self.failures += 1
+            state.consecutive_failures += 1
+            escalate = (self._escalation is not None) and \
+                (self._escalation_threshold is not None) and \
+                (state.consecutive_failures >= self._escalation_threshold)
+            if escalate:
+                state.consecutive_failures = 0
+                self.escalations += 1
+        if escalate:
+            log.warning("{} consecutive command failures, escalating.".format(
+                self._escalation_threshold))
+            try:
+                self._escalation(device)
+            except Exception as e:
+                log.warning("Escalation failed: {}".format(e))
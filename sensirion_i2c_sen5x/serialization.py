@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Names of the eight measured signals, in the order as received from the
+#: device. These are the same keys as used when iterating over a
+#: :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`.
+FIELD_NAMES = (
+    'mc_1p0',
+    'mc_2p5',
+    'mc_4p0',
+    'mc_10p0',
+    'ambient_rh',
+    'ambient_t',
+    'voc_index',
+    'nox_index',
+)
+
+# Per signal: (sentinel for "not available", multiplier, decimal digits).
+# The physical value is ``ticks * multiplier / 10 ** digits``, so all
+# conversions can be done with integer arithmetic only. For example the
+# temperature is scaled with factor 200, i.e. ticks * 5 gives m°C.
+_FIXED_POINT = (
+    (0xFFFF, 1, 1),  # PM1.0 [µg/m³], factor 10
+    (0xFFFF, 1, 1),  # PM2.5 [µg/m³], factor 10
+    (0xFFFF, 1, 1),  # PM4.0 [µg/m³], factor 10
+    (0xFFFF, 1, 1),  # PM10.0 [µg/m³], factor 10
+    (0x7FFF, 1, 2),  # RH [%], factor 100
+    (0x7FFF, 5, 3),  # T [°C], factor 200
+    (0x7FFF, 1, 1),  # VOC index, factor 10
+    (0x7FFF, 1, 1),  # NOx index, factor 10
+)
+
+
+def _raw_values(values):
+    """
+    Get the raw ticks tuple of either a
+    :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+    object or a tuple of raw ticks.
+    """
+    return getattr(values, 'values', values)
+
+
+def _format_fixed(ticks, multiplier, digits):
+    """
+    Format a fixed-point integer as decimal string without converting it to
+    float, e.g. ``_format_fixed(-1234, 5, 3)`` returns ``'-6.170'``.
+    """
+    scaled = ticks * multiplier
+    sign = '-' if scaled < 0 else ''
+    integer, fraction = divmod(abs(scaled), 10 ** digits)
+    return '{}{}.{:0{}d}'.format(sign, integer, fraction, digits)
+
+
+def format_fields(values):
+    """
+    Convert raw measured values into decimal strings using fixed-point
+    integer formatting (no float round trip).
+
+    :param values:
+        Either a
+        :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+        object or a tuple of the eight raw ticks as received from the device.
+    :return:
+        The formatted values in the order of :py:data:`FIELD_NAMES`. Values
+        which are not available are returned as ``None``.
+    :rtype:
+        list(str/None)
+    """
+    return [
+        _format_fixed(ticks, multiplier, digits)
+        if ticks != sentinel else None
+        for ticks, (sentinel, multiplier, digits)
+        in zip(_raw_values(values), _FIXED_POINT)
+    ]
+
+
+def csv_header(separator=',', timestamp=True):
+    """
+    Get the CSV header line matching :py:func:`format_csv_row`.
+
+    :param str separator:
+        Column separator.
+    :param bool timestamp:
+        Whether the rows contain a leading timestamp column.
+    :return:
+        The header line, terminated with a newline.
+    :rtype:
+        str
+    """
+    columns = (('timestamp',) if timestamp else ()) + FIELD_NAMES
+    return separator.join(columns) + '\n'
+
+
+def format_csv_row(values, timestamp=None, separator=','):
+    """
+    Format measured values as one CSV row. Values which are not available
+    are written as empty columns.
+
+    :param values:
+        Either a
+        :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+        object or a tuple of the eight raw ticks as received from the device.
+    :param timestamp:
+        Optional timestamp (any type convertible with ``str()``) to be
+        written into the first column. If ``None``, no timestamp column is
+        written.
+    :param str separator:
+        Column separator.
+    :return:
+        The CSV row, terminated with a newline.
+    :rtype:
+        str
+    """
+    columns = [field or '' for field in format_fields(values)]
+    if timestamp is not None:
+        columns.insert(0, str(timestamp))
+    return separator.join(columns) + '\n'
+
+
+def _escape_tag(text):
+    return str(text).replace(',', r'\,').replace('=', r'\=') \
+        .replace(' ', r'\ ')
+
+
+def format_line_protocol(values, measurement='sen5x', tags=None,
+                         timestamp_ns=None):
+    """
+    Format measured values as one InfluxDB line protocol record. Values
+    which are not available are omitted.
+
+    :param values:
+        Either a
+        :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+        object or a tuple of the eight raw ticks as received from the device.
+    :param str measurement:
+        Name of the measurement.
+    :param dict tags:
+        Optional tags (e.g. the serial number of the device).
+    :param int timestamp_ns:
+        Optional timestamp in nanoseconds since epoch. If ``None``, the
+        timestamp is assigned by the server.
+    :return:
+        The line protocol record terminated with a newline, or ``None`` if
+        no value is available at all (the line protocol requires at least
+        one field).
+    :rtype:
+        str/None
+    """
+    fields = ','.join(
+        '{}={}'.format(name, field)
+        for name, field in zip(FIELD_NAMES, format_fields(values))
+        if field is not None
+    )
+    if not fields:
+        return None
+    key = _escape_tag(measurement)
+    if tags:
+        key += ''.join(',{}={}'.format(_escape_tag(k), _escape_tag(v))
+                       for k, v in sorted(tags.items()))
+    if timestamp_ns is None:
+        return '{} {}\n'.format(key, fields)
+    return '{} {} {}\n'.format(key, fields, int(timestamp_ns))
+
+
+class Sen5xBufferedWriter:
+    """
+    Buffered sink for serialized lines (e.g. created with
+    :py:func:`format_csv_row` or :py:func:`format_line_protocol`).
+
+    Lines are collected in memory and written to the underlying stream in
+    one go as soon as either the buffered size or the time since the last
+    flush exceeds the configured limit. This reduces the number of write
+    system calls when logging at high rates.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        with open('log.csv', 'w') as f:
+            with Sen5xBufferedWriter(f, max_bytes=65536, max_interval=5.0) as w:
+                w.write(csv_header())
+                while True:
+                    values = device.read_measured_values()
+                    w.write(format_csv_row(values, timestamp=time.time()))
+    """
+
+    def __init__(self, stream, max_bytes=65536, max_interval=1.0,
+                 clock=time.monotonic):
+        """
+        Constructor.
+
+        :param stream:
+            File-like object with a ``write()`` method. If it also provides a
+            ``flush()`` method, it is called after each buffer flush.
+        :param int max_bytes:
+            Flush as soon as at least this number of bytes (UTF-8 encoded) is
+            buffered.
+        :param float max_interval:
+            Flush on the next write if the last flush was at least this number
+            of seconds ago. ``None`` disables time based flushing.
+        :param callable clock:
+            Function returning a monotonic time in seconds.
+        """
+        super(Sen5xBufferedWriter, self).__init__()
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self._max_interval = max_interval
+        self._clock = clock
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._last_flush = clock()
+
+    @property
+    def buffered_bytes(self):
+        """
+        Number of bytes (UTF-8 encoded) currently buffered (not yet written
+        to the stream).
+
+        :type: int
+        """
+        return self._buffered_bytes
+
+    def write(self, line):
+        """
+        Append a line to the buffer and flush if a limit is exceeded.
+
+        :param str line:
+            The line to write (including its newline). ``None`` is ignored,
+            which allows passing the result of :py:func:`format_line_protocol`
+            directly.
+        """
+        if line is None:
+            return
+        self._buffer.append(line)
+        self._buffered_bytes += len(line.encode('utf-8'))
+        if self._buffered_bytes >= self._max_bytes:
+            self.flush()
+        elif (self._max_interval is not None) and \
+                (self._clock() - self._last_flush >= self._max_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered lines to the stream.
+        """
+        if self._buffer:
+            self._stream.write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered_bytes = 0
+            if hasattr(self._stream, 'flush'):
+                self._stream.flush()
+        self._last_flush = self._clock()
+
+    def close(self):
+        """
+        Flush all buffered lines. The underlying stream is not closed.
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .capabilities import Sen5xCapabilities
+from sensirion_i2c_driver import CrcCalculator
+from sensirion_i2c_driver.transceiver_v1 import I2cTransceiverV1
+from collections import Counter
+from struct import pack, unpack
+import math
+import random
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Fault kind: the CRC byte of one word of the response gets corrupted.
+CRC_ERROR = 'crc_error'
+
+#: Fault kind: the device does not acknowledge the command, i.e. the command
+#: is not executed at all.
+NACK = 'nack'
+
+#: Fault kind: the clock stretching times out while reading the response,
+#: i.e. the command is executed but its response gets lost.
+TIMEOUT = 'timeout'
+
+#: Fault kind: the "data ready" flag stays cleared and "Read Measured Values"
+#: returns the previous values again.
+STUCK_DATA_READY = 'stuck_data_ready'
+
+#: Fault kind: the sticky ``fan_error`` bit of the device status gets set.
+FAN_ERROR = 'fan_error'
+
+#: Fault kind: the sticky ``laser_error`` bit of the device status gets set.
+LASER_ERROR = 'laser_error'
+
+#: Fault kind: the device does not respond anymore after a device reset, for
+#: the fault ``duration`` or until the next
+#: :py:meth:`Sen5xSimulatedTransceiver.power_cycle`.
+SILENT_AFTER_RESET = 'silent_after_reset'
+
+#: All fault kinds.
+FAULT_KINDS = (
+    CRC_ERROR,
+    NACK,
+    TIMEOUT,
+    STUCK_DATA_READY,
+    FAN_ERROR,
+    LASER_ERROR,
+    SILENT_AFTER_RESET,
+)
+
+# Command IDs a fault applies to if none are specified (None = all).
+_DEFAULT_COMMANDS = {
+    CRC_ERROR: None,
+    NACK: None,
+    TIMEOUT: None,
+    STUCK_DATA_READY: (0x0202, 0x03C4),
+    FAN_ERROR: (0x03C4,),
+    LASER_ERROR: (0x03C4,),
+    SILENT_AFTER_RESET: (0xD304,),
+}
+
+# Device status bits.
+_FAN_CLEANING_BIT = 19
+_STATUS_BITS = {
+    FAN_ERROR: 4,
+    LASER_ERROR: 5,
+}
+
+# Duration of a fan cleaning in seconds.
+_FAN_CLEANING_DURATION = 10.0
+
+# Time in seconds after starting the measurement until the NOx index gets
+# available.
+_NOX_STARTUP_TIME = 10.0
+
+# Configuration registers (get/set command ID) with their default payload.
+_DEFAULT_REGISTERS = {
+    0x60B2: pack('>hhH', 0, 0, 0),
+    0x60C6: pack('>H', 0),
+    0x60D0: pack('>6h', 100, 12, 12, 180, 50, 230),
+    0x60E1: pack('>6h', 1, 12, 12, 720, 50, 230),
+    0x60F7: pack('>H', 0),
+    0x6181: bytes(8),
+    0x8004: pack('>I', 604800),
+}
+
+# Registers which can be set only in idle mode (no effect in measure mode).
+_IDLE_ONLY_REGISTERS = (0x60D0, 0x60E1, 0x6181)
+
+# Signal model: PM background in µg/m³, its reversion factor and drift per
+# second.
+_PM_BACKGROUND = 8.0
+_PM_REVERSION = 0.999
+_PM_DRIFT = 0.05
+
+# Signal model: Events of PM, VOC and NOx as (mean interval [s], decay factor
+# per second, minimum amplitude, maximum amplitude).
+_EVENTS = (
+    (1800.0, 0.995, 20.0, 150.0),
+    (3600.0, 0.99, 50.0, 250.0),
+    (7200.0, 0.99, 5.0, 100.0),
+)
+
+_CRC = CrcCalculator(8, 0x31, 0xFF, 0x00)
+_crc_cache = {}
+
+
+def _crc(word):
+    crc = _crc_cache.get(word)
+    if crc is None:
+        crc = _crc_cache[word] = _CRC(word)
+    return crc
+
+
+class Sen5xFault:
+    """
+    Describes a fault to be injected by a
+    :py:class:`Sen5xSimulatedTransceiver`.
+
+    A fault is active while the simulated time is within ``start`` and
+    ``stop``, and gets injected with the given ``probability`` whenever one of
+    the ``commands`` is executed, up to ``count`` times.
+    """
+
+    def __init__(self, kind, commands=None, probability=1.0, start=0.0,
+                 stop=None, count=None, duration=None):
+        """
+        Constructor.
+
+        :param str kind:
+            The kind of fault, one of :py:data:`FAULT_KINDS`.
+        :param commands:
+            Command IDs (e.g. ``[0x03C4]``) which trigger the fault. Defaults
+            to the commands which make sense for the kind of fault (all
+            commands for :py:data:`CRC_ERROR`, :py:data:`NACK` and
+            :py:data:`TIMEOUT`).
+        :param float probability:
+            Probability (0.0..1.0) of injecting the fault per triggering
+            command.
+        :param float start:
+            Simulated time in seconds (since creating or power cycling the
+            simulator) when the fault gets active.
+        :param float stop:
+            Simulated time in seconds when the fault gets inactive, or
+            ``None`` for no limit.
+        :param int count:
+            Maximum number of injections, or ``None`` for no limit.
+        :param float duration:
+            Only for :py:data:`SILENT_AFTER_RESET`: Time in seconds the device
+            stays silent, or ``None`` until the next power cycle.
+        """
+        super(Sen5xFault, self).__init__()
+        if kind not in FAULT_KINDS:
+            raise ValueError("Unknown fault kind: '{}'.".format(kind))
+        self.kind = kind
+        if commands is None:
+            commands = _DEFAULT_COMMANDS[kind]
+        self.commands = frozenset(commands) if commands is not None else None
+        self.probability = probability
+        self.start = start
+        self.stop = stop
+        self.count = count
+        self.duration = duration
+
+        #: Number of injections so far.
+        self.injected = 0
+
+    def is_active(self, command, elapsed):
+        """
+        Check whether the fault may be injected for a command (not
+        considering the probability).
+
+        :param int command:
+            The command ID.
+        :param float elapsed:
+            The simulated time in seconds.
+        :return:
+            Whether the fault is active for the given command and time.
+        :rtype:
+            bool
+        """
+        return (self.commands is None or command in self.commands) and \
+            elapsed >= self.start and \
+            (self.stop is None or elapsed < self.stop) and \
+            (self.count is None or self.injected < self.count)
+
+
+class _SignalModel:
+    """
+    Generates plausible signals: daily temperature and humidity cycles, a
+    slowly drifting PM background with sporadic pollution events, and
+    VOC/NOx events decaying back to their baseline. The model state is
+    advanced in closed form, so the costs do not depend on the time elapsed
+    since the previous sample.
+    """
+
+    def __init__(self, random):
+        self._random = random
+        self._t = 0
+        self._pm_background = _PM_BACKGROUND
+        self._levels = [0.0] * len(_EVENTS)
+        self._next_events = [random.expovariate(1.0 / e[0]) for e in _EVENTS]
+
+        #: The current values (PM1.0, PM2.5, PM4.0, PM10.0 [µg/m³], RH [%],
+        #: T [°C], VOC index, NOx index).
+        self.values = None
+
+    def advance(self, t):
+        """
+        Advance the model to the sample at time ``t`` (integer seconds).
+        """
+        r = self._random
+        n = t - self._t
+        self._t = t
+        if n > 0:
+            # Mean-reverting random walk (AR(1) process) over n steps.
+            a = _PM_REVERSION ** n
+            sigma = _PM_DRIFT * math.sqrt((1.0 - a * a) /
+                                          (1.0 - _PM_REVERSION ** 2))
+            self._pm_background = _PM_BACKGROUND + a * (
+                self._pm_background - _PM_BACKGROUND) + r.gauss(0.0, sigma)
+            self._pm_background = min(max(self._pm_background, 1.0), 50.0)
+            for i, (interval, decay, low, high) in enumerate(_EVENTS):
+                level = self._levels[i] * decay ** n
+                while self._next_events[i] <= t:
+                    level += r.uniform(low, high) * \
+                        decay ** (t - self._next_events[i])
+                    self._next_events[i] += r.expovariate(1.0 / interval)
+                self._levels[i] = level
+        pm_event, voc_event, nox_event = self._levels
+        pm = max(self._pm_background + pm_event + r.gauss(0.0, 0.3), 0.0)
+        phase = math.sin(2.0 * math.pi * t / 86400.0)
+        self.values = (
+            pm * 0.85, pm, pm * 1.08, pm * 1.15,
+            min(max(45.0 - 8.0 * phase + r.gauss(0.0, 0.1), 0.0), 100.0),
+            22.0 + 2.5 * phase + r.gauss(0.0, 0.02),
+            min(max(100.0 + voc_event + r.gauss(0.0, 1.0), 1.0), 500.0),
+            min(1.0 + nox_event, 500.0),
+        )
+
+
+class Sen5xSimulatedTransceiver(I2cTransceiverV1):
+    """
+    I²C transceiver simulating a SEN5x device, including the measure modes,
+    the data ready flag, the device status, fan cleaning and the
+    configuration registers. Measured values are generated by a seeded signal
+    model, so a simulation is reproducible. The signal model is advanced in
+    closed form to the time of each sample, so sparse sampling over long
+    simulated periods is as cheap as sampling every second.
+
+    Faults (see :py:class:`Sen5xFault`) can be injected per command ID with
+    probabilities and schedules, to test retry and alerting without hardware.
+    All timing is based on ``clock``, so a deterministic soak test can run in
+    accelerated time with a
+    :py:class:`~sensirion_i2c_sen5x.clock.Sen5xVirtualClock`.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        clock = Sen5xVirtualClock()
+        transceiver = Sen5xSimulatedTransceiver('SEN55', seed=42, faults=[
+            Sen5xFault(NACK, probability=0.01),
+            Sen5xFault(CRC_ERROR, commands=[0x03C4], start=60.0, stop=120.0),
+            Sen5xFault(FAN_ERROR, start=3600.0, count=1),
+        ], clock=clock.monotonic, sleep=clock.sleep)
+        device = Sen5xI2cDevice(I2cConnection(transceiver), clock=clock)
+        device.start_measurement()
+    """
+
+    def __init__(self, product_name='SEN55', serial_number='SIM0000000000001',
+                 firmware=(2, 2), slave_address=0x69, faults=(), seed=0,
+                 clock=time.monotonic, sleep=None):
+        """
+        Constructor.
+
+        :param str product_name:
+            Simulated product, "SEN50", "SEN54" or "SEN55".
+        :param str serial_number:
+            Simulated serial number.
+        :param tuple firmware:
+            Simulated firmware version (major, minor).
+        :param int slave_address:
+            I²C address of the simulated device.
+        :param list faults:
+            Faults to inject (list of :py:class:`Sen5xFault`).
+        :param int seed:
+            Seed of the signal model and the fault probabilities.
+        :param callable clock:
+            Function returning a monotonic time in seconds.
+        :param callable sleep:
+            Function to sleep for a given number of seconds, used to await
+            the read delay of commands like a real transceiver. If ``None``,
+            responses are returned immediately.
+        """
+        super(Sen5xSimulatedTransceiver, self).__init__()
+        self.product_name = product_name
+        self.serial_number = serial_number
+        self.firmware = tuple(firmware)
+        self.slave_address = slave_address
+
+        #: The faults to inject (list of :py:class:`Sen5xFault`), may be
+        #: modified at any time.
+        self.faults = list(faults)
+
+        #: Number of injected faults per kind.
+        self.injected = Counter()
+
+        self._seed = seed
+        self._clock = clock
+        self._sleep = sleep
+        self._fault_random = random.Random(2 * seed + 1)
+        self._registers = dict(_DEFAULT_REGISTERS)
+        self.power_cycle()
+
+    @property
+    def description(self):
+        return "Simulated {} ({})".format(self.product_name,
+                                          self.serial_number)
+
+    @property
+    def elapsed(self):
+        """
+        Simulated time in seconds since creating or power cycling the
+        simulator.
+
+        :type: float
+        """
+        return self._clock() - self._t0
+
+    @property
+    def measure_mode(self):
+        """
+        The current measure mode: ``None`` (idle), ``'pm'`` or
+        ``'without_pm'``.
+
+        :type: str
+        """
+        return self._mode
+
+    def power_cycle(self):
+        """
+        Simulate a power cycle: the device is reset and responsive again, the
+        simulated time restarts at zero and the fault injection counters
+        restart.
+        """
+        self._t0 = self._clock()
+        self._silent_until = None
+        for fault in self.faults:
+            fault.injected = 0
+        self._reset()
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        if slave_address != self.slave_address or not tx_data or \
+                len(tx_data) < 2:
+            return self.STATUS_NACK, None, b''
+        now = self._clock()
+        elapsed = now - self._t0
+        if self._silent_until is not None:
+            if elapsed < self._silent_until:
+                return self.STATUS_NACK, None, b''
+            self._silent_until = None
+        command = (tx_data[0] << 8) | tx_data[1]
+        faults = dict((f.kind, f)
+                      for f in self._draw_faults(command, elapsed))
+        if NACK in faults:
+            return self.STATUS_NACK, None, b''
+        if self._sleep is not None and rx_length is not None and \
+                read_delay > 0.0:
+            self._sleep(read_delay)
+            now = self._clock()
+        data = b''
+        for i in range(2, len(tx_data), 3):
+            word = tx_data[i:i + 2]
+            if len(word) != 2 or tx_data[i + 2:i + 3] != bytes([_crc(word)]):
+                return self.STATUS_NACK, None, b''
+            data += word
+        self._update(now)
+        for kind in (FAN_ERROR, LASER_ERROR):
+            if kind in faults:
+                self._status |= 1 << _STATUS_BITS[kind]
+        payload = self._execute(command, data, rx_length, now,
+                                STUCK_DATA_READY in faults)
+        if payload is None:
+            return self.STATUS_NACK, None, b''
+        if SILENT_AFTER_RESET in faults and command == 0xD304:
+            duration = faults[SILENT_AFTER_RESET].duration
+            self._silent_until = float('inf') if duration is None \
+                else elapsed + duration
+        if TIMEOUT in faults:
+            return self.STATUS_TIMEOUT, None, b''
+        rx_data = bytearray()
+        if rx_length:
+            for i in range(0, len(payload), 2):
+                word = payload[i:i + 2]
+                rx_data += word + bytes([_crc(word)])
+            rx_data = rx_data[:rx_length]
+            if CRC_ERROR in faults and len(rx_data) >= 3:
+                word = self._fault_random.randrange(len(rx_data) // 3)
+                rx_data[3 * word + 2] ^= 0xFF
+        return self.STATUS_OK, None, bytes(rx_data)
+
+    def _draw_faults(self, command, elapsed):
+        for fault in self.faults:
+            if fault.is_active(command, elapsed) and \
+                    (fault.probability >= 1.0 or
+                     self._fault_random.random() < fault.probability):
+                fault.injected += 1
+                self.injected[fault.kind] += 1
+                log.debug("Injecting {} into command 0x{:04X}.".format(
+                    fault.kind, command))
+                yield fault
+
+    def _reset(self):
+        self._mode = None
+        self._measure_start = None
+        self._read_sample = 0
+        self._status = 0
+        self._cleaning_until = None
+        self._next_auto_cleaning = None
+        interval = self._registers[0x8004]
+        self._registers = dict(_DEFAULT_REGISTERS)
+        self._registers[0x8004] = interval  # stored non-volatile
+        self._model = _SignalModel(random.Random(2 * self._seed))
+        self._model_sample = None
+        self._frame = None
+
+    def _start(self, mode, now):
+        if self._mode is None:
+            self._measure_start = now
+            self._read_sample = 0
+            self._model_sample = None
+        else:
+            self._read_sample = self._sample(now)  # clear data ready
+        if mode != 'pm':
+            self._cleaning_until = None  # fan stopped
+        self._mode = mode
+        interval = unpack('>I', self._registers[0x8004])[0]
+        if mode == 'pm' and interval and self._next_auto_cleaning is None:
+            self._next_auto_cleaning = now + interval
+
+    def _stop(self):
+        self._mode = None
+        self._cleaning_until = None
+        self._next_auto_cleaning = None
+        self._status &= ~(1 << _FAN_CLEANING_BIT)
+
+    def _sample(self, now):
+        return int(now - self._measure_start)
+
+    def _update(self, now):
+        if self._next_auto_cleaning is not None and self._mode == 'pm' and \
+                now >= self._next_auto_cleaning:
+            self._cleaning_until = self._next_auto_cleaning + \
+                _FAN_CLEANING_DURATION
+            interval = unpack('>I', self._registers[0x8004])[0]
+            self._next_auto_cleaning = self._next_auto_cleaning + interval \
+                if interval else None
+        if self._cleaning_until is not None and now >= self._cleaning_until:
+            self._cleaning_until = None
+        if self._cleaning_until is not None:
+            self._status |= 1 << _FAN_CLEANING_BIT
+        else:
+            self._status &= ~(1 << _FAN_CLEANING_BIT)
+
+    def _measured_values(self, now):
+        sample = self._sample(now)
+        if sample != self._model_sample:
+            self._model_sample = sample
+            self._model.advance(int(self._measure_start - self._t0) + sample)
+        pm1, pm25, pm4, pm10, rh, t, voc, nox = self._model.values
+        offset, slope, _ = unpack('>hhH', self._registers[0x60B2])
+        t += offset / 200.0 + slope / 10000.0 * t
+        ticks = [int(round(pm1 * 10)), int(round(pm25 * 10)),
+                 int(round(pm4 * 10)), int(round(pm10 * 10)),
+                 int(round(rh * 100)), int(round(t * 200)),
+                 int(round(voc * 10)), int(round(nox * 10))]
+        if self._mode != 'pm':
+            ticks[0:4] = [0xFFFF] * 4
+        if self.product_name == 'SEN50':
+            ticks[4:8] = [0x7FFF] * 4
+        if self.product_name != 'SEN55' or \
+                now - self._measure_start < _NOX_STARTUP_TIME:
+            ticks[7] = 0x7FFF
+        return pack('>4H4h', *ticks)
+
+    def _supports(self, feature):
+        return Sen5xCapabilities(self.product_name,
+                                 self.firmware).supports(feature)
+
+    def _execute(self, command, data, rx_length, now, stuck):
+        """
+        Execute a command and return the response payload (empty for write
+        commands), or ``None`` to NACK the command.
+        """
+        if command == 0x0021:
+            if self._mode is None or (self._mode == 'without_pm' and
+                                      self._supports('mode_switching')):
+                self._start('pm', now)
+        elif command == 0x0037:
+            if not self._supports('measurement_without_pm'):
+                return None
+            if self._mode is None or (self._mode == 'pm' and
+                                      self._supports('mode_switching')):
+                self._start('without_pm', now)
+        elif command == 0x0104:
+            self._stop()
+        elif command == 0x0202:
+            ready = self._mode is not None and not stuck and \
+                self._sample(now) > self._read_sample
+            return pack('>H', int(ready))
+        elif command == 0x03C4:
+            if self._mode is None:
+                return pack('>4H4h', *([0xFFFF] * 4 + [0x7FFF] * 4))
+            if not stuck or self._frame is None:
+                self._read_sample = self._sample(now)
+                self._frame = self._measured_values(now)
+            return self._frame
+        elif command == 0x5607:
+            if self._mode == 'pm':
+                self._cleaning_until = now + _FAN_CLEANING_DURATION
+                self._update(now)
+        elif command in self._registers:
+            if not data:
+                return self._registers[command]
+            if len(data) != len(self._registers[command]):
+                return None
+            if command not in _IDLE_ONLY_REGISTERS or self._mode is None:
+                self._registers[command] = data
+        elif command == 0xD014:
+            return self.product_name.encode('ascii').ljust(32, b'\x00')
+        elif command == 0xD033:
+            return self.serial_number.encode('ascii').ljust(32, b'\x00')
+        elif command == 0xD100:
+            return bytes([self.firmware[0], self.firmware[1], 0, 4, 0, 1, 0,
+                          0])
+        elif command in (0xD206, 0xD210):
+            status = self._status
+            if command == 0xD210:
+                self._status &= 1 << _FAN_CLEANING_BIT
+            return pack('>I', status)
+        elif command == 0xD304:
+            self._reset()
+        else:
+            return None
+        return b''
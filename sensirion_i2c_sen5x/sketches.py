@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .filters import SENTINELS
+from .serialization import FIELD_NAMES
+import bisect
+import math
+import random
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Indices of the signals sketched by default (PM2.5, VOC index, NOx index).
+DEFAULT_SIGNALS = (1, 6, 7)
+
+# Capacity decay factor per level of the KLL compactors.
+_DECAY = 2.0 / 3.0
+
+
+class Sen5xQuantileSketch:
+    """
+    KLL quantile sketch: estimates quantiles (e.g. p50, p95, p99) of a stream
+    of values with bounded memory (about ``3 * k`` values, independent of the
+    stream length). The rank error is about ``1.7 / k``, e.g. ±1% for the
+    default ``k=200``.
+
+    Sketches are mergeable: merging the sketches of several streams gives the
+    same accuracy as sketching the combined stream, so per-device sketches can
+    be merged into site-level or fleet-level sketches.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        sketch = Sen5xQuantileSketch()
+        for timestamp, ticks in samples:
+            sketch.update(ticks[1])
+        p50, p95, p99 = sketch.quantiles([0.5, 0.95, 0.99])
+    """
+
+    def __init__(self, k=200, seed=None):
+        """
+        Constructor.
+
+        :param int k:
+            Accuracy parameter (capacity of the top level).
+        :param seed:
+            Seed of the random compactions, for reproducible results.
+        """
+        super(Sen5xQuantileSketch, self).__init__()
+        if k < 8:
+            raise ValueError("Invalid accuracy parameter: {}.".format(k))
+        self._k = k
+        self._random = random.Random(seed)
+        self._levels = [[]]
+        self._size = 0
+        self._max_size = self._capacity(0)
+        self._sorted = None
+
+        #: Number of values added to the sketch (including merged sketches).
+        self.count = 0
+
+        #: Smallest value seen, or ``None`` if empty.
+        self.min = None
+
+        #: Largest value seen, or ``None`` if empty.
+        self.max = None
+
+    @property
+    def k(self):
+        """
+        The accuracy parameter.
+
+        :type: int
+        """
+        return self._k
+
+    def __len__(self):
+        """
+        Number of values currently retained.
+        """
+        return self._size
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(int(math.ceil(self._k * _DECAY ** depth)), 2)
+
+    def _grow(self):
+        self._levels.append([])
+        self._max_size = sum(self._capacity(h)
+                             for h in range(len(self._levels)))
+
+    def _compress(self):
+        for h in range(len(self._levels)):
+            level = self._levels[h]
+            if len(level) < self._capacity(h):
+                continue
+            if h + 1 == len(self._levels):
+                self._grow()
+            level.sort()
+            odd = len(level) % 2
+            # Promote every other value (with a random offset) to the next
+            # level with twice the weight, keep the smallest one if odd.
+            self._levels[h + 1].extend(
+                level[odd + self._random.randrange(2)::2])
+            del level[odd:]
+            self._size = sum(len(items) for items in self._levels)
+            if self._size < self._max_size:
+                break
+
+    def update(self, value):
+        """
+        Add a value.
+
+        :param value:
+            The value, e.g. raw ticks.
+        """
+        self._levels[0].append(value)
+        self._size += 1
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self._sorted = None
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+
+        :param ~sensirion_i2c_sen5x.sketches.Sen5xQuantileSketch other:
+            The sketch to merge (not modified).
+        :return:
+            This sketch.
+        :rtype:
+            ~sensirion_i2c_sen5x.sketches.Sen5xQuantileSketch
+        """
+        if other.count == 0:
+            return self
+        while len(self._levels) < len(other._levels):
+            self._grow()
+        for h, items in enumerate(other._levels):
+            self._levels[h].extend(items)
+        self._size = sum(len(items) for items in self._levels)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._sorted = None
+        while self._size >= self._max_size:
+            self._compress()
+        return self
+
+    def _cumulative(self):
+        if self._sorted is None:
+            weighted = sorted((value, 1 << h)
+                              for h, items in enumerate(self._levels)
+                              for value in items)
+            values = []
+            weights = []
+            total = 0
+            for value, weight in weighted:
+                total += weight
+                values.append(value)
+                weights.append(total)
+            self._sorted = (values, weights)
+        return self._sorted
+
+    def rank(self, value):
+        """
+        Estimate the normalized rank of a value, i.e. the fraction of values
+        less than or equal to it.
+
+        :param value:
+            The value.
+        :return:
+            The rank (0.0..1.0), or ``None`` if the sketch is empty.
+        :rtype:
+            float
+        """
+        if self.count == 0:
+            return None
+        values, weights = self._cumulative()
+        index = bisect.bisect_right(values, value)
+        return weights[index - 1] / float(weights[-1]) if index else 0.0
+
+    def quantile(self, q):
+        """
+        Estimate a quantile.
+
+        :param float q:
+            The quantile (0.0..1.0), e.g. 0.95 for the 95th percentile.
+        :return:
+            A value of the stream, or ``None`` if the sketch is empty.
+        """
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """
+        Estimate several quantiles at once.
+
+        :param list qs:
+            The quantiles (0.0..1.0).
+        :return:
+            The estimated values (``None`` if the sketch is empty).
+        :rtype:
+            list
+        """
+        for q in qs:
+            if not 0.0 <= q <= 1.0:
+                raise ValueError("Invalid quantile: {}.".format(q))
+        if self.count == 0:
+            return [None] * len(qs)
+        values, weights = self._cumulative()
+        total = weights[-1]
+        result = []
+        for q in qs:
+            if q == 0.0:
+                result.append(self.min)
+            elif q == 1.0:
+                result.append(self.max)
+            else:
+                index = bisect.bisect_left(weights, q * total)
+                result.append(values[min(index, len(values) - 1)])
+        return result
+
+    def to_dict(self):
+        """
+        Convert to a JSON serializable dict.
+
+        :return:
+            The sketch as dict.
+        :rtype:
+            dict
+        """
+        return {
+            'k': self._k,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'levels': [list(items) for items in self._levels],
+        }
+
+    @classmethod
+    def from_dict(cls, data, seed=None):
+        """
+        Create from a dict created by :py:meth:`to_dict`.
+
+        :param dict data:
+            The sketch as dict.
+        :param seed:
+            Seed of the random compactions.
+        :return:
+            The sketch.
+        :rtype:
+            ~sensirion_i2c_sen5x.sketches.Sen5xQuantileSketch
+        """
+        sketch = cls(data['k'], seed)
+        while len(sketch._levels) < len(data['levels']):
+            sketch._grow()
+        sketch._levels = [list(items) for items in data['levels']]
+        sketch._size = sum(len(items) for items in sketch._levels)
+        sketch.count = data['count']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
+
+
+class Sen5xSketchStage:
+    """
+    Maintains a :py:class:`Sen5xQuantileSketch` per signal, fed from measured
+    values. Unavailable values are skipped. The sketched values are raw
+    ticks, i.e. divide them by 10 to get µg/m³ or index points.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        stage = Sen5xSketchStage()
+        while True:
+            stage.update(device.read_measured_values())
+            ...
+
+        # Monthly report over all devices of a site:
+        site = Sen5xSketchStage()
+        for data in stored_stages:
+            site.merge(Sen5xSketchStage.from_dict(data))
+        print(site.quantiles([0.5, 0.95, 0.99]))
+    """
+
+    def __init__(self, signals=DEFAULT_SIGNALS, k=200, seed=None):
+        """
+        Constructor.
+
+        :param tuple signals:
+            Indices of the signals to sketch (see
+            :py:data:`~sensirion_i2c_sen5x.serialization.FIELD_NAMES` for the
+            order).
+        :param int k:
+            Accuracy parameter of the sketches.
+        :param seed:
+            Seed of the random compactions.
+        """
+        super(Sen5xSketchStage, self).__init__()
+
+        #: The sketches as dict with the signal index as key.
+        self.sketches = dict((i, Sen5xQuantileSketch(k, seed))
+                             for i in signals)
+
+    def update(self, values):
+        """
+        Add a sample.
+
+        :param values:
+            The raw ticks (tuple of 8 integers) or a
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            object.
+        """
+        ticks = getattr(values, 'values', values)
+        for i, sketch in self.sketches.items():
+            if ticks[i] != SENTINELS[i]:
+                sketch.update(ticks[i])
+
+    def merge(self, other):
+        """
+        Merge the sketches of another stage into this one. Signals not
+        sketched by this stage are added.
+
+        :param ~sensirion_i2c_sen5x.sketches.Sen5xSketchStage other:
+            The stage to merge (not modified).
+        :return:
+            This stage.
+        :rtype:
+            ~sensirion_i2c_sen5x.sketches.Sen5xSketchStage
+        """
+        for i, sketch in other.sketches.items():
+            if i not in self.sketches:
+                self.sketches[i] = Sen5xQuantileSketch(sketch.k)
+            self.sketches[i].merge(sketch)
+        return self
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)):
+        """
+        Estimate quantiles of all sketched signals.
+
+        :param list qs:
+            The quantiles (0.0..1.0).
+        :return:
+            The estimated raw ticks as dict with the signal name as key.
+        :rtype:
+            dict
+        """
+        return dict((FIELD_NAMES[i], sketch.quantiles(qs))
+                    for i, sketch in self.sketches.items())
+
+    def to_dict(self):
+        """
+        Convert to a JSON serializable dict, with the signal names as keys.
+
+        :return:
+            The sketches as dict.
+        :rtype:
+            dict
+        """
+        return dict((FIELD_NAMES[i], sketch.to_dict())
+                    for i, sketch in self.sketches.items())
+
+    @classmethod
+    def from_dict(cls, data, seed=None):
+        """
+        Create from a dict created by :py:meth:`to_dict`.
+
+        :param dict data:
+            The sketches as dict.
+        :param seed:
+            Seed of the random compactions.
+        :return:
+            The stage.
+        :rtype:
+            ~sensirion_i2c_sen5x.sketches.Sen5xSketchStage
+        """
+        stage = cls(signals=())
+        for name, sketch in data.items():
+            stage.sketches[FIELD_NAMES.index(name)] = \
+                Sen5xQuantileSketch.from_dict(sketch, seed)
+        return stage
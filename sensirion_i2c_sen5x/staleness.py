@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .clock import SYSTEM_CLOCK, get_clock
+from struct import Struct
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: The sample contains new data.
+FRESH = 'fresh'
+
+#: The sample repeats the previous data and was read before the device could
+#: have produced new data (i.e. polled faster than the measurement interval).
+DUPLICATE = 'duplicate'
+
+#: The sample repeats the previous data although the device should have
+#: produced new data, e.g. during fan cleaning.
+STALE = 'stale'
+
+# Payload of the "Read Measured Values" response without CRCs: 4x uint16
+# mass concentrations followed by 4x int16 (RH, T, VOC, NOx).
+_PAYLOAD = Struct('>4H4h')
+
+
+def fingerprint(data):
+    """
+    Get the fingerprint of a "Read Measured Values" response, i.e. its raw
+    16-byte payload without CRCs.
+
+    :param data:
+        Either the raw ticks (tuple of 8 integers, or a
+        :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+        object), or the raw 24-byte response frame including CRCs.
+    :return:
+        The 16-byte fingerprint.
+    :rtype:
+        bytes
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(b for i, b in enumerate(data) if i % 3 != 2)
+    return _PAYLOAD.pack(*getattr(data, 'values', data))
+
+
+class Sen5xStalenessDetector:
+    """
+    Detects repeated (stale) samples of the "Read Measured Values" command.
+
+    If no new data is ready, the device returns the previous values again,
+    e.g. during fan cleaning. The detector compares the fingerprint of each
+    sample with the one of the previous sample, which takes constant time per
+    sample. A repeated sample is classified with the data ready flag (if
+    known) and the time elapsed since the last fresh sample:
+
+    - :py:data:`FRESH`: The payload changed, or the data ready flag was set
+      when reading it.
+    - :py:data:`DUPLICATE`: The payload is repeated within ``interval``
+      seconds since the last fresh sample.
+    - :py:data:`STALE`: The payload is repeated although ``interval`` seconds
+      have passed, i.e. the device did not update its values.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        # Streaming:
+        detector = Sen5xStalenessDetector()
+        while True:
+            values, state = detector.read(device)
+            if state == FRESH:
+                store(values)
+            time.sleep(1.0)
+
+        # Replayed archives:
+        records = replay_records(paths)
+        for timestamp_ns, ticks in detector.filter_replay(records):
+            store(ticks)
+    """
+
+    def __init__(self, interval=1.0, clock=None):
+        """
+        Constructor.
+
+        :param float interval:
+            Measurement interval of the device in seconds.
+        :param callable clock:
+            Function returning a monotonic time in seconds, used if no
+            timestamp is passed to :py:meth:`classify`. Defaults to the
+            device's clock in :py:meth:`read` (see
+            :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.clock`),
+            and to :py:data:`~sensirion_i2c_sen5x.clock.SYSTEM_CLOCK`
+            otherwise.
+        """
+        super(Sen5xStalenessDetector, self).__init__()
+        self._interval = interval
+        self._clock = clock
+        self._fingerprint = None
+        self._fresh_time = None
+        self._stale_duration = 0.0
+
+        #: Number of consecutive non-fresh samples.
+        self.repeats = 0
+
+        #: Number of samples per state, as dict.
+        self.counts = {FRESH: 0, DUPLICATE: 0, STALE: 0}
+
+    @property
+    def stale_duration(self):
+        """
+        Time in seconds since the last fresh sample, measured at the last
+        classified sample (0.0 if the last sample was fresh).
+
+        :type: float
+        """
+        return self._stale_duration if self.repeats else 0.0
+
+    def reset(self):
+        """
+        Forget the previous sample, e.g. after restarting the measurement.
+        """
+        self._fingerprint = None
+        self._fresh_time = None
+        self.repeats = 0
+
+    def classify(self, data, timestamp=None, data_ready=None):
+        """
+        Classify a sample.
+
+        :param data:
+            The sample, see :py:func:`fingerprint`.
+        :param float timestamp:
+            Time of the sample in seconds. Defaults to the current time of
+            the clock.
+        :param bool data_ready:
+            The data ready flag read right before the sample, or ``None`` if
+            unknown.
+        :return:
+            :py:data:`FRESH`, :py:data:`DUPLICATE` or :py:data:`STALE`.
+        :rtype:
+            str
+        """
+        if timestamp is None:
+            timestamp = (self._clock or SYSTEM_CLOCK.monotonic)()
+        current = fingerprint(data)
+        if data_ready or (data_ready is None and
+                          current != self._fingerprint):
+            state = FRESH
+        else:
+            elapsed = timestamp - self._fresh_time \
+                if self._fresh_time is not None else 0.0
+            state = DUPLICATE if elapsed < self._interval else STALE
+        self._fingerprint = current
+        if state == FRESH:
+            self._fresh_time = timestamp
+            self.repeats = 0
+        else:
+            self._stale_duration = timestamp - self._fresh_time \
+                if self._fresh_time is not None else 0.0
+            self.repeats += 1
+        self.counts[state] += 1
+        return state
+
+    def read(self, device):
+        """
+        Read the data ready flag and the measured values from a device and
+        classify them.
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device to read from.
+        :return:
+            Tuple of the read
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            and its state.
+        :rtype:
+            tuple
+        """
+        data_ready = device.read_data_ready()
+        values = device.read_measured_values()
+        timestamp = (self._clock or get_clock(device).monotonic)()
+        return values, self.classify(values, timestamp, data_ready)
+
+    def filter(self, samples, drop=True, timestamp_scale=1.0):
+        """
+        Classify a sequence of samples.
+
+        :param iterable samples:
+            Iterable of tuples ``(timestamp, data)``.
+        :param bool drop:
+            If ``True``, only fresh samples are yielded as ``(timestamp,
+            data)``. Otherwise all samples are yielded as ``(timestamp, data,
+            state)``.
+        :param float timestamp_scale:
+            Factor to convert the timestamps into seconds.
+        :return:
+            Generator as described above.
+        """
+        for timestamp, data in samples:
+            state = self.classify(data, timestamp * timestamp_scale)
+            if not drop:
+                yield timestamp, data, state
+            elif state == FRESH:
+                yield timestamp, data
+
+    def filter_replay(self, records, drop=True):
+        """
+        Classify all valid records of replayed archives, see
+        :py:func:`~sensirion_i2c_sen5x.replay.replay_records`.
+
+        :param records:
+            The replayed records, i.e. an iterable of tuples
+            ``(timestamp_ns, ticks)`` like
+            :py:func:`~sensirion_i2c_sen5x.replay.replay_records` or a
+            :py:class:`~sensirion_i2c_sen5x.replay.Sen5xReplayResult`.
+        :param bool drop:
+            See :py:meth:`filter`.
+        :return:
+            Generator as described in :py:meth:`filter`, with the timestamps
+            in nanoseconds.
+        """
+        return self.filter(iter(records), drop=drop, timestamp_scale=1e-9)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from .clock import get_clock
+from collections import deque
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Names of all device status flags (attributes of
+#: :py:class:`~sensirion_i2c_sen5x.response_types.Sen5xDeviceStatus`).
+STATUS_FLAGS = (
+    'fan_error',
+    'laser_error',
+    'sht_error',
+    'sgp_error',
+    'fan_cleaning',
+    'fan_speed_out_of_specs',
+)
+
+#: Names of the sticky status flags, i.e. flags which are not cleared
+#: automatically by the device when the error condition disappears.
+STICKY_FLAGS = (
+    'fan_error',
+    'laser_error',
+    'sht_error',
+    'sgp_error',
+)
+
+# Raw ticks of a measurement where no signal is available.
+_NOT_AVAILABLE = (0xFFFF, 0xFFFF, 0xFFFF, 0xFFFF,
+                  0x7FFF, 0x7FFF, 0x7FFF, 0x7FFF)
+
+
+class Sen5xStatusEvent:
+    """
+    Represents a transition of a single device status flag.
+    """
+
+    def __init__(self, timestamp, flag, active, status):
+        """
+        Constructor.
+
+        :param float timestamp:
+            Time (as returned by the monitor's clock) when the transition was
+            detected.
+        :param str flag:
+            Name of the flag, see :py:data:`STATUS_FLAGS`.
+        :param bool active:
+            ``True`` if the flag got set, ``False`` if it got cleared.
+        :param ~sensirion_i2c_sen5x.response_types.Sen5xDeviceStatus status:
+            The device status which revealed the transition.
+        """
+        super(Sen5xStatusEvent, self).__init__()
+        self.timestamp = timestamp
+        self.flag = flag
+        self.active = active
+        self.status = status
+
+    def __str__(self):
+        return '{} {}'.format(self.flag, 'set' if self.active else 'cleared')
+
+
+class Sen5xStatusMonitor:
+    """
+    Watches the device status with an adaptive polling rate and reports
+    edge-triggered events on flag transitions.
+
+    Instead of reading the device status after every measurement, call
+    :py:meth:`update` after every measurement and let the monitor decide
+    whether the status needs to be read. The poll interval starts at
+    ``min_interval`` and is multiplied by ``backoff`` after each poll which
+    did not reveal any change, up to ``max_interval``. It falls back to
+    ``min_interval`` as soon as a flag changes or a measurement looks
+    anomalous (no signal available at all, or the same frame received
+    repeatedly).
+
+    Sticky error flags are cleared on the device with
+    :py:meth:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.read_device_status`
+    (``clear=True``) after they have been recorded, so a recurring error is
+    reported as a new event instead of being masked by the sticky flag.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        monitor = Sen5xStatusMonitor(device)
+        monitor.add_listener(lambda event: print(event))
+        while True:
+            values = device.read_measured_values()
+            monitor.update(values)
+    """
+
+    def __init__(self, device, min_interval=1.0, max_interval=60.0,
+                 backoff=2.0, stuck_threshold=10, clear_errors=True,
+                 history_size=1000, clock=None):
+        """
+        Constructor.
+
+        :param ~sensirion_i2c_sen5x.device.Sen5xI2cDevice device:
+            The device to monitor.
+        :param float min_interval:
+            Minimum poll interval in seconds.
+        :param float max_interval:
+            Maximum poll interval in seconds.
+        :param float backoff:
+            Factor to increase the poll interval after each unchanged poll.
+        :param int stuck_threshold:
+            Number of consecutive identical measurements after which the
+            measurement is considered as stuck (anomalous).
+        :param bool clear_errors:
+            Whether to clear sticky error flags on the device after they were
+            recorded.
+        :param int history_size:
+            Maximum number of events kept in :py:attr:`history`.
+        :param callable clock:
+            Function returning a monotonic time in seconds. Defaults to the
+            device's clock (see
+            :py:attr:`~sensirion_i2c_sen5x.device.Sen5xI2cDevice.clock`).
+        """
+        super(Sen5xStatusMonitor, self).__init__()
+        self._device = device
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._stuck_threshold = stuck_threshold
+        self._clear_errors = clear_errors
+        self._clock = clock or get_clock(device).monotonic
+        self._listeners = []
+        self._interval = min_interval
+        self._last_poll = None
+        self._next_poll = None
+        self._clear_pending = False
+        self._last_values = None
+        self._repeat_count = 0
+        self._anomaly = False
+
+        #: The latest read device status
+        #: (:py:class:`~sensirion_i2c_sen5x.response_types.Sen5xDeviceStatus`),
+        #: or ``None`` if not read yet.
+        self.status = None
+
+        #: Recent status events (:py:class:`Sen5xStatusEvent`), oldest first.
+        self.history = deque(maxlen=history_size)
+
+        #: Number of times each flag got set, as dict(str, int).
+        self.counts = dict((flag, 0) for flag in STATUS_FLAGS)
+
+        #: Total number of status reads performed by the monitor.
+        self.poll_count = 0
+
+    @property
+    def interval(self):
+        """
+        The current poll interval in seconds.
+
+        :type: float
+        """
+        return self._interval
+
+    def add_listener(self, callback):
+        """
+        Register a function to be called for every status event.
+
+        :param callable callback:
+            Function taking a :py:class:`Sen5xStatusEvent` as argument.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """
+        Unregister a function previously registered with
+        :py:meth:`add_listener`.
+
+        :param callable callback:
+            The function to unregister.
+        """
+        self._listeners.remove(callback)
+
+    def update(self, values=None):
+        """
+        Notify the monitor about a new measurement and poll the device status
+        if required.
+
+        :param values:
+            The latest measurement (either a
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            object or a tuple of raw ticks), or ``None`` to only check whether
+            a poll is due.
+        :return:
+            The read device status if the device was polled, otherwise
+            ``None``.
+        :rtype:
+            ~sensirion_i2c_sen5x.response_types.Sen5xDeviceStatus/None
+        """
+        now = self._clock()
+        if values is not None:
+            self._anomaly = self._is_anomalous(values)
+        if self._anomaly:
+            self._interval = self._min_interval
+            if self._next_poll is not None:
+                self._next_poll = min(self._next_poll,
+                                      self._last_poll + self._min_interval)
+        if (self._next_poll is None) or (now >= self._next_poll):
+            return self.poll()
+        return None
+
+    def poll(self):
+        """
+        Read the device status immediately, emit events for all changed flags
+        and schedule the next poll.
+
+        :return:
+            The read device status.
+        :rtype:
+            ~sensirion_i2c_sen5x.response_types.Sen5xDeviceStatus
+        """
+        clear = self._clear_pending
+        status = self._device.read_device_status(clear=clear)
+        now = self._clock()
+        self.poll_count += 1
+        changed = self._process(now, status)
+        self.status = status
+
+        # Sticky errors which were just recorded get cleared with the next
+        # read, so a recurrence will show up as a new transition.
+        self._clear_pending = self._clear_errors and \
+            any(getattr(status, flag) for flag in STICKY_FLAGS)
+        if changed or self._clear_pending or self._anomaly:
+            self._interval = self._min_interval
+        else:
+            self._interval = min(self._interval * self._backoff,
+                                 self._max_interval)
+        self._last_poll = now
+        self._next_poll = now + self._interval
+        return status
+
+    def _is_anomalous(self, values):
+        values = tuple(getattr(values, 'values', values))
+        if values == self._last_values:
+            self._repeat_count += 1
+        else:
+            self._repeat_count = 0
+            self._last_values = values
+        return (values == _NOT_AVAILABLE) or \
+            (self._repeat_count >= self._stuck_threshold)
+
+    def _process(self, now, status):
+        previous = self.status
+        events = []
+        for flag in STATUS_FLAGS:
+            active = getattr(status, flag)
+            was_active = getattr(previous, flag) if previous else False
+            if active != was_active:
+                events.append(Sen5xStatusEvent(now, flag, active, status))
+                if active:
+                    self.counts[flag] += 1
+        for event in events:
+            log.debug("Device status event: {}".format(event))
+            self.history.append(event)
+            for callback in self._listeners:
+                callback(event)
+        return len(events) > 0
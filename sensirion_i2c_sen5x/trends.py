@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Raw ticks of an unavailable VOC/NOx index (e.g. during the NOx warm-up).
+NOT_AVAILABLE = 0x7FFF
+
+#: Event kind of a rising change point detected by CUSUM.
+RISE = 'rise'
+
+#: Event kind of a falling change point detected by CUSUM.
+FALL = 'fall'
+
+#: Event kind of a rate of change exceeding the threshold.
+RATE = 'rate'
+
+
+class Sen5xTrendEvent:
+    """
+    Represents an event detected by :py:class:`Sen5xTrendDetector`.
+    """
+
+    def __init__(self, signal, kind, sample, ticks, ewma, rate):
+        """
+        Constructor.
+
+        :param str signal:
+            Name of the signal, e.g. "voc_index".
+        :param str kind:
+            :py:data:`RISE`, :py:data:`FALL` or :py:data:`RATE`.
+        :param int sample:
+            Number of the (available) sample which triggered the event.
+        :param int ticks:
+            Raw ticks of the sample.
+        :param int ewma:
+            Smoothed value in ticks (before the event).
+        :param int rate:
+            Smoothed rate of change in ticks per sample.
+        """
+        super(Sen5xTrendEvent, self).__init__()
+        self.signal = signal
+        self.kind = kind
+        self.sample = sample
+        self.ticks = ticks
+        self.ewma = ewma
+        self.rate = rate
+
+    def __str__(self):
+        return '{} {} at sample {}: {} (smoothed {}, rate {}/sample)'.format(
+            self.signal, self.kind, self.sample, self.ticks / 10.0,
+            self.ewma / 10.0, self.rate / 10.0)
+
+
+class Sen5xTrendDetector:
+    """
+    Online trend and change point detection for a VOC or NOx index signal.
+
+    All calculations are done in integer arithmetic on the raw ticks (10 ticks
+    per index point) with constant memory:
+
+    - EWMA: Exponentially weighted moving average with the smoothing factor
+      ``1 / 2**shift``, kept as fixed-point accumulator.
+    - Rate of change: EWMA of the differences between consecutive samples.
+    - CUSUM: Cumulative sums of the deviations from the EWMA (minus the
+      allowed ``drift``) in both directions. A change point is reported when
+      a sum exceeds ``threshold``. Afterwards, the EWMA is re-anchored to the
+      current sample so that the same step is reported only once.
+    - Rate events: Reported when the absolute rate exceeds
+      ``rate_threshold``. The event is latched until the absolute rate fell
+      below ``rate_rearm``, so a steady ramp is reported only once.
+
+    Unavailable samples (0x7FFF, e.g. during the first 10..11 seconds of the
+    NOx measurement) reset the detector. After the signal got available, no
+    events are reported for ``holdoff`` samples, until the EWMA has settled.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        detector = Sen5xTrendDetector('voc_index', threshold=200)
+        while True:
+            values = device.read_measured_values()
+            event = detector.update(values.voc_index.ticks)
+            if event is not None and event.kind == RISE:
+                ventilation.start()
+    """
+
+    def __init__(self, signal='voc_index', shift=2, drift=20, threshold=200,
+                 rate_threshold=None, rate_rearm=None, holdoff=None):
+        """
+        Constructor.
+
+        :param str signal:
+            Name of the signal, used for the events.
+        :param int shift:
+            Smoothing of the EWMA and the rate (factor ``1 / 2**shift``).
+        :param int drift:
+            Deviation from the EWMA in ticks which is tolerated per sample.
+        :param int threshold:
+            CUSUM threshold in ticks.
+        :param int rate_threshold:
+            Absolute rate of change in ticks per sample to report a
+            :py:data:`RATE` event, or ``None`` to disable.
+        :param int rate_rearm:
+            Absolute rate of change in ticks per sample below which the next
+            :py:data:`RATE` event can be reported. Defaults to half of
+            ``rate_threshold``.
+        :param int holdoff:
+            Number of samples after the signal got available without events.
+            Defaults to ``2**shift``.
+        """
+        super(Sen5xTrendDetector, self).__init__()
+        self.signal = signal
+        self._shift = shift
+        self._drift = drift
+        self._threshold = threshold
+        self._rate_threshold = rate_threshold
+        if rate_rearm is None and rate_threshold is not None:
+            rate_rearm = rate_threshold // 2
+        self._rate_rearm = rate_rearm
+        self._holdoff = (1 << shift) if holdoff is None else holdoff
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the detector, e.g. after restarting the measurement.
+        """
+        self._ewma_acc = None
+        self._rate_acc = 0
+        self._previous = None
+        self._positive = 0
+        self._negative = 0
+        self._available = 0
+        self._rate_latched = False
+
+        #: Number of processed available samples.
+        self.samples = 0
+
+    @property
+    def ewma(self):
+        """
+        The smoothed value in ticks, or ``None`` if not available.
+
+        :type: int
+        """
+        if self._ewma_acc is None:
+            return None
+        return self._ewma_acc >> self._shift
+
+    @property
+    def rate(self):
+        """
+        The smoothed rate of change in ticks per sample.
+
+        :type: int
+        """
+        return self._rate_acc >> self._shift
+
+    def update(self, ticks):
+        """
+        Process a sample.
+
+        :param int ticks:
+            Raw ticks of the sample (e.g.
+            :py:attr:`~sensirion_i2c_sen5x.response_types.Sen5xAirQualityIndex.ticks`).
+        :return:
+            The detected event, or ``None``.
+        :rtype:
+            ~sensirion_i2c_sen5x.trends.Sen5xTrendEvent
+        """
+        if ticks == NOT_AVAILABLE:
+            if self._ewma_acc is not None:
+                self.reset()
+            return None
+        shift = self._shift
+        self.samples += 1
+        if self._ewma_acc is None:
+            self._ewma_acc = ticks << shift
+            self._previous = ticks
+            self._available = 1
+            return None
+        self._rate_acc += ticks - self._previous - (self._rate_acc >> shift)
+        self._previous = ticks
+        rate = self._rate_acc >> shift
+        if self._rate_latched and abs(rate) < self._rate_rearm:
+            self._rate_latched = False
+        ewma = self._ewma_acc >> shift
+        deviation = ticks - ewma
+        self._positive = max(0, self._positive + deviation - self._drift)
+        self._negative = max(0, self._negative - deviation - self._drift)
+        self._ewma_acc += ticks - ewma
+        if self._available < self._holdoff:
+            self._available += 1
+            self._positive = self._negative = 0
+            return None
+        kind = None
+        if self._positive > self._threshold:
+            kind = RISE
+        elif self._negative > self._threshold:
+            kind = FALL
+        elif self._rate_threshold is not None and not self._rate_latched \
+                and abs(rate) > self._rate_threshold:
+            kind = RATE
+        if kind is None:
+            return None
+        if kind == RATE:
+            self._rate_latched = True
+        else:
+            self._positive = self._negative = 0
+            self._ewma_acc = ticks << shift
+        return Sen5xTrendEvent(self.signal, kind, self.samples, ticks, ewma,
+                               rate)
+
+
+class Sen5xTrendStage:
+    """
+    Applies a :py:class:`Sen5xTrendDetector` to both the VOC and the NOx
+    index of measured values.
+
+    Example how to use this class:
+
+    .. code-block:: python
+
+        stage = Sen5xTrendStage()
+        while True:
+            for event in stage.update(device.read_measured_values()):
+                print(event)
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Constructor.
+
+        :param kwargs:
+            Parameters passed to both :py:class:`Sen5xTrendDetector` objects.
+        """
+        super(Sen5xTrendStage, self).__init__()
+
+        #: Detector of the VOC index.
+        self.voc = Sen5xTrendDetector('voc_index', **kwargs)
+
+        #: Detector of the NOx index.
+        self.nox = Sen5xTrendDetector('nox_index', **kwargs)
+
+    def update(self, values):
+        """
+        Process a sample.
+
+        :param values:
+            The raw ticks (tuple of 8 integers) or a
+            :py:class:`~sensirion_i2c_sen5x.measured_values.Sen5xMeasuredValues`
+            object.
+        :return:
+            The detected events (possibly empty).
+        :rtype:
+            list
+        """
+        ticks = getattr(values, 'values', values)
+        events = []
+        for detector, index in ((self.voc, 6), (self.nox, 7)):
+            event = detector.update(ticks[index])
+            if event is not None:
+                events.append(event)
+        return events
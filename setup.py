@@ -37,9 +37,15 @@ setup(
     install_requires=[
         'sensirion-i2c-driver~=1.0.0',
     ],
+    entry_points={
+        'console_scripts': [
+            'sen5x = sensirion_i2c_sen5x.cli:main',
+        ],
+    },
     extras_require={
         'test': [
             'flake8~=3.9.2',
+            'numpy>=1.13',  # to test the optional vectorized code paths
             'pytest~=5.4.3',
             'pytest-cov~=2.12.1',
             'sensirion-shdlc-sensorbridge~=0.1.1',
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cConnection
+from sensirion_i2c_sen5x import Sen5xI2cDevice, Sen5xMeasuredValues
+from sensirion_i2c_sen5x import calibration as calibration_module
+from sensirion_i2c_sen5x.calibration import Sen5xCalibration, \
+    Sen5xCalibrationStore, fit_linear
+from sensirion_i2c_sen5x.clock import Sen5xVirtualClock
+from sensirion_i2c_sen5x.simulation import Sen5xSimulatedTransceiver
+import pytest
+
+
+def _create(**kwargs):
+    clock = Sen5xVirtualClock()
+    transceiver = Sen5xSimulatedTransceiver(clock=clock.monotonic,
+                                            sleep=clock.sleep, **kwargs)
+    return Sen5xI2cDevice(I2cConnection(transceiver), clock=clock), clock
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(calibration_module, 'numpy', None)
+    elif calibration_module.numpy is None:
+        pytest.skip("numpy not installed")
+
+
+def test_fit_linear(backend):
+    x = [100, 200, 300, 0xFFFF, 400]
+    y = [215, 435, 655, 1000, 0xFFFF]
+    gain, offset, samples = fit_linear(x, y, sentinel=0xFFFF)
+    assert gain == pytest.approx(2.2)
+    assert offset == pytest.approx(-5.0)
+    assert samples == 3
+
+
+def test_fit_linear_numpy_equals_python():
+    if calibration_module.numpy is None:
+        pytest.skip("numpy not installed")
+    x = [(i * 37) % 1000 for i in range(500)] + [0xFFFF]
+    y = [int(round(1.05 * v - 12)) + i % 7 for i, v in enumerate(x)]
+    expected = fit_linear(x, y, sentinel=0xFFFF)
+    numpy = calibration_module.numpy
+    try:
+        calibration_module.numpy = None
+        gain, offset, samples = fit_linear(x, y, sentinel=0xFFFF)
+    finally:
+        calibration_module.numpy = numpy
+    assert samples == expected[2] == 500
+    assert gain == pytest.approx(expected[0], rel=1e-12)
+    assert offset == pytest.approx(expected[1], rel=1e-9)
+    assert type(gain) is float and type(offset) is float
+
+
+def test_fit_linear_errors(backend):
+    with pytest.raises(ValueError):
+        fit_linear([1, 2], [1])
+    with pytest.raises(ValueError):
+        fit_linear([1, 0x7FFF], [1, 2], sentinel=0x7FFF)
+    with pytest.raises(ValueError):
+        fit_linear([5, 5, 5], [1, 2, 3])
+
+
+def test_fit_and_apply(backend):
+    columns = [[10 * i + j for i in range(20)] for j in range(8)]
+    reference = [None] * 8
+    reference[1] = [int(round(1.1 * t + 5)) for t in columns[1]]
+    reference[5] = [t - 400 for t in columns[5]]
+    reference[7] = [0x7FFF] * 20
+    calibration = Sen5xCalibration.fit(columns, reference)
+    assert sorted(calibration.coefficients) == [1, 5]
+    gain, offset = calibration.coefficients[1]
+    assert gain == pytest.approx(1.1, abs=1e-3)
+    assert offset == pytest.approx(5.0, abs=0.5)
+    assert calibration.coefficients[5] == pytest.approx((1.0, -400.0))
+
+    ticks = (10, 100, 30, 40, 5000, 5000, 1000, 0x7FFF)
+    assert calibration.apply(ticks) == \
+        (10, 115, 30, 40, 5000, 4600, 1000, 0x7FFF)
+    values = calibration.apply(Sen5xMeasuredValues(ticks))
+    assert isinstance(values, Sen5xMeasuredValues)
+    assert values.ambient_temperature.degrees_celsius == 23.0
+    assert calibration.apply((0xFFFF,) * 4 + (0x7FFF,) * 4) == \
+        (0xFFFF,) * 4 + (0x7FFF,) * 4
+    assert calibration.apply((0, 0xFFF0, 0, 0, 0, -0x7FF0, 0, 0))[1:6:4] == \
+        (0xFFFE, -0x8000)
+    corrected = calibration.apply_columns(columns)
+    assert [tuple(c[3] for c in corrected)] == \
+        [calibration.apply(tuple(c[3] for c in columns))]
+
+
+def test_serialization():
+    calibration = Sen5xCalibration({1: (1.1, 5.0), 5: (1.0, -400)})
+    data = calibration.to_dict()
+    assert data['mc_2p5'] == {'gain': 1.1, 'offset': 5.0}
+    restored = Sen5xCalibration.from_dict(data)
+    assert restored.coefficients == calibration.coefficients
+
+
+def test_device_decode_path():
+    device, clock = _create()
+    device.start_measurement()
+    clock.sleep(1.0)
+    raw = device.read_measured_values().values
+    device.calibration = Sen5xCalibration({0: (2.0, 0.0)})
+    assert device.read_measured_values().values[0] == 2 * raw[0]
+
+
+def test_push_temperature():
+    device, clock = _create(seed=7)
+    device.set_temperature_offset_parameters(1.0, 0.0, 0)
+    calibration = Sen5xCalibration({1: (1.1, 0.0), 5: (1.05, -100.0)})
+    device.calibration = calibration
+    device.start_measurement()
+    clock.sleep(1.0)
+    device.calibration = None
+    raw = device.read_measured_values().values
+    expected = calibration.apply(raw)
+    device.calibration = calibration
+
+    remaining = calibration.push_temperature(device)
+    assert sorted(remaining.coefficients) == [1]
+    assert device.calibration is remaining
+    assert device.get_temperature_offset_parameters(raw=True) == \
+        (int(round(1.05 * 200 - 100)), 500, 0)
+    values = device.read_measured_values().values
+    assert values[1] == expected[1]
+    assert values[5] == pytest.approx(expected[5], abs=1)
+    assert remaining.push_temperature(device) is remaining
+
+
+def test_store(tmpdir):
+    path = str(tmpdir.join('calibration.json'))
+    store = Sen5xCalibrationStore(path)
+    assert store.get('SIM0000000000001') is None
+    store.put('SIM0000000000001', Sen5xCalibration({4: (1.0, 250.0)}))
+
+    device, _ = _create()
+    assert Sen5xCalibrationStore(path).attach(device).coefficients == \
+        {4: (1.0, 250.0)}
+    assert device.calibration.coefficients == {4: (1.0, 250.0)}
+    device.calibration = Sen5xCalibration()
+    assert Sen5xCalibrationStore(str(tmpdir.join('other.json'))).attach(
+        device) is None
+    assert device.calibration is None
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cConnection, CrcCalculator
+from sensirion_i2c_driver.transceiver_v1 import I2cTransceiverV1
+from sensirion_i2c_sen5x import Sen5xI2cDevice
+from sensirion_i2c_sen5x.capabilities import Sen5xCapabilities, \
+    Sen5xCapabilityResolver, Sen5xUnsupportedError
+import json
+import pytest
+
+CRC = CrcCalculator(8, 0x31, 0xFF, 0x00)
+
+
+class FakeTransceiver(I2cTransceiverV1):
+    def __init__(self, product_name, firmware, serial_number='ABC123'):
+        super(FakeTransceiver, self).__init__()
+        self.commands = []
+        self.responses = {
+            0xD014: product_name.encode('ascii').ljust(32, b'\x00'),
+            0xD033: serial_number.encode('ascii').ljust(32, b'\x00'),
+            0xD100: bytes([firmware[0], firmware[1], 0, 1, 0, 1, 0, 0]),
+        }
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        command = (tx_data[0] << 8) | tx_data[1]
+        self.commands.append(command)
+        rx_data = b''
+        if rx_length:
+            payload = self.responses[command]
+            for i in range(0, len(payload), 2):
+                word = payload[i:i + 2]
+                rx_data += word + bytes([CRC(word)])
+        return self.STATUS_OK, None, rx_data
+
+
+@pytest.mark.parametrize("product_name,firmware,features", [
+    ('SEN50', (2, 0), ['pm']),
+    ('SEN54', (1, 0), ['measurement_without_pm', 'pm', 'rht', 'voc']),
+    ('SEN55', (2, 0), ['measurement_without_pm', 'mode_switching', 'nox',
+                       'pm', 'rht', 'voc']),
+])
+def test_features(product_name, firmware, features):
+    capabilities = Sen5xCapabilities(product_name, firmware)
+    assert sorted(capabilities.features) == features
+
+
+def test_fail_fast():
+    transceiver = FakeTransceiver('SEN50', (2, 0))
+    device = Sen5xI2cDevice(I2cConnection(transceiver))
+    Sen5xCapabilityResolver().resolve(device)
+    del transceiver.commands[:]
+    with pytest.raises(Sen5xUnsupportedError) as exc_info:
+        device.start_measurement_without_pm()
+    assert exc_info.value.feature == 'measurement_without_pm'
+    with pytest.raises(Sen5xUnsupportedError):
+        device.get_voc_tuning_parameters()
+    assert transceiver.commands == []
+    device.start_measurement()
+    assert transceiver.commands == [0x0021]
+
+
+def test_mode_switching():
+    transceiver = FakeTransceiver('SEN55', (1, 0))
+    device = Sen5xI2cDevice(I2cConnection(transceiver))
+    device.capabilities = Sen5xCapabilities('SEN55', (1, 0))
+    device.start_measurement_without_pm()
+    with pytest.raises(Sen5xUnsupportedError) as exc_info:
+        device.start_measurement()
+    assert exc_info.value.feature == 'mode_switching'
+    device.stop_measurement()
+    device.start_measurement()
+    assert transceiver.commands == [0x0037, 0x0104, 0x0021]
+
+
+def test_cache(tmpdir):
+    path = str(tmpdir.join('capabilities.json'))
+    transceiver = FakeTransceiver('SEN54', (2, 1))
+    device = Sen5xI2cDevice(I2cConnection(transceiver))
+    capabilities = Sen5xCapabilityResolver(path).resolve(device)
+    assert capabilities.firmware == (2, 1)
+    assert transceiver.commands == [0xD033, 0xD100, 0xD014]
+    with open(path) as f:
+        assert json.load(f)['ABC123']['product_name'] == 'SEN54'
+
+    # A new resolver (e.g. after a restart) reads only the serial number.
+    del transceiver.commands[:]
+    device = Sen5xI2cDevice(I2cConnection(transceiver))
+    capabilities = Sen5xCapabilityResolver(path).resolve(device)
+    assert transceiver.commands == [0xD033]
+    assert device.capabilities is capabilities
+    assert capabilities.supports('mode_switching')
+    assert not capabilities.supports('nox')
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import CrcCalculator
+from sensirion_i2c_driver.transceiver_v1 import I2cTransceiverV1
+from sensirion_i2c_sen5x.cli import main, parse_device
+from sensirion_i2c_sen5x.replay import RECORD_SIZE, replay_archives
+from io import StringIO
+from struct import pack
+import subprocess
+import sys
+
+CRC = CrcCalculator(8, 0x31, 0xFF, 0x00)
+
+
+class FakeTransceiver(I2cTransceiverV1):
+    """Register-based stand-in for one or more devices on a bus."""
+
+    def __init__(self, bus, failing=()):
+        super(FakeTransceiver, self).__init__()
+        self.bus = bus
+        self.failing = failing
+        self.closed = False
+        self.commands = []
+        self.registers = {
+            0xD014: b'SEN55'.ljust(32, b'\x00'),
+            0xD033: b'1234ABCD'.ljust(32, b'\x00'),
+            0xD100: bytes([2, 2, 0, 7, 0, 1, 0, 0]),
+            0xD206: pack('>I', 1 << 19),
+            0xD210: pack('>I', 1 << 19),
+            0x0202: pack('>H', 1),
+            0x03C4: pack('>4H4h', 12, 25, 30, 41, 4520, 4700, 1000, 0x7FFF),
+            0x60B2: pack('>hhH', 0, 0, 0),
+            0x60C6: pack('>H', 0),
+            0x60F7: pack('>H', 0),
+            0x8004: pack('>I', 604800),
+            0x60D0: pack('>hhhhhh', 100, 12, 12, 180, 50, 230),
+            0x60E1: pack('>hhhhhh', 1, 12, 12, 720, 50, 230),
+        }
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        command = (tx_data[0] << 8) | tx_data[1]
+        self.commands.append((slave_address, command))
+        if command == 0x03C4 and slave_address in self.failing:
+            return self.STATUS_NACK, None, b''
+        if len(tx_data) > 2:
+            self.registers[command] = bytes(
+                b for i, b in enumerate(tx_data[2:]) if i % 3 != 2)
+        rx_data = b''
+        if rx_length:
+            payload = self.registers[command]
+            for i in range(0, len(payload), 2):
+                word = payload[i:i + 2]
+                rx_data += word + bytes([CRC(word)])
+        return self.STATUS_OK, None, rx_data
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self, failing=()):
+        self.transceivers = {}
+        self.failing = failing
+
+    def __call__(self, bus):
+        self.transceivers[bus] = FakeTransceiver(bus, self.failing)
+        return self.transceivers[bus]
+
+
+def _run(*argv, **kwargs):
+    out = StringIO()
+    factory = Factory(**kwargs)
+    code = main(list(argv), transceiver_factory=factory, out=out)
+    return code, out.getvalue(), factory
+
+
+def test_parse_device():
+    assert parse_device('/dev/i2c-3') == ('/dev/i2c-3', 0x69)
+    assert parse_device('/dev/i2c-3@0x6A') == ('/dev/i2c-3', 0x6A)
+
+
+def test_info_multiple_devices():
+    code, out, factory = _run('-d', 'bus0', '-d', 'bus1@0x6A', 'info')
+    assert code == 0
+    assert 'bus0@0x69:\n' in out
+    assert 'bus1@0x6A:\n' in out
+    assert out.count('Product Name:  SEN55') == 2
+    assert 'Serial Number: 1234ABCD' in out
+    assert all(t.closed for t in factory.transceivers.values())
+
+
+def test_status():
+    code, out, factory = _run('-d', 'bus0', 'status', '--clear')
+    assert code == 0
+    assert '  fan_error               -\n' in out
+    assert '  fan_cleaning            SET\n' in out
+    assert factory.transceivers['bus0'].commands == [(0x69, 0xD210)]
+
+
+def test_status_sticky_error_exit_code():
+    class FanErrorFactory(Factory):
+        def __call__(self, bus):
+            transceiver = Factory.__call__(self, bus)
+            transceiver.registers[0xD206] = pack('>I', 1 << 4)
+            return transceiver
+
+    out = StringIO()
+    code = main(['-d', 'bus0', 'status'], transceiver_factory=FanErrorFactory(),
+                out=out)
+    assert code == 2
+    assert '  fan_error               SET\n' in out.getvalue()
+
+
+def test_config_get_and_set():
+    code, out, factory = _run('-d', 'bus0', 'config', 'get',
+                              'voc_tuning_parameters')
+    assert out == 'bus0@0x69:\n  voc_tuning_parameters=100,12,12,180,50,230\n'
+    code, out, factory = _run('-d', 'bus0', 'config', 'set',
+                              'rht_acceleration_mode=2',
+                              'temperature_offset_parameters=-200,0,0')
+    assert code == 0
+    assert 'changed: [temperature_offset_parameters, rht_acceleration_mode]' \
+        in out
+    assert _run('config', 'set', 'foo=1')[0] == 1
+
+
+def test_stream_csv(tmpdir):
+    path = str(tmpdir.join('data.csv'))
+    code, out, factory = _run('-d', 'bus0', '-d', 'bus0@0x6A', 'stream',
+                              '-n', '3', '-i', '0.001', '-o', path,
+                              '--rotate-bytes', '200')
+    assert code == 0
+    files = sorted(p.basename for p in tmpdir.listdir())
+    assert files[0] == 'data.0000.csv'
+    lines = []
+    for name in files:
+        with open(str(tmpdir.join(name))) as f:
+            content = f.read().splitlines()
+        assert content[0].startswith('timestamp,device,mc_1p0,')
+        lines += content[1:]
+    assert len(lines) == 6
+    assert lines[0].split(',')[1:] == [
+        'bus0@0x69', '1.2', '2.5', '3.0', '4.1', '45.20', '23.500', '100.0',
+        '']
+    commands = [c for _, c in factory.transceivers['bus0'].commands]
+    assert commands[:2] == [0x0021, 0x0021]
+    assert commands[-2:] == [0x0104, 0x0104]
+
+
+def test_stream_csv_resumes_rotation(tmpdir):
+    path = str(tmpdir.join('data.csv'))
+    for _ in range(2):
+        code, out, factory = _run('-d', 'bus0', 'stream', '-n', '2',
+                                  '-i', '0.001', '-o', path,
+                                  '--rotate-bytes', '100')
+        assert code == 0
+    files = sorted(p.basename for p in tmpdir.listdir())
+    assert files == ['data.{:04d}.csv'.format(i) for i in range(4)]
+    for name in files:
+        with open(str(tmpdir.join(name))) as f:
+            content = f.read().splitlines()
+        assert len(content) == 2
+        assert content[0].startswith('timestamp,device,')
+
+
+def test_stream_csv_appends_without_header(tmpdir):
+    path = str(tmpdir.join('data.csv'))
+    for _ in range(2):
+        assert _run('-d', 'bus0', 'stream', '-n', '2', '-i', '0.001',
+                    '-o', path)[0] == 0
+    with open(path) as f:
+        content = f.read().splitlines()
+    assert len(content) == 5
+    assert content[0].startswith('timestamp,device,')
+    assert not any(line.startswith('timestamp') for line in content[1:])
+
+
+def test_stream_continues_on_read_error(tmpdir):
+    code, out, factory = _run('-d', 'bus0', '-d', 'bus0@0x6A', 'stream',
+                              '-n', '3', '-i', '0.001', failing=(0x6A,))
+    assert code == 0
+    lines = out.splitlines()[1:]
+    assert len(lines) == 3
+    assert all(line.split(',')[1] == 'bus0@0x69' for line in lines)
+
+
+def test_stream_binary(tmpdir):
+    path = str(tmpdir.join('{device}.bin'))
+    code, out, factory = _run('-d', 'bus0', 'stream', '-f', 'binary',
+                              '-n', '4', '-i', '0.001', '-o', path)
+    assert code == 0
+    archive = tmpdir.join('bus0@0x69.bin')
+    assert archive.size() == 4 * RECORD_SIZE
+    result = next(replay_archives([str(archive)], processes=1))
+    assert result.values(3) == (12, 25, 30, 41, 4520, 4700, 1000, 0x7FFF)
+
+
+def test_bench():
+    code, out, factory = _run('-d', 'bus0', 'bench', '-n', '3')
+    assert code == 0
+    lines = out.splitlines()
+    assert len(lines) == 13
+    assert lines[2].startswith('bus0@0x69')
+    assert 'read_measured_values' in lines[2]
+
+
+def test_help_does_not_import_driver():
+    code = ("import sys\n"
+            "from sensirion_i2c_sen5x import cli\n"
+            "try:\n"
+            "    cli.main(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print('sensirion_i2c_driver' in sys.modules)\n")
+    result = subprocess.run([sys.executable, '-c', code],
+                            stdout=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    assert result.stdout.splitlines()[-1] == 'False'
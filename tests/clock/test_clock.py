@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cConnection
+from sensirion_i2c_driver.errors import I2cChecksumError
+from sensirion_i2c_sen5x import Sen5xI2cDevice
+from sensirion_i2c_sen5x.clock import Sen5xVirtualClock, SYSTEM_CLOCK, \
+    get_clock
+from sensirion_i2c_sen5x.commands import Sen5xI2cCmdReadDataReady
+from sensirion_i2c_sen5x.duty_cycle import Sen5xDutyCycleScheduler
+from sensirion_i2c_sen5x.instrumentation import Sen5xInstrumentation
+from sensirion_i2c_sen5x.retry import Sen5xRetryPolicy
+from sensirion_i2c_sen5x.simulation import Sen5xFault, \
+    Sen5xSimulatedTransceiver, CRC_ERROR, NACK
+from sensirion_i2c_sen5x.status_monitor import Sen5xStatusMonitor
+import pytest
+import time
+
+
+def _create(faults=()):
+    clock = Sen5xVirtualClock()
+    transceiver = Sen5xSimulatedTransceiver(
+        faults=faults, clock=clock.monotonic, sleep=clock.sleep)
+    device = Sen5xI2cDevice(I2cConnection(transceiver), clock=clock)
+    return device, clock
+
+
+def test_virtual_clock():
+    clock = Sen5xVirtualClock(start=10.0, epoch=1000.0)
+    assert clock.monotonic() == 10.0
+    assert clock.time() == 1000.0
+    clock.sleep(2.5)
+    assert clock.monotonic() == 12.5
+    assert clock.time() == 1002.5
+    with pytest.raises(ValueError):
+        clock.sleep(-1.0)
+
+
+def test_get_clock():
+    device, clock = _create()
+    assert get_clock(device) is clock
+    device.clock = None
+    assert get_clock(device) is SYSTEM_CLOCK
+    assert get_clock(object()) is SYSTEM_CLOCK
+
+
+def test_device_waits_in_virtual_time():
+    device, clock = _create()
+    device.start_measurement()
+    assert clock.monotonic() == pytest.approx(0.05)
+    device.read_measured_values()
+    assert clock.monotonic() == pytest.approx(0.07)
+    device.stop_measurement()
+    assert clock.monotonic() == pytest.approx(0.23)
+
+
+def test_post_processing_is_waited_on_error():
+    device, clock = _create([Sen5xFault(CRC_ERROR, count=1)])
+    command = Sen5xI2cCmdReadDataReady()
+    command.post_processing_time = 1.0
+    with pytest.raises(I2cChecksumError):
+        device.execute(command)
+    assert clock.monotonic() == pytest.approx(1.02)
+
+
+def test_instrumentation_uses_device_clock():
+    device, clock = _create()
+    device.instrumentation = Sen5xInstrumentation()
+    start = time.monotonic()
+    device.start_measurement()
+    device.read_measured_values()
+    device.stop_measurement()
+    assert time.monotonic() - start < 0.1
+    assert clock.monotonic() == pytest.approx(0.23)
+
+
+def test_status_monitor_uses_device_clock():
+    device, clock = _create()
+    device.start_measurement()
+    monitor = Sen5xStatusMonitor(device, min_interval=10.0)
+    assert monitor.update(device.read_measured_values()) is not None
+    clock.sleep(5.0)
+    assert monitor.update(device.read_measured_values()) is None
+    clock.sleep(20.0)  # interval doubled after the unchanged poll
+    assert monitor.update(device.read_measured_values()) is not None
+
+
+def test_retry_uses_device_clock():
+    device, clock = _create([Sen5xFault(NACK, count=2)])
+    device.retry_policy = Sen5xRetryPolicy(backoff=100.0, max_backoff=100.0,
+                                           jitter=0.0)
+    start = time.monotonic()
+    device.get_serial_number()
+    assert time.monotonic() - start < 1.0
+    assert clock.monotonic() == pytest.approx(200.02)
+    assert device.retry_policy.max_recovery_time == pytest.approx(200.02)
+
+
+def test_simulated_week():
+    device, clock = _create()
+    device.start_measurement()
+    cleanings = []
+    values = []
+    start = time.monotonic()
+    while clock.monotonic() < 7 * 86400 + 60:
+        clock.sleep(65.0 - clock.monotonic() % 60.0)  # once per minute
+        values.append(device.read_measured_values())
+        if device.read_device_status().fan_cleaning:
+            cleanings.append(int(clock.monotonic()))
+    assert time.monotonic() - start < 30.0
+    assert len(values) == 7 * 24 * 60 + 1
+    assert all(v.mass_concentration_2p5.available for v in values)
+    assert len(cleanings) == 1
+    assert 604800 <= cleanings[0] <= 604810
+
+
+def test_duty_cycle_uses_device_clock():
+    device, clock = _create()
+    scheduler = Sen5xDutyCycleScheduler(device, pm_period=3600.0,
+                                        pm_window=300.0, pm_warmup=60.0)
+    scheduler.start()
+    while clock.monotonic() < 86400:
+        clock.sleep(10.0)
+        scheduler.update()
+    scheduler.stop()
+    assert scheduler.duty_cycle == pytest.approx(360.0 / 3600, rel=0.05)
+    assert scheduler.pm_samples == pytest.approx(24 * 30, rel=0.05)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x import codec as codec_module
+from sensirion_i2c_sen5x.codec import decode_chunk, encode_chunk
+from sensirion_i2c_sen5x.filters import SENTINELS
+import pytest
+import random
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(codec_module, 'numpy', None)
+    elif codec_module.numpy is None:
+        pytest.skip("numpy not installed")
+
+
+def _chunk(count, seed=0):
+    rng = random.Random(seed)
+    timestamps = []
+    t = 1640995200 * 10 ** 9
+    for _ in range(count):
+        t += 10 ** 9 + rng.randint(-5, 5) * 10 ** 6
+        timestamps.append(t)
+    columns = [[] for _ in SENTINELS]
+    value = [100, 150, 180, 200, 4500, 4600, 1000, 10]
+    for i in range(count):
+        for j, column in enumerate(columns):
+            value[j] += rng.randint(-3, 3)
+            column.append(SENTINELS[j] if i == 5 else value[j])
+    return timestamps, columns
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 1000])
+def test_round_trip(backend, count):
+    timestamps, columns = _chunk(count)
+    data = encode_chunk(timestamps, columns)
+    assert decode_chunk(data) == (timestamps, columns)
+
+
+def test_compression(backend):
+    timestamps, columns = _chunk(1000)
+    data = encode_chunk(timestamps, columns)
+    # 8 bytes timestamp + 16 bytes ticks per sample uncompressed
+    assert len(data) < 24 * 1000 / 1.8
+
+
+def test_extreme_values(backend):
+    timestamps = [-2 ** 63, 2 ** 63 - 1, 0]
+    columns = [[0, 0xFFFF, 0]] * 4 + [[-0x8000, 0x7FFF, 0]] * 4
+    data = encode_chunk(timestamps, columns)
+    assert decode_chunk(data) == (timestamps, [list(c) for c in columns])
+
+
+def test_backends_are_compatible():
+    if codec_module.numpy is None:
+        pytest.skip("numpy not installed")
+    timestamps, columns = _chunk(500)
+    data = encode_chunk(timestamps, columns)
+    numpy = codec_module.numpy
+    try:
+        codec_module.numpy = None
+        assert encode_chunk(timestamps, columns) == data
+        assert decode_chunk(data) == (timestamps, columns)
+    finally:
+        codec_module.numpy = numpy
+
+
+def test_invalid_input(backend):
+    with pytest.raises(ValueError):
+        encode_chunk([1, 2], [[1, 2]] * 7)
+    with pytest.raises(ValueError):
+        encode_chunk([1, 2], [[1, 2]] * 7 + [[1]])
+
+
+def test_corrupt_chunk(backend):
+    data = encode_chunk(*_chunk(10))
+    with pytest.raises(ValueError):
+        decode_chunk(data[:8])
+    with pytest.raises(ValueError):
+        decode_chunk(b'XXXX' + data[4:])
+    corrupt = bytearray(data)
+    corrupt[20] ^= 0x01
+    with pytest.raises(ValueError):
+        decode_chunk(bytes(corrupt))
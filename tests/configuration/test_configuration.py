@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cConnection, CrcCalculator
+from sensirion_i2c_driver.transceiver_v1 import I2cTransceiverV1
+from sensirion_i2c_sen5x import Sen5xI2cDevice
+from sensirion_i2c_sen5x.configuration import Sen5xConfiguration, \
+    Sen5xConfigurator
+from struct import pack
+
+CRC = CrcCalculator(8, 0x31, 0xFF, 0x00)
+IDLE_ONLY = (0x60D0, 0x60E1, 0x6181)
+
+
+class FakeTransceiver(I2cTransceiverV1):
+    """
+    Register-based SEN5x stand-in for configuration commands.
+    """
+
+    def __init__(self):
+        super(FakeTransceiver, self).__init__()
+        self.measuring = False
+        self.commands = []
+        self.writes = []
+        self.registers = {
+            0x60B2: pack('>hhH', 0, 0, 0),
+            0x60C6: pack('>H', 0),
+            0x60F7: pack('>H', 0),
+            0x8004: pack('>I', 604800),
+            0x60D0: pack('>hhhhhh', 100, 12, 12, 180, 50, 230),
+            0x60E1: pack('>hhhhhh', 1, 12, 12, 720, 50, 230),
+            0x6181: b'\x00' * 8,
+        }
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        command = (tx_data[0] << 8) | tx_data[1]
+        self.commands.append(command)
+        if command == 0x0104:
+            self.measuring = False
+        elif command == 0x0021:
+            self.measuring = True
+        elif len(tx_data) > 2:
+            self.writes.append(command)
+            payload = bytes(b for i, b in enumerate(tx_data[2:])
+                            if i % 3 != 2)
+            if not (self.measuring and command in IDLE_ONLY):
+                self.registers[command] = payload
+        rx_data = b''
+        if rx_length:
+            payload = self.registers[command]
+            for i in range(0, len(payload), 2):
+                word = payload[i:i + 2]
+                rx_data += word + bytes([CRC(word)])
+        return self.STATUS_OK, None, rx_data
+
+
+def _device(transceiver):
+    return Sen5xI2cDevice(I2cConnection(transceiver))
+
+
+def _configurator(device):
+    return Sen5xConfigurator(device, sleep=lambda s: None)
+
+
+def test_configuration_raw_values():
+    config = Sen5xConfiguration(temperature_offset_parameters=(-1.5, 0.01, 60),
+                                warm_start=1.0, rht_acceleration_mode=2)
+    assert config.values == {
+        'temperature_offset_parameters': (-300, 100, 60),
+        'warm_start': 65535,
+        'rht_acceleration_mode': 2,
+    }
+    raw = Sen5xConfiguration(warm_start=100, raw=True)
+    assert raw.values == {'warm_start': 100}
+
+
+def test_read():
+    config = Sen5xConfiguration.read(_device(FakeTransceiver()))
+    assert config.values == {
+        'temperature_offset_parameters': (0, 0, 0),
+        'warm_start': 0,
+        'rht_acceleration_mode': 0,
+        'fan_auto_cleaning_interval': 604800,
+        'voc_tuning_parameters': (100, 12, 12, 180, 50, 230),
+        'nox_tuning_parameters': (1, 12, 12, 720, 50, 230),
+    }
+    assert 'warm_start=0' in str(config)
+
+
+def test_apply_skips_unchanged_values():
+    transceiver = FakeTransceiver()
+    config = Sen5xConfiguration(
+        temperature_offset_parameters=(-1.5, 0.0, 60),
+        warm_start=0.0,
+        rht_acceleration_mode=1,
+        fan_auto_cleaning_interval=604800,
+        voc_tuning_parameters=(100, 12, 12, 180, 50, 230),
+        nox_tuning_parameters=(1, 12, 12, 360, 50, 230),
+    )
+    report = _configurator(_device(transceiver)).apply(config)
+    assert report.changed == ['temperature_offset_parameters',
+                              'rht_acceleration_mode',
+                              'nox_tuning_parameters']
+    assert report.unchanged == ['warm_start', 'fan_auto_cleaning_interval',
+                                'voc_tuning_parameters']
+    assert report.success is True
+    assert report.stopped_measurement is False
+    assert transceiver.writes == [0x60B2, 0x60F7, 0x60E1]
+
+    # Applying it again does not write anything
+    transceiver.writes = []
+    report = _configurator(_device(transceiver)).apply(config)
+    assert report.changed == []
+    assert transceiver.writes == []
+
+
+def test_apply_idle_only_in_measure_mode():
+    transceiver = FakeTransceiver()
+    transceiver.measuring = True
+    config = Sen5xConfiguration(
+        voc_tuning_parameters=(150, 12, 12, 180, 50, 230))
+    report = _configurator(_device(transceiver)).apply(config)
+    assert report.success is False
+    assert report.failed == {
+        'voc_tuning_parameters': ((150, 12, 12, 180, 50, 230),
+                                  (100, 12, 12, 180, 50, 230)),
+    }
+
+    report = _configurator(_device(transceiver)).apply(
+        config, stop_measurement=True)
+    assert report.success is True
+    assert report.stopped_measurement is True
+
+
+def test_voc_state_is_always_written():
+    transceiver = FakeTransceiver()
+    config = Sen5xConfiguration(voc_state=b'\x00' * 8)
+    report = _configurator(_device(transceiver)).apply(
+        config, stop_measurement=True)
+    assert report.changed == ['voc_state']
+    assert report.success is True
+    assert transceiver.writes == [0x6181]
+
+
+def test_voc_state_requires_known_idle_mode():
+    transceiver = FakeTransceiver()
+    transceiver.measuring = True
+    config = Sen5xConfiguration(voc_state=b'\x01' * 8)
+    report = _configurator(_device(transceiver)).apply(config)
+    assert report.changed == []
+    assert report.failed == {'voc_state': (b'\x01' * 8, None)}
+    assert report.success is False
+    assert transceiver.writes == []
+
+
+def test_restart_measurement():
+    transceiver = FakeTransceiver()
+    transceiver.measuring = True
+    config = Sen5xConfiguration(
+        voc_tuning_parameters=(150, 12, 12, 180, 50, 230),
+        voc_state=b'\x01' * 8)
+    report = _configurator(_device(transceiver)).apply(
+        config, stop_measurement=True, restart_measurement=True)
+    assert report.success is True
+    assert report.changed == ['voc_tuning_parameters', 'voc_state']
+    assert report.stopped_measurement is True
+    assert report.restarted_measurement is True
+    assert transceiver.measuring is True
+    assert transceiver.commands[-1] == 0x0021
+    assert transceiver.registers[0x6181] == b'\x01' * 8
+
+    # Not restarted if it was not stopped
+    transceiver.commands = []
+    report = _configurator(_device(transceiver)).apply(
+        Sen5xConfiguration(rht_acceleration_mode=1),
+        stop_measurement=True, restart_measurement=True)
+    assert report.stopped_measurement is False
+    assert report.restarted_measurement is False
+    assert 0x0021 not in transceiver.commands
+
+
+def test_waits_only_remaining_post_processing_time():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    transceiver = FakeTransceiver()
+    configurator = Sen5xConfigurator(_device(transceiver),
+                                     clock=lambda: now[0], sleep=sleep)
+    configurator.apply(Sen5xConfiguration(rht_acceleration_mode=1,
+                                          fan_auto_cleaning_interval=0),
+                       verify=False)
+    # Two writes with 20ms post processing time each, no sleep for reads.
+    assert sleeps == [0.02, 0.02]
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x import Sen5xMeasuredValues
+from sensirion_i2c_sen5x.deadband import Sen5xDeadbandEncoder, reconstruct, \
+    DEADBAND, METHODS, SWINGING_DOOR
+from sensirion_i2c_sen5x.filters import SENTINELS
+import math
+import pytest
+import random
+
+
+def _samples(count, seed=0):
+    rng = random.Random(seed)
+    samples = []
+    for i in range(count):
+        pm = int(50 + 20 * math.sin(i / 300.0) + rng.gauss(0, 1))
+        rh = int(4500 + 0.5 * i + rng.gauss(0, 2))
+        t = int(4400 + 100 * math.sin(i / 900.0))
+        voc = 1000 + (i // 60) % 20
+        nox = 0x7FFF if i < 10 else 10
+        samples.append((pm, pm + 3, pm + 5, pm + 6, rh, t, voc, nox))
+    return samples
+
+
+def _encode(samples, tolerances, method):
+    encoder = Sen5xDeadbandEncoder(tolerances, method)
+    points = []
+    for i, values in enumerate(samples):
+        points.extend(encoder.put(float(i), values))
+    points.extend(encoder.flush())
+    return encoder, points
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("tolerance", [0, 1, 5])
+def test_reconstruction_within_tolerance(method, tolerance):
+    samples = _samples(3000)
+    tolerances = (tolerance,) * 8
+    encoder, points = _encode(samples, tolerances, method)
+    assert encoder.points_out == len(points)
+    assert encoder.values_in == 8 * len(samples)
+    restored = reconstruct(points, [float(i) for i in range(len(samples))],
+                           method)
+    for original, values in zip(samples, restored):
+        for a, b, sentinel in zip(original, values, SENTINELS):
+            if a == sentinel or b == sentinel:
+                assert a == b
+            else:
+                assert abs(a - b) <= tolerance
+    assert encoder.compression_ratio > 1.0
+
+
+def test_swinging_door_compresses_trends_better_than_deadband():
+    samples = _samples(3000)
+    deadband, deadband_points = _encode(samples, (2,) * 8, DEADBAND)
+    swinging_door, swinging_door_points = _encode(samples, (2,) * 8,
+                                                  SWINGING_DOOR)
+    assert deadband.compression_ratio > 3.0
+    assert swinging_door.compression_ratio > 3.0
+    # Smooth temperature and stepwise VOC index.
+    for signal in (5, 6):
+        assert sum(1 for p in swinging_door_points if p[0] == signal) < \
+            sum(1 for p in deadband_points if p[0] == signal) / 2
+
+
+def test_straight_line_is_two_points():
+    encoder = Sen5xDeadbandEncoder()
+    points = []
+    for i in range(100):
+        points.extend(encoder.put(i, Sen5xMeasuredValues((i * 3,) * 8)))
+    points.extend(encoder.flush())
+    assert sorted(p for p in points if p[0] == 0) == [(0, 0, 0), (0, 99, 297)]
+    assert encoder.compression_ratio == 50.0
+
+
+def test_unavailable_values():
+    samples = [(10,) * 8, (11,) * 8, SENTINELS, SENTINELS, (30,) * 8,
+               (31,) * 8]
+    for method in METHODS:
+        encoder, points = _encode(samples, (0,) * 8, method)
+        assert [(t, v) for s, t, v in points if s == 4] == [
+            (0.0, 10), (1.0, 11), (2.0, 0x7FFF), (4.0, 30), (5.0, 31)]
+        restored = reconstruct(points, [-1.0, 0.0, 1.0, 2.0, 3.0, 4.0, 5.0,
+                                        6.0], method)
+        assert [v[4] for v in restored] == [
+            0x7FFF, 10, 11, 0x7FFF, 0x7FFF, 30, 31, 31]
+
+
+def test_out_of_order_sample_is_dropped():
+    encoder = Sen5xDeadbandEncoder()
+    assert len(encoder.put(1.0, (1,) * 8)) == 8
+    assert encoder.put(1.0, (5,) * 8) == []
+    assert encoder.values_in == 8
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(method='foo'),
+    dict(tolerances=(1,) * 7),
+    dict(tolerances=(1,) * 7 + (-1,)),
+])
+def test_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        Sen5xDeadbandEncoder(**kwargs)
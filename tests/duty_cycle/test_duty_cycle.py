@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x.duty_cycle import Sen5xDutyCycleScheduler
+from sensirion_i2c_sen5x.measured_values import Sen5xMeasuredValues
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class FakeDevice:
+    def __init__(self):
+        self.commands = []
+        self.voc = 100
+
+    def start_measurement(self):
+        self.commands.append('pm')
+
+    def start_measurement_without_pm(self):
+        self.commands.append('low_power')
+
+    def stop_measurement(self):
+        self.commands.append('stop')
+
+    def read_measured_values(self):
+        return Sen5xMeasuredValues((10, 20, 30, 40, 5000, 5000,
+                                    self.voc * 10, 10))
+
+
+def _run(scheduler, clock, seconds, device=None, voc=None):
+    results = []
+    for _ in range(seconds):
+        clock.time += 1.0
+        if voc is not None:
+            device.voc = voc(clock.time)
+        results.append(scheduler.update())
+    return results
+
+
+def test_scheduled_windows():
+    clock = FakeClock()
+    device = FakeDevice()
+    scheduler = Sen5xDutyCycleScheduler(device, pm_period=100.0,
+                                        pm_window=10.0, pm_warmup=5.0,
+                                        clock=clock)
+    scheduler.start()
+    results = _run(scheduler, clock, 199)
+    assert device.commands == ['pm', 'low_power', 'pm', 'low_power']
+    pm = [r.mass_concentration_1p0.available for r in results]
+    assert pm[:4] == [False] * 4
+    assert pm[4] is True
+    assert sum(pm) == 20
+    assert scheduler.pm_samples == 20
+    assert scheduler.coverage == pytest.approx(20.0 / 199.0)
+    assert scheduler.duty_cycle == pytest.approx(30.0 / 199.0)
+    assert not scheduler.pm_enabled
+
+
+def test_catch_up_after_gap():
+    clock = FakeClock()
+    device = FakeDevice()
+    scheduler = Sen5xDutyCycleScheduler(device, pm_period=100.0,
+                                        pm_window=10.0, pm_warmup=5.0,
+                                        clock=clock)
+    scheduler.start()
+    _run(scheduler, clock, 20)
+    clock.time = 350.0  # missed the windows at 100, 200 and 300
+    _run(scheduler, clock, 49)
+    assert device.commands == ['pm', 'low_power', 'pm', 'low_power']
+    _run(scheduler, clock, 10)
+    assert device.commands[-1] == 'pm'  # next window at 400
+    assert clock.time == 409.0
+
+
+def test_event_trigger():
+    clock = FakeClock()
+    device = FakeDevice()
+    scheduler = Sen5xDutyCycleScheduler(device, pm_period=None,
+                                        pm_window=10.0, pm_warmup=5.0,
+                                        voc_threshold=50, clock=clock)
+    scheduler.start()
+    results = _run(scheduler, clock, 100, device,
+                   voc=lambda t: 100 if t < 50 else 200)
+    assert scheduler.events == 1
+    assert device.commands == ['low_power', 'pm', 'low_power']
+    assert sum(r.mass_concentration_1p0.available for r in results) == 10
+    assert results[-1].voc_index.scaled == 200
+
+
+def test_switch_via_idle():
+    clock = FakeClock()
+    device = FakeDevice()
+    scheduler = Sen5xDutyCycleScheduler(device, pm_window=1.0,
+                                        pm_warmup=0.0, switch_via_idle=True,
+                                        clock=clock)
+    scheduler.start()
+    _run(scheduler, clock, 3)
+    scheduler.stop()
+    assert device.commands == ['pm', 'stop', 'low_power', 'stop']
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver.errors import I2cNackError
+from sensirion_i2c_sen5x.exporter import Sen5xExporter, Sen5xExporterServer
+from sensirion_i2c_sen5x.measured_values import Sen5xMeasuredValues
+from sensirion_i2c_sen5x.response_types import Sen5xDeviceStatus
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from http.client import HTTPConnection
+import json
+import socket
+import threading
+import time
+import pytest
+
+VALUES = (12, 25, 30, 41, 4520, 4700, 1000, 0x7FFF)
+
+
+class FakeDevice:
+    def __init__(self):
+        self.reads = 0
+        self.fail = False
+
+    def read_measured_values(self):
+        self.reads += 1
+        if self.fail:
+            raise I2cNackError(0x69)
+        return Sen5xMeasuredValues(VALUES)
+
+    def read_device_status(self):
+        return Sen5xDeviceStatus(1 << 21)
+
+
+@pytest.fixture
+def server():
+    device = FakeDevice()
+    exporter = Sen5xExporter({'dev0': device}, clock=lambda: 1000.0)
+    exporter.sample()
+    server = Sen5xExporterServer(exporter, ('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server, device
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _get(server, path):
+    return urlopen('http://127.0.0.1:{}{}'.format(
+        server.server_address[1], path)).read().decode('utf-8')
+
+
+def test_metrics(server):
+    server, device = server
+    metrics = _get(server, '/metrics')
+    assert 'sen5x_up{device="dev0"} 1\n' in metrics
+    assert 'sen5x_mass_concentration_ug_m3{device="dev0",size="2.5"} 2.5\n' \
+        in metrics
+    assert 'sen5x_ambient_temperature_celsius{device="dev0"} 23.500\n' \
+        in metrics
+    assert 'sen5x_nox_index{' not in metrics  # not available
+    assert 'sen5x_device_status{device="dev0",flag="fan_error"} 0\n' \
+        in metrics
+    assert 'sen5x_device_status{device="dev0",flag="fan_cleaning"} 0\n' \
+        in metrics
+
+
+def test_json(server):
+    server, device = server
+    document = json.loads(_get(server, '/json'))
+    dev0 = document['devices']['dev0']
+    assert dev0['up'] is True
+    assert dev0['values']['ambient_rh'] == 45.2
+    assert dev0['values']['nox_index'] is None
+    assert dev0['status']['fan_speed_out_of_specs'] is True
+
+
+def test_scrapes_do_not_access_device(server):
+    server, device = server
+    for _ in range(20):
+        _get(server, '/metrics')
+    assert device.reads == 1
+
+
+def test_not_found(server):
+    server, device = server
+    with pytest.raises(HTTPError) as exc_info:
+        _get(server, '/nope')
+    assert exc_info.value.code == 404
+
+
+def test_sample_error():
+    device = FakeDevice()
+    exporter = Sen5xExporter({'dev0': device})
+    exporter.sample()
+    device.fail = True
+    exporter.sample()
+    metrics = exporter.snapshot.metrics.decode('utf-8')
+    assert 'sen5x_up{device="dev0"} 0\n' in metrics
+    assert 'sen5x_sample_errors_total{device="dev0"} 1\n' in metrics
+    assert 'sen5x_sample_timestamp_seconds{device="dev0"}' in metrics
+    assert 'sen5x_voc_index{' not in metrics  # stale values are dropped
+    assert 'sen5x_device_status{' not in metrics
+    assert json.loads(exporter.snapshot.json.decode('utf-8'))[
+        'devices']['dev0']['values'] is None
+    device.fail = False
+    exporter.sample()
+    metrics = exporter.snapshot.metrics.decode('utf-8')
+    assert 'sen5x_voc_index{device="dev0"} 100.0\n' in metrics
+    assert 'sen5x_device_status{' in metrics
+
+
+def test_label_escaping():
+    exporter = Sen5xExporter({'a"b': FakeDevice()})
+    exporter.sample()
+    metrics = exporter.snapshot.metrics.decode('utf-8')
+    assert 'sen5x_up{device="a\\"b"} 1\n' in metrics
+    assert 'a"b' in json.loads(exporter.snapshot.json.decode('utf-8'))[
+        'devices']
+
+
+def test_bounded_workers(server):
+    server, device = server
+    before = set(threading.enumerate())
+
+    def get():
+        try:
+            _get(server, '/metrics')
+        except OSError:
+            pass  # rejected since all workers are busy
+
+    threads = [threading.Thread(target=get) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # No thread is started per connection.
+    assert set(threading.enumerate()) - before == set()
+
+
+def test_idle_keep_alive_connections_do_not_block_workers(server):
+    server, device = server
+    port = server.server_address[1]
+    connections = []
+    for _ in range(10):  # more than workers and queue together
+        connection = HTTPConnection('127.0.0.1', port, timeout=5)
+        connection.request('GET', '/metrics')
+        response = connection.getresponse()
+        assert response.status == 200
+        response.read()
+        connections.append(connection)  # left open and idle
+    start = time.monotonic()
+    assert 'sen5x_up{device="dev0"} 1\n' in _get(server, '/metrics')
+    assert time.monotonic() - start < 1.0
+    # The idle connections are still usable.
+    for connection in connections:
+        connection.request('GET', '/json')
+        response = connection.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read().decode('utf-8'))
+        connection.close()
+
+
+def test_idle_keep_alive_connections_are_closed(server):
+    server, device = server
+    server.idle_timeout = 0.0
+    connection = HTTPConnection('127.0.0.1', server.server_address[1],
+                                timeout=5)
+    connection.request('GET', '/metrics')
+    connection.getresponse().read()
+    time.sleep(1.5)  # dispatcher checks at least once a second
+    assert connection.sock.recv(1) == b''
+    connection.close()
+
+
+def test_pipelined_requests(server):
+    server, device = server
+    connection = socket.create_connection(
+        ('127.0.0.1', server.server_address[1]), timeout=5)
+    request = b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n'
+    connection.sendall(request * 2 + request.replace(
+        b'\r\n\r\n', b'\r\nConnection: close\r\n\r\n'))
+    data = b''
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    connection.close()
+    assert data.count(b'HTTP/1.1 200 OK\r\n') == 3
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x.filters import Sen5xFilterStage, \
+    Sen5xHampelFilter, Sen5xMedianFilter
+from sensirion_i2c_sen5x.measured_values import Sen5xMeasuredValues
+import random
+import pytest
+
+
+def _median(values):
+    s = sorted(values)
+    n = len(s)
+    return s[n // 2] if n % 2 else (s[n // 2 - 1] + s[n // 2]) / 2.0
+
+
+def _reference_hampel(column, window, threshold):
+    result = []
+    history = []
+    for x in column:
+        history = (history + [x])[-window:]
+        m = _median(history)
+        mad = _median([abs(v - m) for v in history])
+        if abs(x - m) and abs(x - m) > threshold * 1.4826 * mad:
+            result.append(int(round(m)))
+        else:
+            result.append(x)
+    return result
+
+
+@pytest.mark.parametrize("window", [1, 4, 5, 16])
+def test_median_matches_reference(window):
+    rng = random.Random(window)
+    column = [rng.randint(0, 50) for _ in range(500)]
+    expected = [int(round(_median(column[max(0, i + 1 - window):i + 1])))
+                for i in range(len(column))]
+    assert Sen5xMedianFilter(window).filter(column) == expected
+
+
+@pytest.mark.parametrize("window", [3, 7, 8, 31])
+def test_hampel_matches_reference(window):
+    rng = random.Random(window)
+    column = [rng.randint(0, 20) if rng.random() > 0.05 else 1000
+              for _ in range(500)]
+    hampel = Sen5xHampelFilter(window, threshold=3.0)
+    assert hampel.filter(column) == _reference_hampel(column, window, 3.0)
+    assert hampel.outliers > 0
+
+
+def test_hampel_spike():
+    hampel = Sen5xHampelFilter(window=5)
+    assert hampel.filter([10, 11, 12, 11, 500, 12, 10]) == \
+        [10, 11, 12, 11, 11, 12, 10]
+    assert hampel.outliers == 1
+
+
+def test_sentinels_pass_through():
+    median = Sen5xMedianFilter(window=3)
+    assert median.filter([10, 0xFFFF, 20, 0xFFFF, 30]) == \
+        [10, 0xFFFF, 15, 0xFFFF, 20]
+
+
+def test_stage_streaming_and_batch():
+    rows = [(10, 10, 10, 10, 5000, 5000, 100, 10),
+            (11, 11, 11, 11, 5001, 5001, 100, 10),
+            (900, 900, 900, 900, 0x7FFF, 0x7FFF, 0x7FFF, 0x7FFF),
+            (12, 12, 12, 12, 5002, 5002, 100, 10),
+            (0xFFFF, 0xFFFF, 0xFFFF, 0xFFFF, 5003, 5003, 100, 10)]
+    stage = Sen5xFilterStage(window=3, threshold=2.0)
+    streamed = [stage.update(Sen5xMeasuredValues(row)).values
+                for row in rows]
+    assert streamed[2] == (11, 11, 11, 11, 0x7FFF, 0x7FFF, 0x7FFF, 0x7FFF)
+    assert streamed[4] == rows[4]
+    columns = [list(c) for c in zip(*rows)]
+    batch = Sen5xFilterStage(window=3, threshold=2.0).filter_columns(columns)
+    assert [tuple(r) for r in zip(*batch)] == streamed
+
+
+def test_stage_median_all_signals():
+    stage = Sen5xFilterStage(Sen5xMedianFilter, signals=range(8), window=2)
+    stage.update((10, 10, 10, 10, 10, 10, 10, 10))
+    assert stage.update((20, 20, 20, 20, 20, 20, 0x7FFF, 20)) == \
+        (15, 15, 15, 15, 15, 15, 0x7FFF, 15)
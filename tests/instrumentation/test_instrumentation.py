@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cConnection
+from sensirion_i2c_driver.errors import I2cChecksumError, I2cNackError
+from sensirion_i2c_driver.transceiver_v1 import I2cTransceiverV1
+from sensirion_i2c_sen5x import Sen5xI2cDevice
+from sensirion_i2c_sen5x.clock import Sen5xVirtualClock
+from sensirion_i2c_sen5x.instrumentation import Sen5xInstrumentation, \
+    Sen5xLatencyHistogram, command_name, escape_label_value
+from sensirion_i2c_sen5x.commands import Sen5xI2cCmdReadMeasuredValues
+from sensirion_i2c_sen5x.replay import encode_frame
+import pytest
+
+VALUES = (11, 22, 33, 44, 55, 66, 77, 88)
+
+
+class FakeTransceiver(I2cTransceiverV1):
+    def __init__(self):
+        super(FakeTransceiver, self).__init__()
+        self.responses = []
+        self.calls = []
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        self.calls.append((tx_data, rx_length, read_delay))
+        if rx_length is None:
+            return self.STATUS_OK, None, b''
+        return self.responses.pop(0)
+
+
+def _setup(**kwargs):
+    transceiver = FakeTransceiver()
+    instrumentation = Sen5xInstrumentation(sleep=lambda s: None, **kwargs)
+    device = Sen5xI2cDevice(I2cConnection(transceiver),
+                            instrumentation=instrumentation)
+    return transceiver, device, instrumentation
+
+
+def test_histogram():
+    histogram = Sen5xLatencyHistogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+
+
+def test_command_name():
+    assert command_name(Sen5xI2cCmdReadMeasuredValues()) == \
+        'ReadMeasuredValues'
+
+
+def test_disabled_by_default():
+    device = Sen5xI2cDevice(I2cConnection(FakeTransceiver()))
+    assert device.instrumentation is None
+
+
+def test_combined_phases():
+    transceiver, device, instrumentation = _setup()
+    transceiver.responses.append((0, None, encode_frame(VALUES)))
+    assert device.read_measured_values().values == VALUES
+    device.start_measurement()
+    data = instrumentation.to_dict()
+    assert data['ReadMeasuredValues']['count'] == 1
+    assert sorted(data['ReadMeasuredValues']['phases']) == \
+        ['decode', 'total', 'transfer']
+    assert sorted(data['StartMeasurement']['phases']) == \
+        ['decode', 'post_processing', 'total', 'transfer']
+    # Without instrumentation, a single transfer is made per command.
+    assert len(transceiver.calls) == 2
+
+
+def test_split_phases():
+    transceiver, device, instrumentation = _setup(split_phases=True)
+    transceiver.responses.append((0, None, encode_frame(VALUES)))
+    assert device.read_measured_values().values == VALUES
+    assert transceiver.calls == [(b'\x03\xc4', None, 0.0), (None, 24, 0.0)]
+    phases = instrumentation.to_dict()['ReadMeasuredValues']['phases']
+    assert sorted(phases) == ['decode', 'delay', 'read', 'total', 'write']
+
+
+def test_split_phases_wait_with_device_clock():
+    clock = Sen5xVirtualClock()
+    transceiver = FakeTransceiver()
+    device = Sen5xI2cDevice(I2cConnection(transceiver), clock=clock,
+                            instrumentation=Sen5xInstrumentation(
+                                split_phases=True))
+    transceiver.responses.append((0, None, encode_frame(VALUES)))
+    device.read_measured_values()
+    device.start_measurement()
+    assert clock.monotonic() == pytest.approx(0.02 + 0.05)
+
+
+def test_error_counters():
+    transceiver, device, instrumentation = _setup()
+    frame = bytearray(encode_frame(VALUES))
+    frame[2] ^= 0xFF
+    transceiver.responses.append((0, None, bytes(frame)))
+    transceiver.responses.append((FakeTransceiver.STATUS_NACK, None, b''))
+    with pytest.raises(I2cChecksumError):
+        device.read_measured_values()
+    with pytest.raises(I2cNackError):
+        device.read_measured_values()
+    errors = instrumentation.to_dict()['ReadMeasuredValues']['errors']
+    assert errors == {'crc': 1, 'nack': 1, 'timeout': 0, 'other': 0}
+    instrumentation.reset()
+    assert instrumentation.to_dict() == {}
+
+
+def test_prometheus():
+    transceiver, device, instrumentation = _setup()
+    transceiver.responses.append((0, None, encode_frame(VALUES)))
+    device.read_measured_values()
+    text = instrumentation.to_prometheus(labels={'serial': 'ABC'})
+    lines = text.splitlines()
+    assert '# TYPE sen5x_command_duration_seconds histogram' in lines
+    assert 'sen5x_command_duration_seconds_bucket{command="ReadMeasuredValues"' \
+        ',phase="total",serial="ABC",le="+Inf"} 1' in lines
+    assert 'sen5x_commands_total{command="ReadMeasuredValues",serial="ABC"} 1' \
+        in lines
+    assert 'sen5x_command_errors_total{command="ReadMeasuredValues",' \
+        'error="crc",serial="ABC"} 0' in lines
+
+
+def test_escape_label_value():
+    assert escape_label_value('kitchen') == 'kitchen'
+    assert escape_label_value('a\\b"c\nd') == 'a\\\\b\\"c\\nd'
+    transceiver, device, instrumentation = _setup()
+    transceiver.responses.append((0, None, encode_frame(VALUES)))
+    device.read_measured_values()
+    text = instrumentation.to_prometheus(labels={'room': 'a"b\nc'})
+    assert 'sen5x_commands_total{command="ReadMeasuredValues",' \
+        'room="a\\"b\\nc"} 1' in text.splitlines()
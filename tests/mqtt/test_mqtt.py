@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x.measured_values import Sen5xMeasuredValues
+from sensirion_i2c_sen5x.mqtt import Sen5xMqttPublisher, decode_batch, \
+    encode_batch
+import threading
+import time
+import pytest
+
+TICKS = (10, 20, 30, 40, -500, 4600, 1000, 0x7FFF)
+
+
+class FakeBroker:
+    """Stand-in for a paho-mqtt client connected to a local broker."""
+
+    class Result:
+        def __init__(self, rc):
+            self.rc = rc
+
+    def __init__(self):
+        self.messages = []
+        self.online = threading.Event()
+        self.online.set()
+        self.rc = 0
+        self.limit = None
+
+    def publish(self, topic, payload, qos=0):
+        self.online.wait()
+        if self.rc or (self.limit is not None and
+                       len(self.messages) >= self.limit):
+            return self.Result(self.rc or 4)
+        self.messages.append((topic, payload))
+        return self.Result(0)
+
+    def samples(self, topic):
+        return [s for t, p in self.messages if t == topic
+                for s in decode_batch(p)]
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_encode_decode():
+    samples = [(1000000000 + i * 1000000000, TICKS) for i in range(3)]
+    payload = encode_batch(samples)
+    assert len(payload) == 13 + 3 * 20
+    assert decode_batch(payload) == samples
+    with pytest.raises(ValueError):
+        decode_batch(b'XX' + payload[2:])
+
+
+def test_non_monotonic_timestamps():
+    broker = FakeBroker()
+    publisher = Sen5xMqttPublisher(broker, interval=10.0, clock=FakeClock())
+    timestamps = [1000000000, 999000000, 1011000000]  # clock set back
+    for timestamp_ns in timestamps:
+        publisher.put('a', TICKS, timestamp_ns=timestamp_ns)
+    publisher.start()
+    publisher.stop(timeout=5.0)
+    assert [t for t, _ in broker.samples('a')] == timestamps
+
+
+def test_unencodable_batch_is_dropped():
+    broker = FakeBroker()
+    clock = FakeClock()
+    publisher = Sen5xMqttPublisher(broker, interval=10.0, clock=clock)
+    publisher.put('a', TICKS, timestamp_ns=0)
+    publisher.put('a', TICKS, timestamp_ns=2 ** 33 * 1000000)
+    publisher.start()
+    clock.time = 10.0  # sealed by the background thread
+    _wait_for(lambda: publisher.dropped == 1)
+    publisher.put('a', TICKS, timestamp_ns=0)
+    publisher.stop(timeout=5.0)
+    assert len(broker.messages) == 1
+
+
+def test_batching_per_interval_and_topic():
+    broker = FakeBroker()
+    clock = FakeClock()
+    publisher = Sen5xMqttPublisher(broker, interval=10.0, clock=clock)
+    for i in range(25):
+        clock.time = float(i)
+        for topic in ('a', 'b'):
+            publisher.put(topic, Sen5xMeasuredValues(TICKS),
+                          timestamp_ns=i * 1000000000)
+    assert publisher.pending == 4  # 2 batches per topic sealed
+    publisher.start()
+    publisher.stop(timeout=5.0)
+    assert len(broker.messages) == 6
+    assert [t // 1000000000 for t, _ in broker.samples('a')] == \
+        list(range(25))
+    assert broker.samples('b')[0][1] == TICKS
+
+
+def test_never_blocks_and_spills(tmpdir):
+    broker = FakeBroker()
+    broker.online.clear()  # broker hangs
+    publisher = Sen5xMqttPublisher(broker, max_samples=1, queue_size=2,
+                                   spill_dir=str(tmpdir))
+    publisher.start()
+    start = time.time()
+    for i in range(20):
+        publisher.put('t', TICKS, timestamp_ns=i * 1000000000)
+    assert time.time() - start < 1.0
+    broker.online.set()
+    _wait_for(lambda: len(broker.messages) == 20)
+    publisher.stop()
+    assert publisher.spilled >= 10
+    assert sorted(t for t, _ in broker.samples('t')) == \
+        [i * 1000000000 for i in range(20)]
+    assert tmpdir.listdir() == []
+
+
+def test_put_does_not_touch_the_disk(tmpdir):
+    publisher = Sen5xMqttPublisher(FakeBroker(), max_samples=1, queue_size=2,
+                                   spill_dir=str(tmpdir))
+    for i in range(10):
+        publisher.put('t', TICKS)
+    assert tmpdir.listdir() == []
+    assert publisher.spilled == 0
+    publisher.stop()
+    assert publisher.spilled == 10
+    assert len(tmpdir.listdir()) == 1
+
+
+def test_spilled_messages_survive_restart(tmpdir):
+    broker = FakeBroker()
+    publisher = Sen5xMqttPublisher(broker, max_samples=1, queue_size=5,
+                                   spill_dir=str(tmpdir),
+                                   spill_segment_size=100)
+    for i in range(30):
+        publisher.put('t', TICKS, timestamp_ns=i * 1000000000)
+    publisher.stop()
+    assert publisher.spilled == 30
+    assert len(tmpdir.listdir()) == 10  # 3 records (99 bytes) per segment
+
+    # Publish some of them, the others stay on disk.
+    broker.limit = 12
+    publisher = Sen5xMqttPublisher(broker, queue_size=5, retry_delay=0.01,
+                                   spill_dir=str(tmpdir),
+                                   spill_segment_size=100)
+    publisher.start()
+    _wait_for(lambda: publisher.failures > 0)
+    publisher.stop(timeout=0.1)
+    assert len(broker.messages) == 12
+    broker.limit = None
+
+    publisher = Sen5xMqttPublisher(broker, spill_dir=str(tmpdir),
+                                   spill_segment_size=100)
+    publisher.start()
+    _wait_for(lambda: not tmpdir.listdir())
+    publisher.stop()
+    timestamps = [t for t, _ in broker.samples('t')]
+    assert sorted(timestamps) == [i * 1000000000 for i in range(30)]
+
+
+def test_drop_without_spill_dir():
+    broker = FakeBroker()
+    publisher = Sen5xMqttPublisher(broker, max_samples=1, queue_size=2)
+    for i in range(5):
+        publisher.put('t', TICKS)
+    assert publisher.dropped == 3
+
+
+def test_retry_failed_publish():
+    broker = FakeBroker()
+    broker.rc = 4
+    publisher = Sen5xMqttPublisher(broker, max_samples=1, retry_delay=0.01)
+    publisher.start()
+    publisher.put('t', TICKS)
+    _wait_for(lambda: publisher.failures >= 2)
+    broker.rc = 0
+    _wait_for(lambda: publisher.published == 1)
+    publisher.stop()
+    assert len(broker.messages) == 1
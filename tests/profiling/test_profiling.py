@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cConnection
+from sensirion_i2c_driver.transceiver_v1 import I2cTransceiverV1
+from sensirion_i2c_sen5x import Sen5xI2cDevice
+from sensirion_i2c_sen5x import profiling
+from sensirion_i2c_sen5x.commands import Sen5xI2cCmdReadMeasuredValues
+from sensirion_i2c_sen5x.replay import encode_frame
+import pytest
+
+VALUES = (11, 22, 33, 44, 55, 66, 77, 88)
+
+
+class FakeTransceiver(I2cTransceiverV1):
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        return self.STATUS_OK, None, encode_frame(VALUES)
+
+
+class RecordingHook(profiling.Sen5xProfilingHook):
+    def __init__(self):
+        self.calls = []
+
+    def pre_execute(self, command_id, timestamp_ns):
+        self.calls.append(('pre_execute', command_id))
+
+    def post_execute(self, command_id, start_ns, end_ns, error):
+        assert end_ns >= start_ns
+        self.calls.append(('post_execute', command_id, error))
+
+    def pre_decode(self, command_id, stage, timestamp_ns):
+        self.calls.append(('pre_decode', command_id, stage))
+
+    def post_decode(self, command_id, stage, start_ns, end_ns, error):
+        assert end_ns >= start_ns
+        self.calls.append(('post_decode', command_id, stage, error))
+
+
+@pytest.fixture
+def hook():
+    hook = RecordingHook()
+    profiling.add_hook(hook)
+    yield hook
+    profiling.clear_hooks()
+
+
+def test_hooks(hook):
+    device = Sen5xI2cDevice(I2cConnection(FakeTransceiver()))
+    assert device.read_measured_values().values == VALUES
+    assert hook.calls == [
+        ('pre_execute', 0x03C4),
+        ('pre_decode', 0x03C4, 'crc'),
+        ('post_decode', 0x03C4, 'crc', None),
+        ('pre_decode', 0x03C4, 'measured_values'),
+        ('post_decode', 0x03C4, 'measured_values', None),
+        ('post_execute', 0x03C4, None),
+    ]
+
+
+def test_decode_error(hook):
+    frame = bytearray(encode_frame(VALUES))
+    frame[2] ^= 0xFF
+    with pytest.raises(Exception) as exc_info:
+        Sen5xI2cCmdReadMeasuredValues().interpret_response(bytes(frame))
+    assert hook.calls == [
+        ('pre_decode', 0x03C4, 'crc'),
+        ('post_decode', 0x03C4, 'crc', exc_info.value),
+    ]
+
+
+def test_sample_rate():
+    hook = RecordingHook()
+    profiling.add_hook(hook, sample_rate=0.0)
+    try:
+        device = Sen5xI2cDevice(I2cConnection(FakeTransceiver()))
+        device.read_measured_values()
+        assert hook.calls == []
+    finally:
+        profiling.remove_hook(hook)
+    assert profiling._hooks == []
+
+
+def test_command_id():
+    assert profiling.command_id(Sen5xI2cCmdReadMeasuredValues()) == 0x03C4
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import CrcCalculator
+from sensirion_i2c_driver.transceiver_v1 import I2cTransceiverV1
+from sensirion_i2c_sen5x.configuration import Sen5xConfiguration
+from sensirion_i2c_sen5x.provisioning import provision, \
+    Sen5xProvisioningTarget
+from struct import pack
+import threading
+
+CRC = CrcCalculator(8, 0x31, 0xFF, 0x00)
+
+
+class FakeBus(I2cTransceiverV1):
+    """
+    Bus with a TCA9548A-like multiplexer and one SEN5x per channel which
+    only knows the RH/T acceleration mode.
+    """
+
+    def __init__(self, name, channels=(0, 1), broken_channels=()):
+        super(FakeBus, self).__init__()
+        self.name = name
+        self.channel = None
+        self.modes = dict((ch, 0) for ch in channels)
+        self.broken_channels = broken_channels
+        self.threads = set()
+        self.closed = False
+        self.mux_writes = []
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        self.threads.add(threading.current_thread().name)
+        if slave_address == 0x70:
+            self.mux_writes.append(tx_data[0])
+            self.channel = tx_data[0].bit_length() - 1
+            return self.STATUS_OK, None, b''
+        if self.channel not in self.modes or \
+                self.channel in self.broken_channels:
+            return self.STATUS_NACK, Exception('NACK'), b''
+        if len(tx_data) > 2:
+            self.modes[self.channel] = (tx_data[2] << 8) | tx_data[3]
+            return self.STATUS_OK, None, b''
+        word = pack('>H', self.modes[self.channel])
+        return self.STATUS_OK, None, word + bytes([CRC(word)])
+
+    def close(self):
+        self.closed = True
+
+
+def test_provision():
+    buses = {
+        'bus1': FakeBus('bus1'),
+        'bus2': FakeBus('bus2', broken_channels=(1,)),
+    }
+    buses['bus1'].modes[1] = 2  # already configured
+    targets = [Sen5xProvisioningTarget(bus, mux_channel=ch)
+               for bus in sorted(buses) for ch in (0, 1)]
+    results = provision(targets, Sen5xConfiguration(rht_acceleration_mode=2),
+                        transceiver_factory=buses.get)
+
+    assert [r.target for r in results] == targets
+    assert [r.success for r in results] == [True, True, True, False]
+    assert results[0].report.changed == ['rht_acceleration_mode']
+    assert results[1].report.unchanged == ['rht_acceleration_mode']
+    assert results[3].report is None
+    assert 'NACK' in str(results[3].error)
+    assert str(results[3]).startswith('bus2/mux1@0x69: FAILED')
+    assert all(r.duration >= 0.0 for r in results)
+    assert buses['bus1'].modes == {0: 2, 1: 2}
+    assert buses['bus2'].modes == {0: 2, 1: 0}
+
+    # The channel is deselected after each device, also after failures.
+    assert buses['bus1'].mux_writes == [0x01, 0x00, 0x02, 0x00]
+    assert buses['bus2'].mux_writes == [0x01, 0x00, 0x02, 0x00]
+
+    # One worker thread per bus, and transceivers get closed.
+    assert buses['bus1'].threads == {'sen5x-provisioning-bus1'}
+    assert buses['bus2'].threads == {'sen5x-provisioning-bus2'}
+    assert buses['bus1'].closed and buses['bus2'].closed
+
+
+def test_provision_bus_not_available():
+    def factory(bus):
+        raise IOError("No such bus")
+
+    targets = [Sen5xProvisioningTarget('/dev/i2c-9', 0x69)]
+    results = provision(targets, Sen5xConfiguration(warm_start=0),
+                        transceiver_factory=factory)
+    assert results[0].success is False
+    assert str(results[0]) == '/dev/i2c-9@0x69: FAILED (No such bus)'
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x.commands.wrapped import Sen5xI2cCmdReadMeasuredValues
+from sensirion_i2c_sen5x.replay import FRAME_SIZE, RECORD_SIZE, \
+    encode_frame, replay_archives, replay_records, Sen5xFrameArchiveWriter
+import multiprocessing
+import pytest
+
+
+def _values(i):
+    return (i, i + 1, i + 2, i + 3, -i, i * 2, 0x7FFF, 10)
+
+
+def _write_archive(path, first, count, corrupt=()):
+    with open(str(path), 'wb') as f:
+        writer = Sen5xFrameArchiveWriter(f)
+        for i in range(first, first + count):
+            frame = bytearray(encode_frame(_values(i)))
+            if i in corrupt:
+                frame[2] ^= 0xFF
+            writer.write(i * 1000, bytes(frame))
+
+
+def test_encode_frame():
+    frame = encode_frame(_values(5))
+    assert len(frame) == FRAME_SIZE
+    values = Sen5xI2cCmdReadMeasuredValues().interpret_response(frame)
+    assert values.values == _values(5)
+
+
+def test_writer_rejects_invalid_frame():
+    with pytest.raises(ValueError):
+        Sen5xFrameArchiveWriter(None).write(0, b'\x00' * 3)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_replay(tmpdir, processes):
+    _write_archive(tmpdir.join('a.bin'), 0, 10, corrupt=(3,))
+    _write_archive(tmpdir.join('b.bin'), 10, 7)
+    paths = [str(tmpdir.join('a.bin')), str(tmpdir.join('b.bin'))]
+    chunks = list(replay_archives(paths, processes=processes,
+                                  chunk_records=4))
+    assert [(c.path, c.first_record, len(c)) for c in chunks] == [
+        (paths[0], 0, 4), (paths[0], 4, 4), (paths[0], 8, 2),
+        (paths[1], 0, 4), (paths[1], 4, 3)]
+    assert [c.checksum_errors for c in chunks] == [1, 0, 0, 0, 0]
+    records = [record for chunk in chunks for record in chunk]
+    expected = [(i * 1000, _values(i)) for i in range(17) if i != 3]
+    assert records == expected
+    assert list(replay_records(paths, processes=processes,
+                               chunk_records=4)) == expected
+
+
+class _RecordingContext:
+    """
+    Multiprocessing context which records the sizes of allocated arrays.
+    """
+
+    def __init__(self):
+        self._context = multiprocessing.get_context()
+        self.sizes = []
+
+    def RawArray(self, typecode, size):
+        self.sizes.append(size)
+        return self._context.RawArray(typecode, size)
+
+    def Pool(self, *args):
+        return self._context.Pool(*args)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_replay_memory_is_bounded(tmpdir, processes):
+    _write_archive(tmpdir.join('a.bin'), 0, 100)
+    context = _RecordingContext()
+    chunks = replay_archives([str(tmpdir.join('a.bin'))],
+                             processes=processes, chunk_records=8,
+                             context=context)
+    assert sum(len(chunk) for chunk in chunks) == 100
+    assert max(context.sizes) == 8 * 8
+    assert len(context.sizes) == 3 * (2 * processes if processes > 1 else 1)
+
+
+def test_replay_ignores_incomplete_record(tmpdir):
+    path = tmpdir.join('a.bin')
+    _write_archive(path, 0, 2)
+    with open(str(path), 'ab') as f:
+        f.write(b'\x00' * (RECORD_SIZE - 1))
+    chunks = list(replay_archives([str(path)], processes=1))
+    assert [len(chunk) for chunk in chunks] == [2]
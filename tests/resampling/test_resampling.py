@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x import Sen5xMeasuredValues
+from sensirion_i2c_sen5x.filters import SENTINELS
+from sensirion_i2c_sen5x.replay import Sen5xFrameArchiveWriter, \
+    encode_frame, replay_records
+from sensirion_i2c_sen5x.resampling import Sen5xResampler, resample, \
+    HOLD, LINEAR, NEAREST
+import pytest
+import random
+
+
+def _ticks(value):
+    return (value,) * 8
+
+
+def _stream(times, values):
+    return [(t, _ticks(v)) for t, v in zip(times, values)]
+
+
+@pytest.mark.parametrize("method,expected", [
+    (LINEAR, [100, 142, 183, 238, 300]),
+    (NEAREST, [100, 100, 200, 200, 300]),
+    (HOLD, [100, 100, 100, 200, 300]),
+])
+def test_methods(method, expected):
+    stream = _stream([10.0, 12.4, 14.0], [100, 200, 300])
+    frames = list(resample([stream], method=method))
+    assert [f.timestamp for f in frames] == [10.0, 11.0, 12.0, 13.0, 14.0]
+    assert [f.columns[1][0] for f in frames] == expected
+
+
+def test_alignment_of_multiple_streams():
+    a = _stream([0.9, 2.1, 2.9, 4.1], [10, 20, 30, 40])
+    b = _stream([1.0, 2.0, 3.0, 4.0], [100, 200, 300, 400])
+    c = _stream([3.5], [1000])
+    frames = list(resample([a, b, c], method=NEAREST, max_gap=0.5))
+    assert [f.timestamp for f in frames] == [1.0, 2.0, 3.0, 4.0]
+    assert [f.columns[0] for f in frames] == [
+        (10, 100, 0xFFFF), (20, 200, 0xFFFF), (30, 300, 1000),
+        (40, 400, 1000)]
+    assert frames[2].values(2) == _ticks(1000)
+
+
+def test_gaps_and_sentinels():
+    stream = _stream([0.0, 1.0, 6.0, 7.0], [10, 20, 60, 70])
+    stream[1] = (1.0, (20, 20, 20, 20, 0x7FFF, 20, 20, 20))
+    frames = list(resample([stream], max_gap=2.0))
+    assert [f.timestamp for f in frames] == [float(i) for i in range(8)]
+    assert [f.columns[0][0] for f in frames] == \
+        [10, 20, 0xFFFF, 0xFFFF, 0xFFFF, 0xFFFF, 60, 70]
+    assert frames[1].values(0) == stream[1][1]
+    assert frames[3].values(0) == SENTINELS
+
+
+def test_different_rates_and_timestamp_scale():
+    def fast():
+        for i in range(20000):
+            yield int(i * 1e8), _ticks(i % 1000)
+
+    slow = [(int(i * 1e9), _ticks(i)) for i in range(0, 2001, 100)]
+    frames = list(resample([fast(), slow], timestamp_scale=1e-9,
+                           max_gap=100.0))
+    assert len(frames) == 2001
+    assert frames[1234].timestamp == 1234.0
+    assert frames[1234].columns[0] == (340, 1234)
+
+
+def test_push_with_jitter():
+    rng = random.Random(1)
+    resampler = Sen5xResampler(3, interval=1.0, method=LINEAR)
+    frames = []
+    for second in range(100):
+        for stream in rng.sample(range(3), 3):
+            t = second + rng.uniform(-0.2, 0.2)
+            frames += resampler.put(stream, t, Sen5xMeasuredValues(
+                _ticks(int(round(t * 100)))))
+        assert max(len(b) for b in resampler._buffers) <= 4
+    frames += resampler.flush()
+    assert frames[0].timestamp == 0.0
+    assert frames[-1].timestamp == 99.0
+    assert len(frames) == 100
+    for frame in frames[1:-1]:
+        for value in frame.columns[0]:
+            assert abs(value - frame.timestamp * 100) <= 1
+
+
+def test_replay_streams(tmpdir):
+    paths = []
+    for offset in (0, 300000000):
+        path = str(tmpdir.join('{}.bin'.format(offset)))
+        with open(path, 'wb') as f:
+            writer = Sen5xFrameArchiveWriter(f)
+            for i in range(10):
+                writer.write(i * 1000000000 + offset,
+                             encode_frame(_ticks(i * 10)))
+        paths.append(path)
+    streams = [replay_records([p], processes=1) for p in paths]
+    frames = list(resample(streams, timestamp_scale=1e-9))
+    assert len(frames) == 10
+    assert frames[5].columns[0] == (50, 47)
+
+
+def test_invalid_method():
+    with pytest.raises(ValueError):
+        Sen5xResampler(1, method='cubic')
@@ -2,6 +2,7 @@
 # (c) Copyright 2022 Sensirion AG, Switzerland
 
 from sensirion_i2c_sen5x.response_types import Sen5xDeviceStatus
+import pickle
 
 
 def test_zero():
@@ -105,3 +106,40 @@ def test_multiple_flags():
 def test_to_str():
     obj = Sen5xDeviceStatus(0x00080010)
     assert str(obj) == "0x00080010 [fan_error, fan_cleaning]"
+
+
+def test_from_value_is_shared():
+    obj = Sen5xDeviceStatus.from_value(0x00080010)
+    assert type(obj) is Sen5xDeviceStatus
+    assert Sen5xDeviceStatus.from_value(0x00080010) is obj
+    assert obj.value == 0x00080010
+    assert obj.flags == ['fan_error', 'fan_cleaning']
+    assert obj.fan_error is True
+    assert obj.fan_cleaning is True
+    assert obj.laser_error is False
+    assert str(obj) == "0x00080010 [fan_error, fan_cleaning]"
+
+
+def test_from_value_can_be_pickled():
+    obj = Sen5xDeviceStatus.from_value(0x00000020)
+    copy = pickle.loads(pickle.dumps(obj))
+    assert type(copy) is Sen5xDeviceStatus
+    assert copy.value == 0x00000020
+    assert copy.flags == ['laser_error']
+
+
+def test_constructor_is_not_shared():
+    obj = Sen5xDeviceStatus(0x00000020)
+    assert obj is not Sen5xDeviceStatus(0x00000020)
+    obj.flags.append('test')  # Still mutable.
+
+
+def test_from_value_cache_per_class():
+    class Subclass(Sen5xDeviceStatus):
+        pass
+
+    obj = Subclass.from_value(0x00000010)
+    assert isinstance(obj, Subclass)
+    assert Sen5xDeviceStatus.from_value(0x00000010) is not obj
+    assert Subclass.from_value(0x00000010) is obj
+    assert not isinstance(Sen5xDeviceStatus.from_value(0x00000010), Subclass)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cConnection
+from sensirion_i2c_driver.errors import I2cChecksumError, I2cNackError
+from sensirion_i2c_driver.transceiver_v1 import I2cTransceiverV1
+from sensirion_i2c_sen5x import Sen5xI2cDevice
+from sensirion_i2c_sen5x.replay import encode_frame
+from sensirion_i2c_sen5x.retry import Sen5xRetryPolicy, reset_device
+from sensirion_i2c_sen5x.commands import Sen5xI2cCmdDeviceReset, \
+    Sen5xI2cCmdStartFanCleaning
+import pytest
+
+VALUES = (11, 22, 33, 44, 55, 66, 77, 88)
+
+
+class FlakyTransceiver(I2cTransceiverV1):
+    """Fails the first ``failures`` transfers with a NACK or a CRC error."""
+
+    def __init__(self, failures, corrupt=False):
+        self.failures = failures
+        self.corrupt = corrupt
+        self.commands = []
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        self.commands.append((tx_data[0] << 8) | tx_data[1])
+        if self.failures > 0:
+            self.failures -= 1
+            if self.corrupt:
+                frame = bytearray(encode_frame(VALUES))
+                frame[2] ^= 0xFF
+                return self.STATUS_OK, None, bytes(frame[:rx_length])
+            return self.STATUS_NACK, None, None
+        return self.STATUS_OK, None, encode_frame(VALUES)[:rx_length]
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.time += seconds
+
+
+def _device(transceiver, clock, **kwargs):
+    policy = Sen5xRetryPolicy(sleep=clock.sleep, clock=clock,
+                              random=lambda: 0.5, **kwargs)
+    device = Sen5xI2cDevice(I2cConnection(transceiver), retry_policy=policy)
+    return device, policy
+
+
+@pytest.mark.parametrize("corrupt", [False, True])
+def test_retry_read(corrupt):
+    clock = FakeClock()
+    transceiver = FlakyTransceiver(2, corrupt=corrupt)
+    device, policy = _device(transceiver, clock, max_attempts=3,
+                             backoff=0.01, jitter=0.5)
+    assert device.read_measured_values().values == VALUES
+    assert transceiver.commands == [0x03C4] * 3
+    assert clock.sleeps == pytest.approx([0.0075, 0.015])
+    assert policy.retries == 2
+    assert policy.failures == 0
+    assert list(policy.recovery_times) == pytest.approx([0.0225])
+    assert policy.max_recovery_time == pytest.approx(0.0225)
+
+
+def test_give_up():
+    clock = FakeClock()
+    transceiver = FlakyTransceiver(5)
+    device, policy = _device(transceiver, clock, max_attempts=3)
+    with pytest.raises(I2cNackError):
+        device.read_measured_values()
+    assert len(transceiver.commands) == 3
+    assert policy.failures == 1
+    assert policy.max_recovery_time is None
+
+
+@pytest.mark.parametrize("method", [
+    'start_fan_cleaning', 'device_reset',
+])
+def test_no_replay_of_non_idempotent(method):
+    clock = FakeClock()
+    transceiver = FlakyTransceiver(1)
+    device, policy = _device(transceiver, clock, max_attempts=5)
+    with pytest.raises(I2cNackError):
+        getattr(device, method)()
+    assert len(transceiver.commands) == 1
+    assert policy.retries == 0
+
+
+def test_no_replay_of_read_and_clear_status():
+    clock = FakeClock()
+    transceiver = FlakyTransceiver(1, corrupt=True)
+    device, policy = _device(transceiver, clock, max_attempts=5)
+    with pytest.raises(I2cChecksumError):
+        device.read_device_status(clear=True)
+    assert transceiver.commands == [0xD210]
+
+
+def test_idempotency_override():
+    clock = FakeClock()
+    transceiver = FlakyTransceiver(1)
+    device, policy = _device(
+        transceiver, clock, max_attempts=2,
+        idempotency={Sen5xI2cCmdStartFanCleaning: True})
+    device.start_fan_cleaning()
+    assert transceiver.commands == [0x5607, 0x5607]
+
+
+def test_escalation():
+    clock = FakeClock()
+    transceiver = FlakyTransceiver(4)
+    escalated = []
+
+    def escalation(device):
+        escalated.append(device)
+        reset_device(device)
+
+    device, policy = _device(transceiver, clock, max_attempts=2,
+                             escalation_threshold=2, escalation=escalation)
+    for _ in range(2):
+        with pytest.raises(I2cNackError):
+            device.read_measured_values()
+    assert escalated == [device]
+    assert policy.escalations == 1
+    assert transceiver.commands == [0x03C4] * 4 + [0xD304]
+    assert device.read_measured_values().values == VALUES
+    assert len(policy.recovery_times) == 1
+
+
+def test_shared_policy_tracks_devices_separately():
+    clock = FakeClock()
+    escalated = []
+    policy = Sen5xRetryPolicy(sleep=clock.sleep, clock=clock,
+                              random=lambda: 0.5, max_attempts=1,
+                              escalation_threshold=2,
+                              escalation=escalated.append)
+    flaky = Sen5xI2cDevice(I2cConnection(FlakyTransceiver(10)),
+                           retry_policy=policy)
+    healthy = Sen5xI2cDevice(I2cConnection(FlakyTransceiver(1)),
+                             retry_policy=policy)
+    with pytest.raises(I2cNackError):
+        flaky.read_measured_values()
+    clock.time += 1.0
+    with pytest.raises(I2cNackError):
+        healthy.read_measured_values()
+    clock.time += 2.0
+    assert healthy.read_measured_values().values == VALUES
+    assert list(policy.recovery_times) == [2.0]
+    assert escalated == []
+    with pytest.raises(I2cNackError):
+        flaky.read_measured_values()
+    assert escalated == [flaky]
+    assert policy.failures == 3
+
+
+def test_reset_device_uses_device_clock():
+    clock = FakeClock()
+    transceiver = FlakyTransceiver(0)
+    device = Sen5xI2cDevice(I2cConnection(transceiver), clock=clock)
+    reset_device(device)
+    assert transceiver.commands == [0xD304]
+    assert clock.sleeps == [
+        Sen5xI2cCmdDeviceReset().post_processing_time]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x import Sen5xMeasuredValues
+from sensirion_i2c_sen5x.serialization import FIELD_NAMES, csv_header, \
+    format_fields, format_csv_row, format_line_protocol, Sen5xBufferedWriter
+import io
+
+VALUES = (11, 22, 33, 44, 5501, -1234, 77, 88)
+NOT_AVAILABLE = (0xFFFF, 0xFFFF, 0xFFFF, 0xFFFF,
+                 0x7FFF, 0x7FFF, 0x7FFF, 0x7FFF)
+
+
+def test_format_fields():
+    assert format_fields(VALUES) == \
+        ['1.1', '2.2', '3.3', '4.4', '55.01', '-6.170', '7.7', '8.8']
+
+
+def test_format_fields_matches_physical_values():
+    obj = Sen5xMeasuredValues(VALUES)
+    physical = [value for _, value in obj]
+    assert [float(f) for f in format_fields(obj)] == physical
+
+
+def test_format_fields_not_available():
+    assert format_fields(NOT_AVAILABLE) == [None] * 8
+
+
+def test_csv():
+    assert csv_header() == 'timestamp,' + ','.join(FIELD_NAMES) + '\n'
+    assert csv_header(';', timestamp=False) == ';'.join(FIELD_NAMES) + '\n'
+    assert format_csv_row(VALUES, timestamp=42) == \
+        '42,1.1,2.2,3.3,4.4,55.01,-6.170,7.7,8.8\n'
+    assert format_csv_row(NOT_AVAILABLE) == ',,,,,,,\n'
+
+
+def test_line_protocol():
+    values = VALUES[0:7] + (0x7FFF,)
+    line = format_line_protocol(values, tags={'serial': 'A B'},
+                                timestamp_ns=123)
+    assert line == 'sen5x,serial=A\\ B mc_1p0=1.1,mc_2p5=2.2,mc_4p0=3.3,' \
+        'mc_10p0=4.4,ambient_rh=55.01,ambient_t=-6.170,voc_index=7.7 123\n'
+
+
+def test_line_protocol_not_available():
+    assert format_line_protocol(NOT_AVAILABLE) is None
+
+
+def test_writer_flush_by_size():
+    stream = io.StringIO()
+    writer = Sen5xBufferedWriter(stream, max_bytes=10, max_interval=None)
+    writer.write('12345\n')
+    assert stream.getvalue() == ''
+    assert writer.buffered_bytes == 6
+    writer.write(None)
+    writer.write('67890\n')
+    assert stream.getvalue() == '12345\n67890\n'
+    assert writer.buffered_bytes == 0
+
+
+def test_writer_counts_encoded_bytes():
+    stream = io.StringIO()
+    writer = Sen5xBufferedWriter(stream, max_bytes=12, max_interval=None)
+    writer.write('5 µg/m³\n')  # 8 characters, 10 bytes
+    assert writer.buffered_bytes == 10
+    assert stream.getvalue() == ''
+    writer.write('µ\n')
+    assert stream.getvalue() == '5 µg/m³\nµ\n'
+    assert writer.buffered_bytes == 0
+
+
+def test_writer_flush_by_interval():
+    now = [0.0]
+    stream = io.StringIO()
+    writer = Sen5xBufferedWriter(stream, max_bytes=1000, max_interval=5.0,
+                                 clock=lambda: now[0])
+    writer.write('a\n')
+    now[0] = 4.9
+    writer.write('b\n')
+    assert stream.getvalue() == ''
+    now[0] = 5.0
+    writer.write('c\n')
+    assert stream.getvalue() == 'a\nb\nc\n'
+
+
+def test_writer_context_manager():
+    stream = io.StringIO()
+    with Sen5xBufferedWriter(stream) as writer:
+        writer.write('a\n')
+    assert stream.getvalue() == 'a\n'
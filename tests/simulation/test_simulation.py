@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_driver import I2cConnection
+from sensirion_i2c_driver.errors import I2cChecksumError, I2cNackError, \
+    I2cTimeoutError
+from sensirion_i2c_sen5x import Sen5xI2cDevice
+from sensirion_i2c_sen5x.retry import Sen5xRetryPolicy
+from sensirion_i2c_sen5x.simulation import Sen5xFault, \
+    Sen5xSimulatedTransceiver, CRC_ERROR, FAN_ERROR, NACK, \
+    SILENT_AFTER_RESET, STUCK_DATA_READY, TIMEOUT
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 1000.0
+
+    def __call__(self):
+        return self.time
+
+
+def _create(faults=(), **kwargs):
+    clock = FakeClock()
+    transceiver = Sen5xSimulatedTransceiver(faults=faults, clock=clock,
+                                            **kwargs)
+    device = Sen5xI2cDevice(I2cConnection(transceiver))
+    return device, transceiver, clock
+
+
+def test_device_information():
+    device, _, _ = _create(product_name='SEN54', serial_number='ABC',
+                           firmware=(1, 3))
+    assert device.get_product_name() == 'SEN54'
+    assert device.get_serial_number() == 'ABC'
+    assert device.get_version().firmware.major == 1
+    assert device.get_version().firmware.minor == 3
+
+
+def test_measurement():
+    device, transceiver, clock = _create()
+    assert device.read_data_ready() is False
+    device.start_measurement()
+    assert transceiver.measure_mode == 'pm'
+    assert device.read_data_ready() is False
+    clock.time += 1.5
+    assert device.read_data_ready() is True
+    values = device.read_measured_values()
+    assert device.read_data_ready() is False
+    assert 0 < values.mass_concentration_2p5.physical < 20
+    assert 30 < values.ambient_humidity.percent_rh < 60
+    assert 18 < values.ambient_temperature.degrees_celsius < 26
+    assert 90 < values.voc_index.scaled < 110
+    assert values.nox_index.available is False
+    clock.time += 10.0
+    assert device.read_measured_values().nox_index.scaled == 1.0
+    device.stop_measurement()
+    values = device.read_measured_values()
+    assert values.mass_concentration_2p5.available is False
+
+
+def test_measurement_without_pm_and_offset():
+    device, _, clock = _create()
+    device.set_temperature_offset_parameters(5.0, 0.0, 0)
+    device.start_measurement_without_pm()
+    clock.time += 1.0
+    values = device.read_measured_values()
+    assert values.mass_concentration_2p5.available is False
+    assert 23 < values.ambient_temperature.degrees_celsius < 31
+
+
+@pytest.mark.parametrize("firmware,switched", [
+    ((1, 3), False),
+    ((2, 0), True),
+])
+def test_mode_switching_depends_on_firmware(firmware, switched):
+    device, transceiver, _ = _create(firmware=firmware)
+    device.start_measurement_without_pm()
+    device.start_measurement()
+    assert transceiver.measure_mode == ('pm' if switched else 'without_pm')
+
+
+def test_sen50_has_no_measurement_without_pm():
+    device, transceiver, _ = _create(product_name='SEN50')
+    with pytest.raises(I2cNackError):
+        device.start_measurement_without_pm()
+    assert transceiver.measure_mode is None
+
+
+def test_deterministic():
+    def run(seed):
+        device, _, clock = _create(seed=seed)
+        device.start_measurement()
+        result = []
+        for _ in range(50):
+            clock.time += 1.0
+            result.append(device.read_measured_values().values)
+        return result
+
+    assert run(1) == run(1)
+    assert run(1) != run(2)
+
+
+def test_sparse_sampling():
+    # The signal model advances in closed form, so the costs of a sample do
+    # not depend on the time elapsed since the previous one.
+    device, _, clock = _create()
+    device.start_measurement()
+    pm = []
+    for _ in range(30 * 24):
+        clock.time += 3600.0
+        values = device.read_measured_values()
+        assert 0 <= values.mass_concentration_2p5.physical < 500
+        assert 1 <= values.voc_index.scaled <= 500
+        pm.append(values.mass_concentration_2p5.physical)
+    assert 5 < sum(pm) / len(pm) < 40
+
+
+def test_idle_only_parameters():
+    device, _, _ = _create()
+    device.start_measurement()
+    device.set_voc_tuning_parameters(200, 12, 12, 180, 50, 230)
+    assert device.get_voc_tuning_parameters()[0] == 100
+    device.stop_measurement()
+    device.set_voc_tuning_parameters(200, 12, 12, 180, 50, 230)
+    assert device.get_voc_tuning_parameters()[0] == 200
+    device.device_reset()
+    assert device.get_voc_tuning_parameters()[0] == 100
+
+
+def test_fan_cleaning():
+    device, _, clock = _create()
+    device.start_fan_cleaning()
+    assert device.read_device_status().fan_cleaning is False
+    device.set_fan_auto_cleaning_interval(100)
+    device.start_measurement()
+    device.start_fan_cleaning()
+    assert device.read_device_status().fan_cleaning is True
+    clock.time += 10.0
+    assert device.read_device_status().fan_cleaning is False
+    clock.time += 90.0
+    assert device.read_device_status().fan_cleaning is True
+    device.device_reset()
+    assert device.get_fan_auto_cleaning_interval() == 100
+
+
+@pytest.mark.parametrize("kind,error", [
+    (CRC_ERROR, I2cChecksumError),
+    (NACK, I2cNackError),
+    (TIMEOUT, I2cTimeoutError),
+])
+def test_communication_faults(kind, error):
+    device, transceiver, _ = _create([Sen5xFault(kind, commands=[0xD033])])
+    assert device.get_product_name() == 'SEN55'
+    with pytest.raises(error):
+        device.get_serial_number()
+    assert transceiver.injected == {kind: 1}
+
+
+def test_timeout_executes_command():
+    device, transceiver, _ = _create([Sen5xFault(TIMEOUT, count=1)])
+    with pytest.raises(I2cTimeoutError):
+        device.start_measurement()
+    assert transceiver.measure_mode == 'pm'
+
+
+def test_probability_and_retry():
+    faults = [Sen5xFault(NACK, probability=0.3, commands=[0x03C4])]
+    device, transceiver, clock = _create(faults, seed=3)
+    device.retry_policy = Sen5xRetryPolicy(max_attempts=10,
+                                           sleep=lambda t: None)
+    device.start_measurement()
+    for _ in range(100):
+        clock.time += 1.0
+        device.read_measured_values()
+    assert 20 < transceiver.injected[NACK] < 80
+    assert device.retry_policy.retries == transceiver.injected[NACK]
+
+
+def test_schedule():
+    fault = Sen5xFault(STUCK_DATA_READY, start=5.0, stop=8.0)
+    device, transceiver, clock = _create([fault])
+    device.start_measurement()
+    ready = []
+    values = []
+    for _ in range(10):
+        clock.time += 1.0
+        ready.append(device.read_data_ready())
+        values.append(device.read_measured_values().values)
+    assert ready == [True] * 4 + [False] * 3 + [True] * 3
+    assert values[4] == values[3]
+    assert values[6] == values[3]
+    assert values[7] != values[3]
+
+
+def test_sticky_status():
+    fault = Sen5xFault(FAN_ERROR, start=3.0, count=1)
+    device, transceiver, clock = _create([fault])
+    device.start_measurement()
+    for _ in range(5):
+        clock.time += 1.0
+        device.read_measured_values()
+    assert device.read_device_status().fan_error is True
+    assert device.read_device_status().fan_error is True
+    assert device.read_device_status(clear=True).fan_error is True
+    assert device.read_device_status().fan_error is False
+    assert fault.injected == 1
+
+
+def test_silent_after_reset():
+    fault = Sen5xFault(SILENT_AFTER_RESET, duration=30.0)
+    device, transceiver, clock = _create([fault])
+    device.device_reset()
+    with pytest.raises(I2cNackError):
+        device.get_serial_number()
+    clock.time += 30.0
+    assert device.get_serial_number() == 'SIM0000000000001'
+
+    fault.duration = None
+    device.device_reset()
+    clock.time += 1000.0
+    with pytest.raises(I2cNackError):
+        device.get_serial_number()
+    transceiver.power_cycle()
+    assert device.get_serial_number() == 'SIM0000000000001'
+
+
+def test_wrong_address():
+    transceiver = Sen5xSimulatedTransceiver(slave_address=0x6A)
+    device = Sen5xI2cDevice(I2cConnection(transceiver))
+    with pytest.raises(I2cNackError):
+        device.get_serial_number()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x import Sen5xMeasuredValues
+from sensirion_i2c_sen5x.filters import SENTINELS
+from sensirion_i2c_sen5x.sketches import Sen5xQuantileSketch, \
+    Sen5xSketchStage
+import json
+import pytest
+import random
+
+
+def _exact_rank(data, value):
+    return sum(1 for x in data if x <= value) / float(len(data))
+
+
+def _check_accuracy(sketch, data, tolerance=0.02):
+    for q in (0.5, 0.95, 0.99):
+        estimate = sketch.quantile(q)
+        assert abs(_exact_rank(data, estimate) - q) < tolerance
+
+
+def test_empty():
+    sketch = Sen5xQuantileSketch()
+    assert sketch.count == 0
+    assert sketch.quantiles([0.5, 0.99]) == [None, None]
+    assert sketch.rank(10) is None
+
+
+def test_small_stream_is_exact():
+    sketch = Sen5xQuantileSketch()
+    for value in range(1, 101):
+        sketch.update(value)
+    assert sketch.quantiles([0.0, 0.5, 0.95, 1.0]) == [1, 50, 95, 100]
+    assert sketch.rank(25) == 0.25
+
+
+def test_accuracy_and_bounded_memory():
+    rng = random.Random(1)
+    data = [int(rng.lognormvariate(4.0, 1.0)) for _ in range(50000)]
+    sketch = Sen5xQuantileSketch(seed=1)
+    for value in data:
+        sketch.update(value)
+    assert sketch.count == len(data)
+    assert len(sketch) <= 3 * sketch.k
+    assert sketch.min == min(data)
+    assert sketch.max == max(data)
+    _check_accuracy(sketch, data)
+
+
+def test_merge():
+    rng = random.Random(2)
+    parts = [[rng.randint(0, 5000) + 1000 * i for _ in range(10000)]
+             for i in range(4)]
+    merged = Sen5xQuantileSketch(seed=2)
+    for part in parts:
+        sketch = Sen5xQuantileSketch(seed=3)
+        for value in part:
+            sketch.update(value)
+        merged.merge(sketch)
+        assert sketch.count == len(part)  # not modified
+    data = [value for part in parts for value in part]
+    assert merged.count == len(data)
+    assert len(merged) <= 3 * merged.k
+    _check_accuracy(merged, data)
+
+
+def test_serialization():
+    sketch = Sen5xQuantileSketch(k=50, seed=4)
+    for value in range(10000):
+        sketch.update(value)
+    data = json.loads(json.dumps(sketch.to_dict()))
+    restored = Sen5xQuantileSketch.from_dict(data)
+    assert restored.k == 50
+    assert restored.count == sketch.count
+    assert len(restored) == len(sketch)
+    assert restored.quantiles([0.5, 0.99]) == sketch.quantiles([0.5, 0.99])
+    # Still usable after restoring.
+    for value in range(10000, 20000):
+        restored.update(value)
+    assert abs(restored.quantile(0.5) - 10000) < 400
+
+
+@pytest.mark.parametrize("k,q", [(4, 0.5), (200, 1.5), (200, -0.1)])
+def test_invalid_arguments(k, q):
+    with pytest.raises(ValueError):
+        Sen5xQuantileSketch(k).quantile(q)
+
+
+def test_stage_skips_unavailable_values():
+    stage = Sen5xSketchStage()
+    stage.update(Sen5xMeasuredValues((10, 20, 30, 40, 5000, 4000, 100, 10)))
+    stage.update(SENTINELS)
+    stage.update((10, 40, 30, 40, 5000, 4000, 0x7FFF, 20))
+    assert stage.sketches[1].count == 2
+    assert stage.sketches[6].count == 1
+    assert stage.quantiles([1.0]) == {
+        'mc_2p5': [40],
+        'voc_index': [100],
+        'nox_index': [20],
+    }
+
+
+def test_stage_merge_and_serialization():
+    rng = random.Random(5)
+    devices = [Sen5xSketchStage(seed=i) for i in range(3)]
+    for device in devices:
+        for _ in range(2000):
+            device.update((0, rng.randint(0, 500), 0, 0, 0, 0,
+                           rng.randint(10, 5000), rng.randint(10, 100)))
+    site = Sen5xSketchStage(signals=())
+    for device in devices:
+        data = json.loads(json.dumps(device.to_dict()))
+        site.merge(Sen5xSketchStage.from_dict(data))
+    assert sorted(site.sketches) == [1, 6, 7]
+    assert site.sketches[1].count == 6000
+    p50, p99 = site.quantiles([0.5, 0.99])['mc_2p5']
+    assert abs(p50 - 250) < 25
+    assert abs(p99 - 495) < 25
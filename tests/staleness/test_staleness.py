@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x.clock import Sen5xVirtualClock
+from sensirion_i2c_sen5x.replay import Sen5xFrameArchiveWriter, \
+    encode_frame, replay_records
+from sensirion_i2c_sen5x.staleness import Sen5xStalenessDetector, \
+    fingerprint, FRESH, DUPLICATE, STALE
+
+A = (10, 20, 30, 40, 5000, 5000, 100, 10)
+B = (11, 21, 31, 41, 5001, 4999, 100, 10)
+
+
+class FakeDevice:
+    def __init__(self, samples, clock=None):
+        self.samples = list(samples)
+        self.clock = clock
+
+    def read_data_ready(self):
+        return self.samples[0][0]
+
+    def read_measured_values(self):
+        return self.samples.pop(0)[1]
+
+
+def test_fingerprint():
+    assert fingerprint(A) == fingerprint(encode_frame(A))
+    assert len(fingerprint(A)) == 16
+    assert fingerprint(A) != fingerprint(B)
+
+
+def test_classify_by_time():
+    detector = Sen5xStalenessDetector(interval=1.0)
+    states = [detector.classify(data, t) for t, data in [
+        (0.0, A), (0.5, A), (1.0, B), (2.0, B), (3.0, B), (4.0, A)]]
+    assert states == [FRESH, DUPLICATE, FRESH, STALE, STALE, FRESH]
+    assert detector.counts == {FRESH: 3, DUPLICATE: 1, STALE: 2}
+    assert detector.repeats == 0
+
+
+def test_classify_by_data_ready():
+    detector = Sen5xStalenessDetector(interval=1.0)
+    assert detector.classify(A, 0.0, data_ready=True) == FRESH
+    assert detector.classify(A, 1.0, data_ready=True) == FRESH
+    assert detector.classify(A, 5.0, data_ready=False) == STALE
+    assert detector.repeats == 1
+    assert detector.stale_duration == 4.0
+
+
+def test_read():
+    device = FakeDevice([(True, A), (False, A), (True, B)])
+    clock = iter([0.0, 2.0, 3.0])
+    detector = Sen5xStalenessDetector(clock=lambda: next(clock))
+    assert [detector.read(device)[1] for _ in range(3)] == \
+        [FRESH, STALE, FRESH]
+
+
+def test_read_uses_device_clock():
+    clock = Sen5xVirtualClock()
+    device = FakeDevice([(True, A), (False, A), (False, A)], clock=clock)
+    detector = Sen5xStalenessDetector(interval=1.0)
+    assert detector.read(device)[1] == FRESH
+    clock.sleep(0.5)
+    assert detector.read(device)[1] == DUPLICATE
+    clock.sleep(2.0)
+    assert detector.read(device)[1] == STALE
+    assert detector.stale_duration == 2.5
+
+
+def test_filter_replay(tmpdir):
+    path = str(tmpdir.join('archive.bin'))
+    with open(path, 'wb') as f:
+        writer = Sen5xFrameArchiveWriter(f)
+        for i, data in enumerate([A, A, A, B, B]):
+            writer.write(i * 1000000000, encode_frame(data))
+    records = list(replay_records([path], processes=1))
+    detector = Sen5xStalenessDetector()
+    assert [t for t, _ in detector.filter_replay(records)] == \
+        [0, 3000000000]
+    detector.reset()
+    marked = list(detector.filter_replay(records, drop=False))
+    assert [state for _, _, state in marked] == \
+        [FRESH, STALE, STALE, FRESH, STALE]
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x import Sen5xDeviceStatus
+from sensirion_i2c_sen5x.status_monitor import Sen5xStatusMonitor
+
+VALUES = (11, 22, 33, 44, 55, 66, 77, 88)
+NOT_AVAILABLE = (0xFFFF, 0xFFFF, 0xFFFF, 0xFFFF,
+                 0x7FFF, 0x7FFF, 0x7FFF, 0x7FFF)
+
+
+class FakeDevice:
+    """
+    Minimal device stand-in with a sticky status register.
+    """
+
+    def __init__(self):
+        self.status = 0
+        self.reads = []
+
+    def read_device_status(self, clear=False):
+        self.reads.append(clear)
+        status = Sen5xDeviceStatus(self.status)
+        if clear:
+            self.status = 0
+        return status
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _monitor(device, clock, **kwargs):
+    return Sen5xStatusMonitor(device, min_interval=1.0, max_interval=8.0,
+                              backoff=2.0, clock=clock, **kwargs)
+
+
+def test_adaptive_interval():
+    device, clock = FakeDevice(), FakeClock()
+    monitor = _monitor(device, clock)
+    polls = []
+    for i in range(30):
+        clock.now = float(i)
+        if monitor.update((i,) + VALUES[1:]) is not None:
+            polls.append(i)
+    assert polls == [0, 2, 6, 14, 22]
+    assert monitor.interval == 8.0
+    assert monitor.poll_count == 5
+    assert len(monitor.history) == 0
+
+
+def test_edge_triggered_events_and_clear():
+    device, clock = FakeDevice(), FakeClock()
+    monitor = _monitor(device, clock)
+    events = []
+    monitor.add_listener(events.append)
+    monitor.update()
+    device.status = 0x00000010  # fan_error
+    clock.now = 2.0
+    monitor.update()
+    assert [str(e) for e in events] == ['fan_error set']
+    assert monitor.counts['fan_error'] == 1
+    assert monitor.interval == 1.0
+    # The sticky error gets cleared with the next poll, and since the error
+    # condition disappeared, the following poll reports the transition.
+    clock.now = 3.0
+    monitor.update()
+    assert device.reads == [False, False, True]
+    clock.now = 4.0
+    monitor.update()
+    assert [str(e) for e in events] == ['fan_error set', 'fan_error cleared']
+    assert list(monitor.history) == events
+
+
+def test_without_clear():
+    device, clock = FakeDevice(), FakeClock()
+    monitor = _monitor(device, clock, clear_errors=False)
+    device.status = 0x00000020
+    for i in range(5):
+        clock.now = float(i * 10)
+        monitor.update()
+    assert True not in device.reads
+    assert monitor.counts['laser_error'] == 1
+
+
+def test_anomaly_speeds_up_polling():
+    device, clock = FakeDevice(), FakeClock()
+    monitor = _monitor(device, clock)
+    for i in range(10):
+        clock.now = float(i)
+        monitor.update((i,) + VALUES[1:])
+    assert monitor.interval == 8.0
+    clock.now = 10.0
+    monitor.update(NOT_AVAILABLE)
+    assert monitor.interval == 1.0
+    clock.now = 11.0
+    assert monitor.update(NOT_AVAILABLE) is not None
+
+
+def test_stuck_frame_is_anomalous():
+    device, clock = FakeDevice(), FakeClock()
+    monitor = _monitor(device, clock, stuck_threshold=3)
+    for i in range(10):
+        clock.now = float(i)
+        monitor.update((i,) + VALUES[1:])
+    polls = monitor.poll_count
+    for i in range(10, 15):
+        clock.now = float(i)
+        monitor.update(VALUES)
+    assert monitor.poll_count > polls
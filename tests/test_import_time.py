@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+import subprocess
+import sys
+from pytest import mark
+
+# Budget for the cumulative import time of the package itself (without the
+# interpreter startup), in microseconds. Eagerly importing the driver and all
+# commands takes several times longer than this.
+IMPORT_TIME_BUDGET_US = 50000
+
+# Modules which must not be loaded by a plain "import sensirion_i2c_sen5x".
+HEAVY_MODULES = [
+    'sensirion_i2c_driver',
+    'sensirion_i2c_sen5x.device',
+    'sensirion_i2c_sen5x.commands.generated',
+    'sensirion_i2c_sen5x.commands.wrapped',
+    'sensirion_i2c_sen5x.response_types',
+]
+
+
+def _run(code, *options):
+    return subprocess.run(
+        [sys.executable] + list(options) + ['-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+
+
+@mark.skipif(sys.version_info < (3, 7), reason="requires PEP 562")
+def test_import_is_lazy():
+    """Tests that importing the package does not load any submodule."""
+    result = _run("import sys, sensirion_i2c_sen5x; "
+                  "print('\\n'.join(sorted(sys.modules)))")
+    loaded = result.stdout.splitlines()
+    assert [m for m in HEAVY_MODULES if m in loaded] == []
+
+
+@mark.skipif(sys.version_info < (3, 7), reason="requires PEP 562")
+def test_lazy_attribute_access():
+    """Tests that the public names are loaded on first access."""
+    result = _run("import sys, sensirion_i2c_sen5x as p; "
+                  "print(p.Sen5xDeviceStatus.__module__); "
+                  "print('sensirion_i2c_sen5x.device' in sys.modules); "
+                  "print(p.Sen5xI2cDevice.__name__); "
+                  "print('Sen5xI2cDevice' in dir(p))")
+    assert result.stdout.split() == [
+        'sensirion_i2c_sen5x.response_types', 'False', 'Sen5xI2cDevice',
+        'True']
+
+
+@mark.skipif(sys.version_info < (3, 7), reason="requires -X importtime")
+def test_import_time_budget():
+    """Tests that the package import time stays within the budget."""
+    result = _run("import sensirion_i2c_sen5x", '-X', 'importtime')
+    for line in result.stderr.splitlines():
+        fields = [f.strip() for f in line.split('|')]
+        if fields[-1] == 'sensirion_i2c_sen5x':
+            cumulative_us = int(fields[1])
+            break
+    else:
+        raise AssertionError("Package import not found in -X importtime "
+                             "output.")
+    assert cumulative_us < IMPORT_TIME_BUDGET_US
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2022 Sensirion AG, Switzerland
+
+from sensirion_i2c_sen5x.measured_values import Sen5xMeasuredValues
+from sensirion_i2c_sen5x.trends import Sen5xTrendDetector, \
+    Sen5xTrendStage, FALL, RATE, RISE
+import random
+
+NA = 0x7FFF
+
+
+def _events(detector, column):
+    return [(e.sample, e.kind) for e in map(detector.update, column) if e]
+
+
+def test_ewma_integer():
+    detector = Sen5xTrendDetector(shift=2)
+    for ticks in [1000, 1000, 1400]:
+        detector.update(ticks)
+    assert detector.ewma == 1100
+    assert isinstance(detector.ewma, int)
+    assert detector.rate == 100
+
+
+def test_step_detected_once():
+    detector = Sen5xTrendDetector(threshold=200, drift=20)
+    column = [1000] * 20 + [1500] * 20 + [1000] * 20
+    assert _events(detector, column) == [(21, RISE), (41, FALL)]
+
+
+def test_noise_no_alarm():
+    rng = random.Random(1)
+    detector = Sen5xTrendDetector(threshold=200, drift=20)
+    column = [1000 + rng.randint(-15, 15) for _ in range(1000)]
+    assert _events(detector, column) == []
+
+
+def test_rate():
+    detector = Sen5xTrendDetector(threshold=10000, rate_threshold=30)
+    column = [1000] * 10 + [1000 + 50 * i for i in range(1, 10)]
+    events = _events(detector, column)
+    assert events == [(14, RATE)]
+
+
+def test_rate_rearm():
+    detector = Sen5xTrendDetector(threshold=10000, rate_threshold=30)
+    ramp = [1000] * 10 + [1000 + 50 * i for i in range(1, 20)]
+    flat = [ramp[-1]] * 20
+    column = ramp + flat + [ramp[-1] + 50 * i for i in range(1, 10)]
+    # Latched during the first ramp, re-armed (rate < 15) while flat.
+    assert [kind for _, kind in _events(detector, column)] == [RATE, RATE]
+
+
+def test_nox_warm_up():
+    detector = Sen5xTrendDetector('nox_index', threshold=50, drift=5)
+    # NOx is unavailable for the first seconds, then starts at index 1.
+    column = [NA] * 11 + [10, 10, 30, 10, 10, 10, 10]
+    assert _events(detector, column) == []
+    assert detector.samples == 7
+    # A restart of the measurement resets the detector.
+    assert _events(detector, [NA, 500, 10]) == []
+
+
+def test_stage():
+    stage = Sen5xTrendStage(threshold=200)
+    events = []
+    for i in range(20):
+        voc = 1000 if i < 10 else 2000
+        events += stage.update(Sen5xMeasuredValues(
+            (0, 0, 0, 0, 5000, 5000, voc, NA)))
+    assert [(e.signal, e.kind) for e in events] == [('voc_index', RISE)]
+    assert 'voc_index rise' in str(events[0])